@@ -1,11 +1,11 @@
 from django.contrib import admin
-from .models import Mirror, Session, Video, TransferRequest
+from .models import Mirror, Session, Video, TransferRequest, TransferFile, MediaJob
 
 
 @admin.register(Mirror)
 class MirrorAdmin(admin.ModelAdmin):
-    list_display = ("hostname", "ip", "port", "last_seen")
-    search_fields = ("hostname", "ip")
+    list_display = ("hostname", "mirror_identity", "ip", "port", "last_seen")
+    search_fields = ("hostname", "mirror_identity", "ip")
     ordering = ("hostname",)
 
 
@@ -44,8 +44,9 @@ class VideoAdmin(admin.ModelAdmin):
         "duration_seconds",
         "codec",
         "encrypted",
+        "processing_status",
     )
-    list_filter = ("codec", "encrypted")
+    list_filter = ("codec", "encrypted", "processing_status")
     search_fields = ("id", "session__id")
     ordering = ("-created_at",)
 
@@ -59,8 +60,38 @@ class TransferRequestAdmin(admin.ModelAdmin):
         "to_mirror",
         "created_at",
         "expires_at",
+        "status",
         "completed",
     )
-    list_filter = ("completed", "from_mirror", "to_mirror")
+    list_filter = ("status", "completed", "from_mirror", "to_mirror")
     search_fields = ("id", "session__id")
     ordering = ("-created_at",)
+
+
+@admin.register(TransferFile)
+class TransferFileAdmin(admin.ModelAdmin):
+    list_display = (
+        "video_id",
+        "transfer",
+        "size",
+        "chunks_done",
+        "updated_at",
+    )
+    search_fields = ("video_id", "sha256")
+    ordering = ("-updated_at",)
+
+
+@admin.register(MediaJob)
+class MediaJobAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "video",
+        "kind",
+        "status",
+        "attempts",
+        "run_after",
+        "updated_at",
+    )
+    list_filter = ("kind", "status")
+    search_fields = ("id", "video__id")
+    ordering = ("-created_at",)
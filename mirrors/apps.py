@@ -3,21 +3,46 @@ import sys
 from django.apps import AppConfig
 from django.conf import settings
 
+try:
+    import fcntl
+except ImportError:  # not POSIX: no host lock, every process runs them
+    fcntl = None
+
+# Open file holding the host-wide background lock, kept for the process's life.
+_background_lock = None
+
 class MirrorsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "mirrors"
 
     def ready(self):
-        if not getattr(settings, "DISCOVERY_ENABLED", False):
-            return
-        if not _should_start_discovery():
+        from utils.db import install_sqlite_tuning
+
+        install_sqlite_tuning()
+
+        if not _should_start_background_services():
             return
-        from .discovery import start_discovery_service
 
-        start_discovery_service()
+        # gunicorn runs ready() in every worker; the job queue and sweeper
+        # only need one process per host.
+        if _acquire_background_lock():
+            if getattr(settings, "MEDIA_WORKER_ENABLED", False):
+                from .media_jobs import start_media_worker
+
+                start_media_worker()
+
+            if getattr(settings, "METADATA_SWEEP_ENABLED", False):
+                from .reconciler import start_metadata_sweeper
+
+                start_metadata_sweeper()
 
+        if getattr(settings, "DISCOVERY_ENABLED", False):
+            from .discovery import start_discovery_service
 
-def _should_start_discovery() -> bool:
+            start_discovery_service()
+
+
+def _should_start_background_services() -> bool:
     run_main = os.environ.get("RUN_MAIN")
     if run_main is not None and run_main != "true":
         return False
@@ -28,3 +53,25 @@ def _should_start_discovery() -> bool:
     if any(cmd in argv for cmd in ("gunicorn", "uwsgi", "daphne", "uvicorn")):
         return True
     return False
+
+
+def _acquire_background_lock() -> bool:
+    """
+    Takes a non-blocking exclusive flock on BACKGROUND_LOCK_FILE and keeps
+    it until the process exits. Returns False when another process on this
+    host already holds it. When that process exits, the kernel drops the
+    lock and the worker gunicorn starts in its place takes it over.
+    """
+    global _background_lock
+    path = getattr(settings, "BACKGROUND_LOCK_FILE", "")
+    if not path or fcntl is None or _background_lock is not None:
+        return True
+
+    lock_file = open(path, "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    _background_lock = lock_file
+    return True
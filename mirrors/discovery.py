@@ -1,20 +1,28 @@
+import asyncio
+import hashlib
 import json
 import logging
+import random
 import socket
 import threading
 import time
+from datetime import timedelta
 from ipaddress import ip_address
 from urllib.parse import urlparse
 
 from django.conf import settings
-from django.db import close_old_connections
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Q
 from django.utils import timezone
 
 from .models import Mirror
 
 _LOG = logging.getLogger(__name__)
 _thread = None
-_stop_event = threading.Event()
+_loop = None
+_stop = None
+
+DISCOVERY_MAX_DATAGRAM = 4096
 
 
 def start_discovery_service() -> None:
@@ -23,9 +31,8 @@ def start_discovery_service() -> None:
     global _thread
     if _thread and _thread.is_alive():
         return
-    _stop_event.clear()
     _thread = threading.Thread(
-        target=_serve_loop,
+        target=_run_loop,
         name="mirror-discovery",
         daemon=True,
     )
@@ -33,114 +40,451 @@ def start_discovery_service() -> None:
 
 
 def stop_discovery_service() -> None:
-    _stop_event.set()
+    if _loop is not None and _stop is not None:
+        _loop.call_soon_threadsafe(_stop.set)
 
 
-def _serve_loop() -> None:
-    announce_port = getattr(settings, "DISCOVERY_ANNOUNCE_PORT", 5005)
-    interval = getattr(settings, "DISCOVERY_INTERVAL_SECONDS", 10)
+def _run_loop() -> None:
+    global _loop, _stop
+    _loop = asyncio.new_event_loop()
+    _stop = asyncio.Event()
+    try:
+        _loop.run_until_complete(run_discovery(_stop))
+    except Exception:
+        _LOG.exception("Discovery service stopped unexpectedly")
+    finally:
+        _loop.close()
+        _loop = None
+
+
+async def run_discovery(
+    stop: asyncio.Event,
+    *,
+    port: int | None = None,
+    group: str | None = None,
+    bind_host: str = "",
+    legacy_broadcast: bool | None = None,
+) -> None:
+    """
+    Runs announce, receive and peer-flush tasks until `stop` is set.
+
+    Arguments default to the DISCOVERY_* settings; tests can pass a
+    loopback port and group instead.
+    """
+    loop = asyncio.get_running_loop()
+    port = port or getattr(settings, "DISCOVERY_ANNOUNCE_PORT", 5005)
+    group = group if group is not None else getattr(settings, "DISCOVERY_MULTICAST_GROUP", "")
+    if legacy_broadcast is None:
+        legacy_broadcast = getattr(settings, "DISCOVERY_LEGACY_BROADCAST", False)
+
+    try:
+        sock = _open_socket(bind_host, port, group, legacy_broadcast)
+    except OSError as exc:
+        _LOG.warning("Discovery bind failed on %s: %s", port, exc)
+        return
+
+    targets = []
+    if group:
+        targets.append((group, port))
+    if legacy_broadcast:
+        targets.append(("255.255.255.255", port))
+
+    inbound = asyncio.Queue(maxsize=getattr(settings, "DISCOVERY_QUEUE_SIZE", 256))
+    transport, protocol = await loop.create_datagram_endpoint(
+        lambda: DiscoveryProtocol(inbound),
+        sock=sock,
+    )
+    # Ready before the first datagram arrives, so discover always has a reply.
+    protocol.announcement = _full_announcement(await loop.run_in_executor(None, _build_payload))
+    tasks = [
+        asyncio.create_task(_announce_task(protocol, targets, stop)),
+        asyncio.create_task(_receive_task(protocol, inbound)),
+        asyncio.create_task(_flush_task(stop)),
+    ]
+    try:
+        # Ask peers for their full payload straight away instead of waiting
+        # a whole interval for their next announce.
+        for target in targets:
+            protocol.send({"type": "discover"}, target)
+        await stop.wait()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        transport.close()
+        await loop.run_in_executor(None, _flush_peers)
+
+
+def _open_socket(bind_host: str, port: int, group: str, legacy_broadcast: bool) -> socket.socket:
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
     sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     try:
         sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
-    except Exception:
+    except (AttributeError, OSError):
         pass
-
+    if legacy_broadcast:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
     try:
-        sock.bind(("", announce_port))
-    except Exception as exc:
-        _LOG.warning("Discovery bind failed on %s: %s", announce_port, exc)
-        return
+        sock.bind((bind_host, port))
+        if group:
+            interface = getattr(settings, "DISCOVERY_MULTICAST_INTERFACE", "") or "0.0.0.0"
+            membership = socket.inet_aton(group) + socket.inet_aton(interface)
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(interface))
+            sock.setsockopt(
+                socket.IPPROTO_IP,
+                socket.IP_MULTICAST_TTL,
+                getattr(settings, "DISCOVERY_MULTICAST_TTL", 1),
+            )
+            # Loopback on, so several mirrors on one host (and tests) see
+            # each other; our own announces are filtered by identity.
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+    except OSError:
+        sock.close()
+        raise
+    sock.setblocking(False)
+    return sock
+
+
+class DiscoveryProtocol(asyncio.DatagramProtocol):
+    """
+    Hands datagrams to a bounded queue and never blocks the loop. When the
+    queue is full new datagrams are dropped (announces repeat, so a drop
+    only delays a peer update); while the transport is paused sends are
+    skipped the same way.
+
+    `announcement` is the last full announce built by the announce task;
+    replies to "discover" reuse it instead of building a payload on the
+    loop.
+    """
+
+    def __init__(self, inbound: asyncio.Queue):
+        self.inbound = inbound
+        self.transport = None
+        self.announcement = None
+        self.paused = False
+        self.dropped = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        try:
+            self.inbound.put_nowait((data, addr))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.dropped % 100 == 1:
+                _LOG.warning("Discovery inbound queue full; %d datagrams dropped", self.dropped)
+
+    def error_received(self, exc):
+        _LOG.debug("Discovery socket error: %s", exc)
+
+    def pause_writing(self):
+        self.paused = True
 
-    sock.settimeout(1.0)
-    next_announce = 0.0
+    def resume_writing(self):
+        self.paused = False
+
+    def send(self, payload: dict, addr) -> bool:
+        if self.transport is None or self.paused:
+            return False
+        try:
+            self.transport.sendto(json.dumps(payload).encode("utf-8"), addr)
+        except OSError as exc:
+            _LOG.debug("Discovery send to %s failed: %s", addr, exc)
+            return False
+        return True
 
-    while not _stop_event.is_set():
-        now = time.monotonic()
-        if now >= next_announce:
-            _send_announce(sock, announce_port)
-            next_announce = now + interval
 
+async def _announce_task(protocol: DiscoveryProtocol, targets, stop: asyncio.Event) -> None:
+    """
+    Sends a full announce when our payload changes (and every
+    DISCOVERY_FULL_ANNOUNCE_EVERY rounds), small heartbeats otherwise.
+    Rounds are jittered so mirrors booted together do not stay in step.
+    """
+    loop = asyncio.get_running_loop()
+    interval = getattr(settings, "DISCOVERY_INTERVAL_SECONDS", 10)
+    jitter = getattr(settings, "DISCOVERY_JITTER", 0.2)
+    full_every = max(getattr(settings, "DISCOVERY_FULL_ANNOUNCE_EVERY", 6), 1)
+
+    last_digest = None
+    rounds = 0
+    while not stop.is_set():
+        # _build_payload may resolve hostnames/IPs, keep it off the loop.
+        payload = await loop.run_in_executor(None, _build_payload)
+        protocol.announcement = _full_announcement(payload)
+        digest = protocol.announcement["digest"]
+        if digest != last_digest or rounds % full_every == 0:
+            message = protocol.announcement
+        else:
+            message = _heartbeat(payload, digest)
+        sent = [protocol.send(message, target) for target in targets]
+        if all(sent):
+            last_digest = digest
+            rounds += 1
+
+        delay = interval * (1 + random.uniform(-jitter, jitter))
         try:
-            data, addr = sock.recvfrom(4096)
-        except socket.timeout:
-            continue
-        except Exception as exc:
-            _LOG.debug("Discovery recv failed: %s", exc)
-            continue
+            await asyncio.wait_for(stop.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            pass
+
 
-        _handle_datagram(sock, data, addr)
+async def _receive_task(protocol: DiscoveryProtocol, inbound: asyncio.Queue) -> None:
+    known_digests = {}
+    while True:
+        data, addr = await inbound.get()
+        _handle_datagram(protocol, data, addr, known_digests)
 
-    sock.close()
+
+async def _flush_task(stop: asyncio.Event) -> None:
+    loop = asyncio.get_running_loop()
+    flush_interval = getattr(settings, "DISCOVERY_FLUSH_INTERVAL_SECONDS", 5)
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=flush_interval)
+        except asyncio.TimeoutError:
+            pass
+        # ORM work happens on an executor thread, never on the loop.
+        await loop.run_in_executor(None, _flush_peers)
 
 
-def _send_announce(sock: socket.socket, announce_port: int) -> None:
-    payload = _build_payload()
-    data = json.dumps(payload).encode("utf-8")
+def _flush_peers() -> None:
     try:
-        sock.sendto(data, ("255.255.255.255", announce_port))
-    except Exception as exc:
-        _LOG.debug("Discovery broadcast failed: %s", exc)
+        peers.flush()
+    except Exception:
+        _LOG.exception("Discovery: failed to write peer table")
 
 
-def _handle_datagram(sock: socket.socket, data: bytes, addr: tuple[str, int]) -> None:
+def _handle_datagram(protocol: DiscoveryProtocol, data: bytes, addr, known_digests: dict) -> None:
+    if len(data) > DISCOVERY_MAX_DATAGRAM:
+        return
     try:
         payload = json.loads(data.decode("utf-8"))
     except Exception:
         return
+    if not isinstance(payload, dict):
+        return
 
-    if isinstance(payload, dict):
-        msg_type = payload.get("type")
-        if msg_type == "discover":
-            _send_unicast(sock, addr, _build_payload())
-            return
+    msg_type = payload.get("type")
+    if msg_type == "discover":
+        # Cached by the announce task; at most one interval old.
+        if protocol.announcement:
+            protocol.send(protocol.announcement, addr)
+        return
 
-        if "mirror_id" in payload or "hostname" in payload:
-            _update_peer_from_payload(payload, addr[0])
+    if "mirror_id" not in payload and "hostname" not in payload:
+        return
 
+    # Heartbeats carry every field PeerTable stores, so they are recorded
+    # as-is; an unseen digest means we missed a full announce, so ask for one.
+    key = payload.get("mirror_id") or payload.get("hostname")
+    digest = payload.get("digest")
+    if msg_type == "heartbeat" and digest and known_digests.get(key) != digest:
+        protocol.send({"type": "discover"}, addr)
+    elif digest:
+        if len(known_digests) > 4096:
+            known_digests.clear()
+        known_digests[key] = digest
 
-def _send_unicast(sock: socket.socket, addr: tuple[str, int], payload: dict) -> None:
-    try:
-        data = json.dumps(payload).encode("utf-8")
-        sock.sendto(data, addr)
-    except Exception as exc:
-        _LOG.debug("Discovery response failed: %s", exc)
+    peers.record(payload, addr[0])
 
 
-def _update_peer_from_payload(payload: dict, fallback_ip: str) -> None:
-    mirror_id = payload.get("mirror_id")
-    hostname = payload.get("hostname") or mirror_id
-    if not hostname:
-        return
+def _payload_digest(payload: dict) -> str:
+    stable = {k: v for k, v in payload.items() if k not in ("timestamp", "digest")}
+    raw = json.dumps(stable, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(raw).hexdigest()[:16]
 
-    if mirror_id and mirror_id == getattr(settings, "MIRROR_ID", settings.HOSTNAME):
-        return
-    if hostname == settings.HOSTNAME:
-        return
 
-    ip_value = payload.get("ip") or fallback_ip
-    ip_value = ip_value if _is_ip(ip_value) else fallback_ip
-
-    port_value = payload.get("port")
-    port = int(port_value) if isinstance(port_value, (int, float)) else _get_backend_port()
-
-    meta = payload.get("metadata")
-    if not isinstance(meta, dict):
-        meta = {}
-    if mirror_id:
-        meta["mirror_id"] = mirror_id
-
-    close_old_connections()
-    Mirror.objects.update_or_create(
-        hostname=hostname,
-        defaults={
-            "ip": ip_value,
-            "port": port,
-            "last_seen": timezone.now(),
-            "metadata": meta,
-        },
-    )
+def _full_announcement(payload: dict) -> dict:
+    return {**payload, "digest": _payload_digest(payload)}
+
+
+def _heartbeat(payload: dict, digest: str) -> dict:
+    # Same JSON shape as an announce minus base_url/timestamp, so older
+    # mirrors still record the peer from it.
+    return {
+        "type": "heartbeat",
+        "mirror_id": payload["mirror_id"],
+        "hostname": payload["hostname"],
+        "ip": payload["ip"],
+        "port": payload["port"],
+        "digest": digest,
+    }
+
+
+class _Peer:
+    __slots__ = ("hostname", "mirror_identity", "ip", "port", "metadata", "last_seen", "written", "written_seen")
+
+    def __init__(self, hostname, mirror_identity, ip, port, metadata, last_seen):
+        self.hostname = hostname
+        self.mirror_identity = mirror_identity
+        self.ip = ip
+        self.port = port
+        self.metadata = metadata
+        self.last_seen = last_seen
+        # Field values and last_seen as of the last flush (None: never written).
+        self.written = None
+        self.written_seen = None
+
+    def fields(self):
+        return (self.hostname, self.mirror_identity, self.ip, self.port, self.metadata)
+
+
+class PeerTable:
+    """
+    In-memory view of announcing peers, written to Mirror rows in batches.
+
+    Announcements only touch memory. flush() writes the peers whose
+    identity, address or metadata changed, plus those whose last_seen has
+    drifted more than `last_seen_tolerance` seconds from the stored value,
+    in one transaction (one SELECT, one bulk_update, one bulk_create).
+    """
+
+    def __init__(self, last_seen_tolerance: float = 60):
+        self.last_seen_tolerance = last_seen_tolerance
+        self._lock = threading.Lock()
+        self._peers = {}
+
+    def record(self, payload: dict, fallback_ip: str) -> None:
+        mirror_id = payload.get("mirror_id")
+        hostname = payload.get("hostname") or mirror_id
+        if not hostname:
+            return
+
+        if mirror_id and mirror_id == getattr(settings, "MIRROR_ID", settings.HOSTNAME):
+            return
+        if hostname == settings.HOSTNAME:
+            return
+
+        ip_value = payload.get("ip") or fallback_ip
+        ip_value = ip_value if _is_ip(ip_value) else fallback_ip
+
+        port_value = payload.get("port")
+        port = int(port_value) if isinstance(port_value, (int, float)) else _get_backend_port()
+
+        meta = payload.get("metadata")
+        if not isinstance(meta, dict):
+            meta = {}
+        if mirror_id:
+            meta["mirror_id"] = mirror_id
+        base_url = payload.get("base_url")
+        if isinstance(base_url, str) and base_url:
+            # Where the transfer engine pulls this peer's media from.
+            meta["base_url"] = base_url
+
+        key = mirror_id or hostname
+        now = timezone.now()
+        with self._lock:
+            peer = self._peers.get(key)
+            if peer is None:
+                self._peers[key] = _Peer(hostname, mirror_id, ip_value, port, meta, now)
+                return
+            peer.hostname = hostname
+            peer.mirror_identity = mirror_id
+            peer.ip = ip_value
+            peer.port = port
+            if payload.get("type") != "heartbeat":
+                # Heartbeats omit base_url/metadata; keep the last full set.
+                peer.metadata = meta
+            peer.last_seen = now
+
+    def get(self, key):
+        """
+        Latest announced (hostname, mirror_identity, ip, port, metadata) of
+        a peer by MIRROR_ID or hostname, flushed or not, or None.
+        """
+        with self._lock:
+            peer = self._peers.get(key)
+            return peer.fields() if peer is not None else None
+
+    def _pending(self):
+        tolerance = timedelta(seconds=self.last_seen_tolerance)
+        with self._lock:
+            return [
+                (peer, peer.fields(), peer.last_seen)
+                for peer in self._peers.values()
+                if peer.written != peer.fields()
+                or peer.last_seen - peer.written_seen >= tolerance
+            ]
+
+    def flush(self) -> int:
+        """Writes pending peers; returns how many rows were written."""
+        pending = self._pending()
+        if not pending:
+            return 0
+
+        close_old_connections()
+        try:
+            with transaction.atomic():
+                self._write(pending)
+        except IntegrityError:
+            # Usually a hostname taken over by another identity; retry peer
+            # by peer so one conflict does not hold back the rest.
+            written = []
+            for item in pending:
+                try:
+                    with transaction.atomic():
+                        self._write([item])
+                    written.append(item)
+                except IntegrityError:
+                    _LOG.warning(
+                        "Discovery: hostname %s already used by another mirror identity",
+                        item[1][0],
+                    )
+            pending = written
+
+        with self._lock:
+            for peer, fields, seen in pending:
+                peer.written = fields
+                peer.written_seen = seen
+        return len(pending)
+
+    def _write(self, pending) -> None:
+        hostnames = {fields[0] for _, fields, _ in pending}
+        identities = {fields[1] for _, fields, _ in pending if fields[1]}
+        existing = list(Mirror.objects.filter(Q(hostname__in=hostnames) | Q(mirror_identity__in=identities)))
+        by_identity = {m.mirror_identity: m for m in existing if m.mirror_identity}
+        by_hostname = {m.hostname: m for m in existing}
+
+        to_update, to_create = [], []
+        for _, (hostname, mirror_identity, ip, port, metadata), seen in pending:
+            # Prefer the row holding this identity, so a peer that changes
+            # hostname keeps its row; fall back to hostname for old rows.
+            mirror = by_identity.get(mirror_identity) if mirror_identity else None
+            if mirror is None:
+                mirror = by_hostname.get(hostname)
+                if mirror is not None and mirror_identity and mirror.mirror_identity not in (None, mirror_identity):
+                    # Never hand another identity's row to this peer.
+                    _LOG.warning(
+                        "Discovery: hostname %s already used by another mirror identity",
+                        hostname,
+                    )
+                    continue
+            if mirror is None:
+                mirror = Mirror()
+                to_create.append(mirror)
+            else:
+                to_update.append(mirror)
+
+            mirror.hostname = hostname
+            if mirror_identity:
+                mirror.mirror_identity = mirror_identity
+            mirror.ip = ip
+            mirror.port = port
+            mirror.metadata = metadata
+            mirror.last_seen = seen
+
+        if to_update:
+            Mirror.objects.bulk_update(
+                to_update,
+                ["hostname", "mirror_identity", "ip", "port", "metadata", "last_seen"],
+            )
+        if to_create:
+            Mirror.objects.bulk_create(to_create, ignore_conflicts=True)
+
+
+peers = PeerTable(getattr(settings, "DISCOVERY_LAST_SEEN_TOLERANCE_SECONDS", 60))
 
 
 def _build_payload() -> dict:
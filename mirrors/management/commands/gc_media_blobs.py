@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from mirrors.media_store import collect_garbage
+
+
+class Command(BaseCommand):
+    help = "Delete content-addressed video blobs that no Video references"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="List the blobs that would be deleted without deleting them.",
+        )
+        parser.add_argument(
+            "--min-age",
+            type=int,
+            default=None,
+            help="Only consider blobs untouched for this many seconds.",
+        )
+
+    def handle(self, *args, **kwargs):
+        min_age = kwargs.get("min_age")
+        if min_age is None:
+            min_age = getattr(settings, "MEDIA_BLOB_GC_MIN_AGE_SECONDS", 3600)
+        dry_run = kwargs.get("dry_run", False)
+
+        removed = collect_garbage(min_age, dry_run=dry_run)
+        for name, size in removed:
+            self.stdout.write(f"{name} ({size} bytes)")
+
+        total = sum(size for _, size in removed)
+        verb = "Would delete" if dry_run else "Deleted"
+        self.stdout.write(self.style.SUCCESS(f"✔ {verb} {len(removed)} blob(s), {total} bytes"))
@@ -2,6 +2,8 @@ from django.core.management.base import BaseCommand
 import os
 import secrets
 
+from utils.media_crypto import generate_key
+
 ENV_TEMPLATE = """
 DJANGO_SECRET_KEY={secret}
 DEBUG=1
@@ -12,6 +14,7 @@ MIRROR_ID=mirror-001
 DB_NAME=db/smart_mirror.db
 
 MEDIA_ROOT=media/
+MEDIA_ENCRYPTION_KEY={media_key}
 
 TRANSFER_PRIVATE_KEY_PATH=keys/private.pem
 TRANSFER_PUBLIC_KEY_PATH=keys/public.pem
@@ -28,6 +31,7 @@ DISCOVERY_HOSTNAME=
 DISCOVERY_HOSTNAME_SUFFIX=
 
 LOG_LEVEL=INFO
+LOG_FORMAT=json
 """
 
 class Command(BaseCommand):
@@ -44,7 +48,7 @@ class Command(BaseCommand):
         force = kwargs.get("force", False)
         secret_key = secrets.token_hex(32)
 
-        env_contents = ENV_TEMPLATE.format(secret=secret_key)
+        env_contents = ENV_TEMPLATE.format(secret=secret_key, media_key=generate_key())
 
         if os.path.exists(".env") and not force:
             self.stdout.write(self.style.WARNING(".env already exists! Not overwriting."))
@@ -0,0 +1,50 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from mirrors.media_jobs import run_pending_jobs
+from mirrors.reconciler import reconcile_missing_durations
+
+
+class Command(BaseCommand):
+    help = "Queue probe jobs for videos with a missing duration and run them"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="Videos queued per batch.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Maximum number of concurrent ffprobe processes.",
+        )
+        parser.add_argument(
+            "--enqueue-only",
+            action="store_true",
+            help="Only queue the jobs and leave them to the server's media worker.",
+        )
+
+    def handle(self, *args, **kwargs):
+        enqueued = reconcile_missing_durations(batch_size=kwargs.get("batch_size"))
+        self.stdout.write(f"Queued {enqueued} probe job(s)")
+        if kwargs.get("enqueue_only"):
+            return
+
+        workers = kwargs.get("workers") or getattr(settings, "METADATA_SWEEP_WORKERS", 2)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mirror-probe") as pool:
+            processed = sum(pool.map(lambda _: _drain(), range(workers)))
+        self.stdout.write(self.style.SUCCESS(f"✔ Ran {processed} media job(s)"))
+
+
+def _drain() -> int:
+    # Jobs are claimed by conditional update, so the threads never overlap.
+    try:
+        return run_pending_jobs()
+    finally:
+        connection.close()
@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from mirrors.models import Video
+from mirrors.thumbnails import ThumbnailService
+
+
+class Command(BaseCommand):
+    help = "Render grid and detail thumbnails for videos in bulk"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--missing-only",
+            action="store_true",
+            help="Only videos without a thumbnail.",
+        )
+        parser.add_argument(
+            "--session",
+            default=None,
+            help="Limit to one session id.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Maximum number of concurrent ffmpeg processes.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Videos fetched from the database per batch.",
+        )
+        parser.add_argument(
+            "--ffmpeg",
+            default=None,
+            help="ffmpeg executable (defaults to FFMPEG_BINARY).",
+        )
+
+    def handle(self, *args, **kwargs):
+        videos = Video.objects.exclude(file="").order_by("pk")
+        if kwargs.get("missing_only"):
+            # IN ('', NULL) never matches NULL, so test it separately.
+            videos = videos.filter(Q(thumbnail="") | Q(thumbnail__isnull=True))
+        if kwargs.get("session"):
+            videos = videos.filter(session_id=kwargs["session"])
+
+        service = ThumbnailService(
+            ffmpeg_binary=kwargs.get("ffmpeg"),
+            max_workers=kwargs.get("workers"),
+        )
+        batch_size = max(kwargs.get("batch_size") or 100, 1)
+
+        rendered = failed = 0
+        last_pk = None
+        try:
+            while True:
+                page = videos if last_pk is None else videos.filter(pk__gt=last_pk)
+                batch = list(page[:batch_size])
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+
+                for video, _, error in service.render_many(batch):
+                    if error is None:
+                        rendered += 1
+                    else:
+                        failed += 1
+                        self.stderr.write(f"{video.pk}: {error}")
+        finally:
+            service.shutdown()
+
+        style = self.style.SUCCESS if not failed else self.style.WARNING
+        self.stdout.write(style(f"✔ Rendered thumbnails for {rendered} video(s), {failed} failed"))
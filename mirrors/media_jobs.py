@@ -0,0 +1,234 @@
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import F
+from django.utils import timezone
+
+from .models import MediaJob, Video
+from .thumbnails import get_thumbnail_service
+from .utils import get_video_duration_seconds
+
+_LOG = logging.getLogger(__name__)
+_thread = None
+_stop_event = threading.Event()
+_wake_event = threading.Event()
+# Jobs this process is running right now; never treated as stale here.
+_running_job_ids = set()
+
+
+class MediaJobError(Exception):
+    pass
+
+
+def enqueue_video_jobs(video: Video, kinds=None) -> list[MediaJob]:
+    """
+    Queues post-processing for a video and marks it pending.
+    Returns immediately; the worker thread fills in the results.
+    """
+    if kinds is None:
+        kinds = (MediaJob.KIND_PROBE, MediaJob.KIND_THUMBNAIL)
+
+    max_attempts = getattr(settings, "MEDIA_JOB_MAX_ATTEMPTS", 3)
+    jobs = MediaJob.objects.bulk_create(
+        [MediaJob(video=video, kind=kind, max_attempts=max_attempts) for kind in kinds]
+    )
+
+    if video.processing_status != Video.PROCESSING_PENDING:
+        video.processing_status = Video.PROCESSING_PENDING
+        video.save(update_fields=["processing_status"])
+
+    _wake_event.set()
+    return jobs
+
+
+def enqueue_probe_jobs(video_ids) -> int:
+    """
+    Bulk version of enqueue_video_jobs for probe jobs, used by the
+    metadata sweeper. Returns the number of jobs queued.
+    """
+    video_ids = list(video_ids)
+    if not video_ids:
+        return 0
+    max_attempts = getattr(settings, "MEDIA_JOB_MAX_ATTEMPTS", 3)
+    MediaJob.objects.bulk_create(
+        [MediaJob(video_id=pk, kind=MediaJob.KIND_PROBE, max_attempts=max_attempts) for pk in video_ids]
+    )
+    Video.objects.filter(pk__in=video_ids).update(processing_status=Video.PROCESSING_PENDING)
+    _wake_event.set()
+    return len(video_ids)
+
+
+def start_media_worker() -> None:
+    if not getattr(settings, "MEDIA_WORKER_ENABLED", False):
+        return
+    global _thread
+    if _thread and _thread.is_alive():
+        return
+    _stop_event.clear()
+    _thread = threading.Thread(
+        target=_worker_loop,
+        name="mirror-media-jobs",
+        daemon=True,
+    )
+    _thread.start()
+
+
+def stop_media_worker() -> None:
+    _stop_event.set()
+    _wake_event.set()
+
+
+def run_pending_jobs(limit: int | None = None) -> int:
+    """
+    Runs due jobs in the calling thread until the queue is drained
+    (or `limit` jobs ran). Returns the number of jobs processed.
+    """
+    processed = 0
+    while limit is None or processed < limit:
+        job = _claim_next_job()
+        if job is None:
+            break
+        _running_job_ids.add(job.pk)
+        try:
+            _run_job(job)
+        finally:
+            _running_job_ids.discard(job.pk)
+        processed += 1
+    return processed
+
+
+def _worker_loop() -> None:
+    poll_seconds = getattr(settings, "MEDIA_JOB_POLL_SECONDS", 2)
+
+    close_old_connections()
+    try:
+        requeue_stale_jobs()
+    except Exception as exc:
+        _LOG.warning("Media job recovery failed: %s", exc)
+
+    while not _stop_event.is_set():
+        close_old_connections()
+        try:
+            processed = run_pending_jobs()
+        except Exception:
+            _LOG.exception("Media job worker iteration failed")
+            processed = 0
+
+        if not processed:
+            _wake_event.wait(poll_seconds)
+            _wake_event.clear()
+
+    connection.close()
+
+
+def requeue_stale_jobs() -> int:
+    """
+    Puts jobs left "running" by a worker that died mid-job back in the
+    queue. Runs when the worker starts and on every metadata sweep, so a
+    crash is recovered without a restart. Returns the number requeued.
+    """
+    stale_seconds = getattr(settings, "MEDIA_JOB_STALE_SECONDS", 600)
+    cutoff = timezone.now() - timedelta(seconds=stale_seconds)
+    requeued = MediaJob.objects.filter(
+        status=MediaJob.STATUS_RUNNING,
+        updated_at__lt=cutoff,
+    ).exclude(pk__in=list(_running_job_ids)).update(
+        status=MediaJob.STATUS_PENDING,
+        updated_at=timezone.now(),
+    )
+    if requeued:
+        _wake_event.set()
+    return requeued
+
+
+def _claim_next_job() -> MediaJob | None:
+    now = timezone.now()
+    candidates = MediaJob.objects.filter(
+        status=MediaJob.STATUS_PENDING,
+        run_after__lte=now,
+    ).values_list("pk", flat=True)[:5]
+
+    for pk in candidates:
+        # Conditional update so concurrent workers never run the same job.
+        claimed = MediaJob.objects.filter(
+            pk=pk,
+            status=MediaJob.STATUS_PENDING,
+        ).update(
+            status=MediaJob.STATUS_RUNNING,
+            attempts=F("attempts") + 1,
+            updated_at=now,
+        )
+        if claimed:
+            return MediaJob.objects.select_related("video").get(pk=pk)
+    return None
+
+
+def _run_job(job: MediaJob) -> None:
+    handler = _HANDLERS.get(job.kind)
+    try:
+        if handler is None:
+            raise MediaJobError(f"Unknown job kind: {job.kind}")
+        handler(job.video)
+    except Exception as exc:
+        _record_failure(job, exc)
+    else:
+        job.status = MediaJob.STATUS_DONE
+        job.last_error = ""
+        job.save(update_fields=["status", "last_error", "updated_at"])
+
+    _refresh_processing_status(job.video_id)
+
+
+def _record_failure(job: MediaJob, exc: Exception) -> None:
+    job.last_error = str(exc) or exc.__class__.__name__
+    if job.attempts < job.max_attempts:
+        retry_seconds = getattr(settings, "MEDIA_JOB_RETRY_SECONDS", 5)
+        delay = retry_seconds * (2 ** max(job.attempts - 1, 0))
+        job.status = MediaJob.STATUS_PENDING
+        job.run_after = timezone.now() + timedelta(seconds=delay)
+        _LOG.info(
+            "Media job %s (%s) failed, retrying in %ss: %s",
+            job.id, job.kind, delay, job.last_error,
+        )
+    else:
+        job.status = MediaJob.STATUS_FAILED
+        _LOG.warning(
+            "Media job %s (%s) failed permanently: %s",
+            job.id, job.kind, job.last_error,
+        )
+    job.save(update_fields=["status", "run_after", "last_error", "updated_at"])
+
+
+def _refresh_processing_status(video_id) -> None:
+    statuses = set(
+        MediaJob.objects.filter(video_id=video_id).values_list("status", flat=True)
+    )
+    if statuses & {MediaJob.STATUS_PENDING, MediaJob.STATUS_RUNNING}:
+        processing_status = Video.PROCESSING_PENDING
+    elif MediaJob.STATUS_FAILED in statuses:
+        processing_status = Video.PROCESSING_FAILED
+    else:
+        processing_status = Video.PROCESSING_READY
+
+    Video.objects.filter(pk=video_id).update(processing_status=processing_status)
+
+
+def _probe_duration(video: Video) -> None:
+    with video.file.storage.plaintext_path(video.file.name) as path:
+        duration_seconds = get_video_duration_seconds(path)
+    if duration_seconds is None:
+        raise MediaJobError("ffprobe returned no duration")
+    Video.objects.filter(pk=video.pk).update(duration_seconds=duration_seconds)
+
+
+def _generate_thumbnail(video: Video) -> None:
+    get_thumbnail_service().render_video(video)
+
+
+_HANDLERS = {
+    MediaJob.KIND_PROBE: _probe_duration,
+    MediaJob.KIND_THUMBNAIL: _generate_thumbnail,
+}
@@ -0,0 +1,152 @@
+import logging
+import os
+import time
+from pathlib import Path
+
+from utils.storage import BLOB_PREFIX, is_blob_name, video_storage
+
+from .models import Video
+
+_LOG = logging.getLogger(__name__)
+
+# A blob rewritten (or reused) this recently may be about to gain a row
+# that is not committed yet; leave it to gc_media_blobs instead.
+_RELEASE_GRACE_SECONDS = 30
+
+ORIGINAL_FILENAME_KEY = "original_filename"
+
+
+def save_video_file(video, name, content) -> None:
+    """
+    Stores `content` as the video's file (without saving the row) and
+    records whether it ended up encrypted at rest. With shared blobs that
+    depends on the stored copy, not on the current key setting.
+
+    Blobs are named by hash, so the uploaded name is kept in
+    metadata["original_filename"] (unless it is already set, e.g. by a
+    transfer) for exports and downloads.
+    """
+    metadata = dict(video.metadata or {})
+    metadata.setdefault(ORIGINAL_FILENAME_KEY, _clean_filename(name))
+    video.metadata = metadata
+    video.file.save(name, content, save=False)
+    video.encrypted = video.file.storage.is_encrypted(video.file.name)
+
+
+def download_name(video) -> str:
+    """
+    File name to offer when a video is downloaded or exported: the name it
+    was uploaded under, else its stored name.
+    """
+    name = _clean_filename((video.metadata or {}).get(ORIGINAL_FILENAME_KEY, ""))
+    if not name:
+        name = _clean_filename(video.file.name) or f"{video.id}.mp4"
+    return name
+
+
+def _clean_filename(name) -> str:
+    # Peers and clients supply these; keep only a plain base name.
+    name = os.path.basename(str(name or "").replace("\\", "/"))
+    return "".join(ch for ch in name if ch.isprintable() and ch not in '"').strip(". ")
+
+
+def find_blob(digest: str):
+    """
+    Name of a stored blob with this SHA-256, or None. Only blobs some
+    Video row points at are considered, so the answer is backed by a row
+    whose checksum was verified when it was written.
+    """
+    if not digest:
+        return None
+    storage = video_storage()
+    names = (
+        Video.objects.filter(sha256=digest, file__startswith=f"{BLOB_PREFIX}/")
+        .values_list("file", flat=True)
+        .distinct()
+    )
+    for name in names:
+        try:
+            # Claim it: a fresh mtime keeps release and GC off the blob.
+            os.utime(storage.path(name))
+        except FileNotFoundError:
+            continue
+        return name
+    return None
+
+
+def release_video_file(name: str) -> bool:
+    """
+    Deletes a video file once no Video row references it. Blobs are
+    shared, so this is called after the row is gone rather than in its
+    place. Returns True when the file was removed.
+    """
+    if not name or Video.objects.filter(file=name).exists():
+        return False
+
+    storage = video_storage()
+    if is_blob_name(name):
+        try:
+            age = time.time() - os.path.getmtime(storage.path(name))
+        except FileNotFoundError:
+            return False
+        if age < _RELEASE_GRACE_SECONDS:
+            return False
+
+    storage.delete(name)
+    return True
+
+
+def unreferenced_blobs(min_age_seconds: float):
+    """
+    Yields (name, size) for blobs on disk that no Video row references
+    and that have not been written or reused in the last min_age_seconds.
+    """
+    storage = video_storage()
+    root = Path(storage.path(BLOB_PREFIX))
+    if not root.is_dir():
+        return
+
+    referenced = set(
+        Video.objects.filter(file__startswith=f"{BLOB_PREFIX}/")
+        .values_list("file", flat=True)
+        .iterator(chunk_size=2000)
+    )
+    location = Path(storage.location)
+    cutoff = time.time() - min_age_seconds
+
+    for path in root.rglob("*"):
+        if not path.is_file():
+            continue
+        name = path.relative_to(location).as_posix()
+        if name in referenced:
+            continue
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        if stat.st_mtime > cutoff:
+            continue
+        yield name, stat.st_size
+
+
+def collect_garbage(min_age_seconds: float, dry_run: bool = False):
+    """
+    Removes unreferenced blobs (see unreferenced_blobs). Each candidate is
+    re-checked against the database right before it is deleted. Returns
+    the list of (name, size) removed, or that would be with dry_run.
+    """
+    storage = video_storage()
+    removed = []
+    for name, size in unreferenced_blobs(min_age_seconds):
+        if not dry_run:
+            if Video.objects.filter(file=name).exists():
+                continue
+            storage.delete(name)
+        removed.append((name, size))
+
+    if removed and not dry_run:
+        _LOG.info(
+            "Removed %d unreferenced blob(s), %d bytes",
+            len(removed), sum(size for _, size in removed),
+        )
+    return removed
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mirrors', '0007_video_processing_status_mediajob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['session', 'created_at'], name='mirrors_vid_session_8e67c2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['created_at', 'id'], name='mirrors_vid_created_50bd36_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+from django.db import migrations
+
+# PostgreSQL-only indexes for hub deployments (see DATABASE_URL). SQLite
+# mirrors hold a handful of Mirror rows and gain nothing from them.
+#
+# The GIN index serves containment (metadata__contains / has_key)
+# lookups. Identity lookups go through the indexed mirror_identity column
+# added in 0010, so metadata -> 'mirror_id' gets no index of its own.
+POSTGRES_INDEXES = (
+    (
+        "mirrors_mirror_metadata_gin",
+        "CREATE INDEX IF NOT EXISTS mirrors_mirror_metadata_gin "
+        "ON mirrors_mirror USING gin (metadata jsonb_path_ops)",
+    ),
+)
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for _, sql in POSTGRES_INDEXES:
+        schema_editor.execute(sql)
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, _ in POSTGRES_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("mirrors", "0008_video_list_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:16
+
+from django.db import migrations, models
+
+
+def backfill_mirror_identity(apps, schema_editor):
+    Mirror = apps.get_model("mirrors", "Mirror")
+    seen = set()
+    batch = []
+    for mirror in Mirror.objects.order_by("-last_seen").iterator():
+        identity = (mirror.metadata or {}).get("mirror_id")
+        if not isinstance(identity, str) or not identity or identity in seen:
+            # Most recently seen row wins a duplicated identity.
+            continue
+        seen.add(identity)
+        mirror.mirror_identity = identity[:128]
+        batch.append(mirror)
+    Mirror.objects.bulk_update(batch, ["mirror_identity"], batch_size=500)
+
+
+def drop_identity_expression_index(apps, schema_editor):
+    # Earlier builds of 0009 created a btree on (metadata -> 'mirror_id').
+    # The mirror_identity column supersedes it, so 0009 no longer creates
+    # it; drop it where it was created.
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS mirrors_mirror_meta_mirror_id_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mirrors', '0009_mirror_metadata_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mirror',
+            name='mirror_identity',
+            field=models.CharField(blank=True, max_length=128, null=True, unique=True),
+        ),
+        migrations.RunPython(backfill_mirror_identity, migrations.RunPython.noop),
+        migrations.RunPython(drop_identity_expression_index, migrations.RunPython.noop),
+    ]
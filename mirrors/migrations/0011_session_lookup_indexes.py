@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mirrors', '0010_mirror_identity'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='session',
+            index=models.Index(fields=['user_id', 'mirror', 'status', 'activated_at'], name='mirrors_ses_user_id_a2eb15_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='session',
+            index=models.Index(fields=['mirror', 'status', 'started_at'], name='mirrors_ses_mirror__293fdf_idx'),
+        ),
+    ]
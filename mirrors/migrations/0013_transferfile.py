@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mirrors', '0012_transferrequest_status_receipts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransferFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('video_id', models.UUIDField(unique=True)),
+                ('size', models.BigIntegerField()),
+                ('sha256', models.CharField(max_length=64)),
+                ('chunk_size', models.IntegerField()),
+                ('chunk_hashes', models.JSONField(default=list)),
+                ('chunks_done', models.IntegerField(default=0)),
+                ('partial_path', models.CharField(max_length=512)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('transfer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='files', to='mirrors.transferrequest')),
+            ],
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 00:27
+
+import utils.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mirrors', '0013_transferfile'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='video',
+            name='file',
+            field=models.FileField(storage=utils.storage.video_storage, upload_to='videos/%Y/%m/%d/'),
+        ),
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['file'], name='mirrors_vid_file_d65ac2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['sha256'], name='mirrors_vid_sha256_a430c1_idx'),
+        ),
+    ]
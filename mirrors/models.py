@@ -1,6 +1,7 @@
 from django.db import models
 import uuid
 from django.utils import timezone
+from utils.storage import video_storage
 
 class Mirror(models.Model):
     """
@@ -8,6 +9,9 @@ class Mirror(models.Model):
     """
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     hostname = models.CharField(max_length=128, unique=True)
+    # MIRROR_ID advertised by the device (also kept in metadata["mirror_id"]
+    # for older peers); indexed so identity lookups avoid JSON scans.
+    mirror_identity = models.CharField(max_length=128, unique=True, null=True, blank=True)
     ip = models.GenericIPAddressField(null=True, blank=True)
     port = models.IntegerField(default=8000)
     public_key = models.TextField(blank=True, null=True)
@@ -74,6 +78,12 @@ class Session(models.Model):
 
     class Meta:
         ordering = ("-started_at",)
+        indexes = [
+            # QR activation: resume lookup by user on this mirror
+            models.Index(fields=["user_id", "mirror", "status", "activated_at"]),
+            # QR status / peer listings: sessions of a mirror by status
+            models.Index(fields=["mirror", "status", "started_at"]),
+        ]
 
     @property
     def is_active(self):
@@ -109,11 +119,21 @@ class Session(models.Model):
 
 
 class Video(models.Model):
+    PROCESSING_PENDING = "pending"
+    PROCESSING_READY = "ready"
+    PROCESSING_FAILED = "failed"
+    PROCESSING_CHOICES = [
+        (PROCESSING_PENDING, "Pending"),
+        (PROCESSING_READY, "Ready"),
+        (PROCESSING_FAILED, "Failed"),
+    ]
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     session = models.ForeignKey(Session, on_delete=models.CASCADE, related_name="videos")
     created_at = models.DateTimeField(auto_now_add=True)
 
-    file = models.FileField(upload_to="videos/%Y/%m/%d/")
+    # Content-addressed: identical clips share one blob, see utils.storage
+    file = models.FileField(upload_to="videos/%Y/%m/%d/", storage=video_storage)
     thumbnail = models.ImageField(
         upload_to="thumbnails/%Y/%m/%d/",
         null=True,
@@ -127,11 +147,85 @@ class Video(models.Model):
     encrypted = models.BooleanField(default=True)
     metadata = models.JSONField(default=dict, blank=True)
 
+    # Background probe/thumbnail state, see mirrors.media_jobs
+    processing_status = models.CharField(
+        max_length=16,
+        choices=PROCESSING_CHOICES,
+        default=PROCESSING_READY,
+    )
+
+    class Meta:
+        indexes = [
+            # Keyset pagination for videos/list, see VideoListView
+            models.Index(fields=["session", "created_at"]),
+            models.Index(fields=["created_at", "id"]),
+            # Blob reference counts and transfer dedup, see mirrors.media_store
+            models.Index(fields=["file"]),
+            models.Index(fields=["sha256"]),
+        ]
+
     def __str__(self):
         return f"Video {self.id} for Session {self.session_id}"
 
 
+class MediaJob(models.Model):
+    """
+    A unit of post-processing work (ffprobe / ffmpeg) for a Video,
+    picked up by the background worker in mirrors.media_jobs.
+    """
+    KIND_PROBE = "probe"
+    KIND_THUMBNAIL = "thumbnail"
+    KIND_CHOICES = [
+        (KIND_PROBE, "Probe duration"),
+        (KIND_THUMBNAIL, "Generate thumbnail"),
+    ]
+
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_DONE, "Done"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name="jobs")
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING)
+
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ("created_at",)
+        indexes = [
+            models.Index(fields=["status", "run_after"]),
+        ]
+
+    def __str__(self):
+        return f"MediaJob {self.kind} for Video {self.video_id} ({self.status})"
+
+
 class TransferRequest(models.Model):
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_DONE, "Done"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     session = models.ForeignKey(Session, on_delete=models.CASCADE)
     from_mirror = models.ForeignKey(Mirror, on_delete=models.CASCADE, related_name="outgoing_transfers")
@@ -145,5 +239,44 @@ class TransferRequest(models.Model):
     completed_at = models.DateTimeField(null=True, blank=True)
     logs = models.JSONField(default=list, blank=True)
 
+    # Pull progress on the receiving mirror, see mirrors.transfer
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    # {video_id: sha256} of every video received and verified
+    receipts = models.JSONField(default=dict, blank=True)
+
     def __str__(self):
         return f"Transfer {self.session_id}: {self.from_mirror.hostname} → {self.to_mirror.hostname}"
+
+
+class TransferFile(models.Model):
+    """
+    Receiver-side progress of one video's chunked download. Chunks are
+    verified against the source's manifest and appended to `partial_path`;
+    `chunks_done` is the verified prefix, so a dropped link resumes from
+    chunks_done * chunk_size instead of from zero. Keyed by video so a
+    later transfer of the same video picks up where the last one stopped.
+    """
+    video_id = models.UUIDField(unique=True)
+    transfer = models.ForeignKey(
+        TransferRequest,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="files",
+    )
+
+    size = models.BigIntegerField()
+    sha256 = models.CharField(max_length=64)
+    chunk_size = models.IntegerField()
+    chunk_hashes = models.JSONField(default=list)
+    chunks_done = models.IntegerField(default=0)
+    partial_path = models.CharField(max_length=512)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def offset(self) -> int:
+        return min(self.chunks_done * self.chunk_size, self.size)
+
+    def __str__(self):
+        return f"TransferFile {self.video_id} ({self.chunks_done}/{len(self.chunk_hashes)})"
@@ -0,0 +1,99 @@
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+
+_LOG = logging.getLogger(__name__)
+
+# Change counter for Session rows. Long-poll views block on it instead of
+# the client hammering the status endpoint.
+#
+# Within a process the counter is bumped directly. Across gunicorn worker
+# processes, notify_session_changed() also touches SESSION_NOTIFY_FILE; a
+# watcher thread in each process that has waiters stats that file every
+# SESSION_NOTIFY_POLL_SECONDS and bumps its own counter when the mtime
+# moves. A stat is far cheaper than the database recheck it replaces.
+_condition = threading.Condition()
+_version = 0
+_waiters = 0
+_watcher = None
+
+
+def notify_session_changed() -> None:
+    _bump()
+    path = _notify_path()
+    if not path:
+        return
+    try:
+        with open(path, "a"):
+            pass
+        os.utime(path)
+    except OSError as exc:
+        _LOG.warning("Could not signal session change through %s: %s", path, exc)
+
+
+def current_session_version() -> int:
+    with _condition:
+        return _version
+
+
+def wait_for_session_change(version: int, timeout: float) -> int:
+    """
+    Blocks until a session change newer than `version` is signalled, in
+    this process or another one, or the timeout elapses. Returns the
+    latest version either way.
+    """
+    global _waiters
+    _ensure_watcher()
+    with _condition:
+        _waiters += 1
+        _condition.notify_all()  # starts the watcher polling
+        try:
+            _condition.wait_for(lambda: _version != version, timeout)
+        finally:
+            _waiters -= 1
+        return _version
+
+
+def _bump() -> None:
+    global _version
+    with _condition:
+        _version += 1
+        _condition.notify_all()
+
+
+def _notify_path() -> str:
+    return str(getattr(settings, "SESSION_NOTIFY_FILE", "") or "")
+
+
+def _ensure_watcher() -> None:
+    global _watcher
+    if not _notify_path():
+        return
+    with _condition:
+        if _watcher is not None and _watcher.is_alive():
+            return
+        _watcher = threading.Thread(target=_watch_loop, name="mirror-session-notify", daemon=True)
+        _watcher.start()
+
+
+def _watch_loop() -> None:
+    last = _stamp()
+    while True:
+        with _condition:
+            # Idle processes only wake for the next waiter.
+            _condition.wait_for(lambda: _waiters > 0)
+        time.sleep(getattr(settings, "SESSION_NOTIFY_POLL_SECONDS", 0.1))
+        stamp = _stamp()
+        if stamp != last:
+            last = stamp
+            _bump()
+
+
+def _stamp():
+    try:
+        return os.stat(_notify_path()).st_mtime_ns
+    except OSError:
+        return None
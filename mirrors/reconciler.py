@@ -0,0 +1,114 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+
+from .media_jobs import enqueue_probe_jobs, requeue_stale_jobs
+from .media_store import collect_garbage
+from .models import MediaJob, Video
+
+_LOG = logging.getLogger(__name__)
+_thread = None
+_stop_event = threading.Event()
+
+
+def reconcile_missing_durations(batch_size: int | None = None) -> int:
+    """
+    Queues a probe MediaJob for every video without a duration that has
+    no probe job outstanding. The media worker runs them, so backfill
+    probes get the queue's claim-by-update and max_attempts: a file
+    ffprobe cannot read ends as a failed job instead of being probed on
+    every sweep, and sweepers in several processes never probe the same
+    video twice. Returns the number of jobs queued.
+    """
+    batch_size = batch_size or getattr(settings, "METADATA_SWEEP_BATCH_SIZE", 50)
+
+    # Videos with an outstanding or exhausted probe job belong to the job queue.
+    queued = MediaJob.objects.filter(kind=MediaJob.KIND_PROBE).exclude(
+        status=MediaJob.STATUS_DONE
+    ).values("video_id")
+    missing = Video.objects.filter(duration_seconds__isnull=True).exclude(pk__in=queued)
+
+    enqueued = 0
+    last_pk = None
+    while True:
+        # Select and insert in one transaction: on SQLite it takes the write
+        # lock at BEGIN, so concurrent sweepers queue each video once.
+        with transaction.atomic():
+            page = missing.order_by("pk")
+            if last_pk is not None:
+                page = page.filter(pk__gt=last_pk)
+            video_ids = list(page.values_list("pk", flat=True)[:batch_size])
+            if not video_ids:
+                break
+            enqueued += enqueue_probe_jobs(video_ids)
+        last_pk = video_ids[-1]
+
+    return enqueued
+
+
+def start_metadata_sweeper() -> None:
+    if not getattr(settings, "METADATA_SWEEP_ENABLED", False):
+        return
+    global _thread
+    if _thread and _thread.is_alive():
+        return
+    _stop_event.clear()
+    _thread = threading.Thread(
+        target=_sweep_loop,
+        name="mirror-metadata-sweeper",
+        daemon=True,
+    )
+    _thread.start()
+
+
+def stop_metadata_sweeper() -> None:
+    _stop_event.set()
+
+
+def run_sweep(collect_blobs: bool = True) -> None:
+    """
+    One sweeper pass: requeue media jobs orphaned by a dead worker, queue
+    missing duration probes, then (when `collect_blobs`) remove video
+    blobs no row references any more, such as files whose last row was
+    deleted inside the release grace period.
+    """
+    try:
+        requeued = requeue_stale_jobs()
+        if requeued:
+            _LOG.warning("Metadata sweep requeued %s stale media job(s)", requeued)
+    except Exception:
+        _LOG.exception("Stale media job recovery failed")
+
+    try:
+        enqueued = reconcile_missing_durations()
+        if enqueued:
+            _LOG.info("Metadata sweep queued %s duration probe(s)", enqueued)
+    except Exception:
+        _LOG.exception("Metadata sweep failed")
+
+    if collect_blobs:
+        try:
+            collect_garbage(getattr(settings, "MEDIA_BLOB_GC_MIN_AGE_SECONDS", 3600))
+        except Exception:
+            _LOG.exception("Blob garbage collection failed")
+
+
+def _sweep_loop() -> None:
+    interval = getattr(settings, "METADATA_SWEEP_INTERVAL_SECONDS", 300)
+    delay = getattr(settings, "METADATA_SWEEP_INITIAL_DELAY_SECONDS", 30)
+    # Blob GC walks the whole blob tree, so it runs less often than the sweep.
+    gc_interval = getattr(settings, "MEDIA_BLOB_GC_INTERVAL_SECONDS", 3600)
+    next_gc = time.monotonic()
+
+    while not _stop_event.wait(delay):
+        close_old_connections()
+        collect_blobs = bool(gc_interval) and time.monotonic() >= next_gc
+        run_sweep(collect_blobs=collect_blobs)
+        if collect_blobs:
+            next_gc = time.monotonic() + gc_interval
+        delay = interval
+
+    connection.close()
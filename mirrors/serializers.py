@@ -1,3 +1,10 @@
+import uuid
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.encoding import filepath_to_uri
 from rest_framework import serializers
 from .models import Mirror, Session, Video, TransferRequest
 from .utils import get_public_base_url
@@ -27,13 +34,26 @@ class SessionSerializer(serializers.ModelSerializer):
 class VideoSerializer(serializers.ModelSerializer):
     file_url = serializers.SerializerMethodField()
     thumbnail_url = serializers.SerializerMethodField()
+    thumbnail_detail_url = serializers.SerializerMethodField()
+    stream_url = serializers.SerializerMethodField()
 
     class Meta:
         model = Video
         fields = "__all__"
         read_only_fields = ("id", "created_at", "sha256")
 
+    def to_representation(self, obj):
+        data = super().to_representation(obj)
+        if obj.encrypted and obj.file:
+            # MEDIA_URL would hand out ciphertext; the stream route decrypts.
+            path = reverse("video_stream", args=[obj.pk])
+            request = self.context.get("request")
+            data["file"] = request.build_absolute_uri(path) if request is not None else path
+        return data
+
     def get_file_url(self, obj):
+        if obj.encrypted and obj.file:
+            return self.get_stream_url(obj)
         request = self.context.get("request")
         base_url = get_public_base_url(request)
         if base_url:
@@ -58,6 +78,119 @@ class VideoSerializer(serializers.ModelSerializer):
             return f"http://{settings.DEVICE_IP}{obj.thumbnail.url}"
         return obj.thumbnail.url
 
+    def get_thumbnail_detail_url(self, obj):
+        name = ((obj.metadata or {}).get("thumbnails") or {}).get("detail")
+        if not name:
+            return None
+        return f"{_url_prefix(self.context.get('request'))}{obj.thumbnail.storage.url(name)}"
+
+    def get_stream_url(self, obj):
+        path = reverse("video_stream", args=[obj.pk])
+
+        request = self.context.get("request")
+        base_url = get_public_base_url(request)
+        if base_url:
+            return f"{base_url}{path}"
+
+        from django.conf import settings
+        if settings.DEVICE_IP:
+            return f"http://{settings.DEVICE_IP}{path}"
+        return path
+
+
+# Columns read by serialize_video_list, in VideoSerializer's output order
+# after the URL fields.
+_VIDEO_VALUE_FIELDS = (
+    "id",
+    "created_at",
+    "file",
+    "thumbnail",
+    "size_bytes",
+    "duration_seconds",
+    "codec",
+    "sha256",
+    "encrypted",
+    "metadata",
+    "processing_status",
+    "session",
+)
+
+_STREAM_PLACEHOLDER = uuid.UUID(int=0)
+
+
+def _url_prefix(request):
+    base_url = get_public_base_url(request)
+    if base_url:
+        return base_url
+    if settings.DEVICE_IP:
+        return f"http://{settings.DEVICE_IP}"
+    return ""
+
+
+def _storage_url_builder(storage):
+    # FileSystemStorage.url() urljoins every name; for relative names under
+    # a "/"-terminated base_url that is plain concatenation.
+    if isinstance(storage, FileSystemStorage) and storage.base_url.endswith("/"):
+        base_url = storage.base_url
+        return lambda name: base_url + filepath_to_uri(name.lstrip("/"))
+    return storage.url
+
+
+def serialize_video_list(queryset, request=None):
+    """
+    List fast path producing the same rows as VideoSerializer(many=True).
+
+    VideoSerializer resolves the public base URL, storage URLs and the
+    stream route once per field per row. Here they are computed once per
+    call and rows are built from .values() tuples, so no model instances
+    or FieldFile objects are created. Encrypted videos link file and
+    file_url to the stream route, as VideoSerializer does.
+    """
+    prefix = _url_prefix(request)
+    root = request.build_absolute_uri("/").rstrip("/") if request is not None else ""
+    storage_url = _storage_url_builder(Video._meta.get_field("file").storage)
+    thumbnail_url = _storage_url_builder(Video._meta.get_field("thumbnail").storage)
+    stream_head, stream_tail = reverse("video_stream", args=[_STREAM_PLACEHOLDER]).split(
+        str(_STREAM_PLACEHOLDER)
+    )
+    format_datetime = serializers.DateTimeField(
+        default_timezone=timezone.get_current_timezone() if settings.USE_TZ else None
+    ).to_representation
+
+    rows = []
+    for (pk, created_at, file, thumbnail, size_bytes, duration_seconds, codec,
+         sha256, encrypted, metadata, processing_status, session_id) in (
+        queryset.values_list(*_VIDEO_VALUE_FIELDS).iterator(chunk_size=2000)
+    ):
+        stream_path = f"{stream_head}{pk}{stream_tail}"
+        if not file:
+            file_path = None
+        elif encrypted:
+            file_path = stream_path
+        else:
+            file_path = storage_url(file)
+        thumbnail_path = thumbnail_url(thumbnail) if thumbnail else None
+        detail_name = ((metadata or {}).get("thumbnails") or {}).get("detail")
+        detail_path = thumbnail_url(detail_name) if detail_name else None
+        rows.append({
+            "id": str(pk),
+            "file_url": f"{prefix}{file_path}" if file_path else None,
+            "thumbnail_url": f"{prefix}{thumbnail_path}" if thumbnail_path else None,
+            "thumbnail_detail_url": f"{prefix}{detail_path}" if detail_path else None,
+            "stream_url": f"{prefix}{stream_path}",
+            "created_at": format_datetime(created_at),
+            "file": f"{root}{file_path}" if file_path else None,
+            "thumbnail": f"{root}{thumbnail_path}" if thumbnail_path else None,
+            "size_bytes": size_bytes,
+            "duration_seconds": duration_seconds,
+            "codec": codec,
+            "sha256": sha256,
+            "encrypted": encrypted,
+            "metadata": metadata,
+            "processing_status": processing_status,
+            "session": session_id,
+        })
+    return rows
 
 
 class TransferRequestSerializer(serializers.ModelSerializer):
@@ -0,0 +1,168 @@
+import os
+import re
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+DEFAULT_STREAM_CHUNK_SIZE = 1024 * 1024
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeFile:
+    """
+    Yields at most `length` bytes of a file from its current position.
+
+    fileno() is passed through so the WSGI server's file_wrapper can
+    sendfile() the range directly from the page cache (gunicorn limits the
+    copy to the response's Content-Length). Otherwise the server falls back
+    to read(), which stops at the range end.
+    """
+
+    def __init__(self, file, length):
+        self._file = file
+        self._remaining = length
+
+    def read(self, size=-1):
+        if self._remaining <= 0:
+            return b""
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def fileno(self):
+        fd = self._file.fileno()
+        # sendfile() starts at the descriptor's offset, but a buffered file
+        # may have read ahead of its logical position (storage.open() peeks
+        # at the header, and seeks inside the buffer never reach the OS).
+        # Dropping the buffer with a real seek lines the two up.
+        position = self._file.tell()
+        if os.lseek(fd, 0, os.SEEK_CUR) != position:
+            self._file.seek(0, os.SEEK_END)
+            self._file.seek(position)
+        return fd
+
+    def close(self):
+        self._file.close()
+
+
+def parse_range(header: str, size: int):
+    """
+    Parses a single-range `Range` header.
+    Returns (start, end) inclusive, "unsatisfiable", or None when the header
+    should be ignored (malformed or multi-range) and the full body served.
+    """
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None
+
+    first, last = match.groups()
+    if not first and not last:
+        return None
+
+    if not first:
+        # Suffix range: the last N bytes.
+        length = int(last)
+        if length == 0:
+            return "unsatisfiable"
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    end = int(last) if last else size - 1
+    if last and end < start:
+        return None
+    if start >= size:
+        return "unsatisfiable"
+    return start, min(end, size - 1)
+
+
+def stream_file(request, file, size, *, etag=None, last_modified=None,
+                content_type="application/octet-stream", chunk_size=None):
+    """
+    Serves an open, seekable binary file with HTTP Range (206), ETag and
+    conditional GET support. Takes ownership of `file` and closes it.
+    """
+    chunk_size = chunk_size or getattr(settings, "VIDEO_STREAM_CHUNK_SIZE", DEFAULT_STREAM_CHUNK_SIZE)
+    etag = quote_etag(etag) if etag else None
+    last_modified = int(last_modified) if last_modified is not None else None
+
+    conditional = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if conditional is not None:
+        file.close()
+        _set_validators(conditional, etag, last_modified)
+        return conditional
+
+    byte_range = None
+    range_header = request.META.get("HTTP_RANGE")
+    if range_header and _if_range_matches(request, etag, last_modified):
+        byte_range = parse_range(range_header, size)
+
+    if byte_range == "unsatisfiable":
+        file.close()
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        response["Accept-Ranges"] = "bytes"
+        return response
+
+    if byte_range is None:
+        start, end, status = 0, size - 1, 200
+    else:
+        (start, end), status = byte_range, 206
+
+    length = max(end - start + 1, 0)
+    file.seek(start)
+    response = FileResponse(
+        RangeFile(file, length),
+        status=status,
+        content_type=content_type,
+    )
+    response.block_size = chunk_size
+    response["Content-Length"] = str(length)
+    response["Accept-Ranges"] = "bytes"
+    if status == 206:
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    _set_validators(response, etag, last_modified)
+    return response
+
+
+def accel_redirect_response(mode, name, path, *, etag=None, content_type="application/octet-stream"):
+    """
+    Hands the transfer to a fronting web server: nginx (`X-Accel-Redirect`
+    to an internal location) or Apache/lighttpd (`X-Sendfile` with the
+    absolute path). The front end then handles Range and sendfile itself.
+    """
+    response = HttpResponse(content_type=content_type)
+    if mode == "x-accel-redirect":
+        prefix = getattr(settings, "VIDEO_STREAM_ACCEL_PREFIX", "/protected-media/")
+        response["X-Accel-Redirect"] = f"{prefix.rstrip('/')}/{name}"
+    else:
+        response["X-Sendfile"] = str(path)
+    if etag:
+        response["ETag"] = quote_etag(etag)
+    return response
+
+
+def _if_range_matches(request, etag, last_modified) -> bool:
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        # Strong comparison only.
+        return etag is not None and if_range == etag and not etag.startswith("W/")
+    if_range_date = parse_http_date_safe(if_range)
+    return (
+        if_range_date is not None
+        and last_modified is not None
+        and last_modified == if_range_date
+    )
+
+
+def _set_validators(response, etag, last_modified) -> None:
+    if etag:
+        response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified)
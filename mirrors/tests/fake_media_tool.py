@@ -0,0 +1,52 @@
+"""
+Stand-in for ffmpeg and ffprobe in tests (see helpers.fake_media_tools).
+
+ffprobe mode (-show_entries): prints FAKE_DURATION, or fails when the
+input starts with b"NODUR". ffmpeg mode: writes a tiny JPEG to every
+output, or fails when the input starts with b"BROKEN" (or with b"SHORT"
+unless seeking from 0). Each call is appended to FAKE_MEDIA_LOG as JSON.
+"""
+import json
+import os
+import sys
+import time
+
+
+def main(args):
+    started = time.time()
+    source = args[args.index("-i") + 1] if "-i" in args else args[-1]
+    with open(source, "rb") as f:
+        head = f.read(6)
+
+    if "-show_entries" in args:
+        code = 1 if head.startswith(b"NODUR") else 0
+        if not code:
+            print(os.environ.get("FAKE_DURATION", "12.5"))
+    else:
+        time.sleep(float(os.environ.get("FAKE_FFMPEG_SECONDS", "0")))
+        seek = args[args.index("-ss") + 1] if "-ss" in args else "0"
+        code = 1 if head.startswith(b"BROKEN") else 0
+        if head.startswith(b"SHORT") and float(seek) > 0:
+            code = 0  # exits cleanly but writes nothing, like ffmpeg past EOF
+            outputs = []
+        else:
+            outputs = [args[i + 4] for i, arg in enumerate(args) if arg == "-frames:v"]
+        if not code:
+            for path in outputs:
+                with open(path, "wb") as out:
+                    out.write(b"\xff\xd8\xff\xe0fake-jpeg\xff\xd9")
+
+    log = os.environ.get("FAKE_MEDIA_LOG")
+    if log:
+        with open(log, "a") as f:
+            f.write(json.dumps({
+                "argv": args, "head": head.decode("latin-1"),
+                "start": started, "end": time.time(), "code": code,
+            }) + "\n")
+    if code:
+        print("fake media tool failure", file=sys.stderr)
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
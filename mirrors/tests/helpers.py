@@ -0,0 +1,130 @@
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+from unittest import mock
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+from django.core.files.base import ContentFile
+from django.test import override_settings
+
+from mirrors.media_store import save_video_file
+from mirrors.models import Session, Video
+from mirrors.views import get_local_mirror, invalidate_local_mirror_cache
+
+
+class TempMediaMixin:
+    """
+    Gives each test class its own MEDIA_ROOT and transfer partial dir, with
+    encryption off unless a test turns it on, and drops the cached local
+    Mirror (test rollbacks do not send post_delete).
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_dir = tempfile.mkdtemp(prefix="mirror-test-media-")
+        cls._media_settings = override_settings(
+            MEDIA_ROOT=cls.media_dir,
+            TRANSFER_PARTIAL_DIR=f"{cls.media_dir}/.partial",
+            MEDIA_DECRYPT_TMP_DIR=f"{cls.media_dir}/.decrypt",
+            MEDIA_ENCRYPTION_KEY="",
+        )
+        cls._media_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls._media_settings.disable()
+        shutil.rmtree(cls.media_dir, ignore_errors=True)
+
+    def setUp(self):
+        super().setUp()
+        invalidate_local_mirror_cache()
+        self.addCleanup(invalidate_local_mirror_cache)
+
+
+def make_session(**fields):
+    fields.setdefault("mirror", get_local_mirror())
+    return Session.objects.create(**fields)
+
+
+def fake_media_tools(directory) -> tuple[str, str]:
+    """
+    Writes ffmpeg and ffprobe wrappers around fake_media_tool.py into
+    `directory` and returns their paths, for FFMPEG_BINARY/FFPROBE_BINARY.
+    """
+    script = os.path.join(os.path.dirname(__file__), "fake_media_tool.py")
+    paths = []
+    for name in ("ffmpeg", "ffprobe"):
+        path = os.path.join(directory, name)
+        with open(path, "w") as f:
+            f.write(f'#!/bin/sh\nexec "{sys.executable}" "{script}" "$@"\n')
+        os.chmod(path, 0o755)
+        paths.append(path)
+    return tuple(paths)
+
+
+def make_video(session, data=b"video-bytes", name="clip.mp4", **fields):
+    video = Video(session=session, sha256=hashlib.sha256(data).hexdigest(), size_bytes=len(data), **fields)
+    save_video_file(video, name, ContentFile(data, name=name))
+    video.save()
+    return video
+
+
+def write_keypair(directory, name="transfer", kind="rsa") -> tuple[str, str]:
+    """Writes a PEM keypair ("rsa" or "ed25519") and returns (private, public) paths."""
+    if kind == "rsa":
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    else:
+        private_key = ed25519.Ed25519PrivateKey.generate()
+    private_path = os.path.join(directory, f"{name}_private.key")
+    public_path = os.path.join(directory, f"{name}.pem")
+    with open(private_path, "wb") as f:
+        f.write(private_key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        ))
+    with open(public_path, "wb") as f:
+        f.write(private_key.public_key().public_bytes(
+            serialization.Encoding.PEM,
+            serialization.PublicFormat.SubjectPublicKeyInfo,
+        ))
+    return private_path, public_path
+
+
+class TransferKeysMixin:
+    """
+    Points TRANSFER_TOKEN at a fresh keypair in a temporary keys directory
+    (self.keys_dir) and gives each test its own TransferKeyManager.
+    """
+    transfer_key_kind = "rsa"
+    transfer_alg = "RS256"
+
+    def setUp(self):
+        super().setUp()
+        from mirrors import tokens
+
+        self.keys_dir = tempfile.mkdtemp(prefix="mirror-test-keys-")
+        self.addCleanup(shutil.rmtree, self.keys_dir, True)
+        self.private_path, self.public_path = write_keypair(self.keys_dir, kind=self.transfer_key_kind)
+        self.use_signing_key(self.private_path, self.public_path, self.transfer_alg)
+        manager = mock.patch.object(tokens, "_key_manager", tokens.TransferKeyManager())
+        manager.start()
+        self.addCleanup(manager.stop)
+
+    def use_signing_key(self, private_path, public_path, algorithm):
+        from mirrors import tokens
+
+        conf = mock.patch.dict(tokens.TRANSFER_CONF, {
+            "PRIVATE_KEY_PATH": private_path,
+            "PUBLIC_KEY_PATH": public_path,
+            "KEYS_DIR": self.keys_dir,
+            "KEYS_DIR_RECHECK_SECONDS": 0,
+            "ALGORITHM": algorithm,
+        })
+        conf.start()
+        self.addCleanup(conf.stop)
@@ -0,0 +1,56 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.apps import apps as django_apps
+from django.test import SimpleTestCase, override_settings
+
+from mirrors import apps
+
+
+class BackgroundLockTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp(prefix="mirror-test-lock-")
+        self.addCleanup(shutil.rmtree, directory, True)
+        self.path = os.path.join(directory, "background.lock")
+        patcher = mock.patch.object(apps, "_background_lock", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        lock_setting = override_settings(BACKGROUND_LOCK_FILE=self.path)
+        lock_setting.enable()
+        self.addCleanup(lock_setting.disable)
+
+    def test_one_holder_per_host(self):
+        self.assertTrue(apps._acquire_background_lock())
+        holder = apps._background_lock
+        self.assertTrue(apps._acquire_background_lock())  # already ours
+
+        # Another process: a separate open of the same file.
+        apps._background_lock = None
+        self.assertFalse(apps._acquire_background_lock())
+        self.assertIsNone(apps._background_lock)
+
+        holder.close()  # the holder exits
+        self.assertTrue(apps._acquire_background_lock())
+        apps._background_lock.close()
+
+    @override_settings(BACKGROUND_LOCK_FILE="")
+    def test_empty_path_disables_the_lock(self):
+        self.assertTrue(apps._acquire_background_lock())
+        self.assertIsNone(apps._background_lock)
+
+    @override_settings(MEDIA_WORKER_ENABLED=True, METADATA_SWEEP_ENABLED=True, DISCOVERY_ENABLED=False)
+    def test_only_the_lock_holder_starts_the_worker_and_sweeper(self):
+        config = django_apps.get_app_config("mirrors")
+        with mock.patch.object(apps, "_should_start_background_services", return_value=True), \
+                mock.patch("mirrors.media_jobs.start_media_worker") as worker, \
+                mock.patch("mirrors.reconciler.start_metadata_sweeper") as sweeper:
+            config.ready()
+            self.assertEqual((worker.call_count, sweeper.call_count), (1, 1))
+
+            held = apps._background_lock
+            apps._background_lock = None
+            config.ready()
+            self.assertEqual((worker.call_count, sweeper.call_count), (1, 1))
+            held.close()
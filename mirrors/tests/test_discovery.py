@@ -0,0 +1,229 @@
+import asyncio
+import json
+import socket
+import threading
+from datetime import timedelta
+from unittest import mock
+
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from mirrors import discovery
+from mirrors.discovery import PeerTable, run_discovery
+from mirrors.models import Mirror
+
+from .helpers import TempMediaMixin
+
+GROUP = "239.255.77.77"
+
+
+def free_udp_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(("", 0))
+        return sock.getsockname()[1]
+
+
+@override_settings(
+    MIRROR_ID="MIRROR-LOCAL",
+    HOSTNAME="local-mirror",
+    DISCOVERY_INTERVAL_SECONDS=60,
+    DISCOVERY_FLUSH_INTERVAL_SECONDS=60,
+    DISCOVERY_MULTICAST_INTERFACE="",
+)
+class LoopbackDiscoveryTests(SimpleTestCase):
+    """
+    Runs the discovery service on a loopback multicast group and talks to
+    it from a plain UDP socket playing the peer.
+    """
+
+    def setUp(self):
+        self.port = free_udp_port()
+        self.table = PeerTable(last_seen_tolerance=0)
+        self.build_threads = []
+        real_build = discovery._build_payload
+
+        def build_payload():
+            self.build_threads.append(threading.current_thread())
+            return real_build()
+
+        for target, value in (
+            ("peers", self.table),
+            ("_flush_peers", lambda: None),
+            ("_build_payload", build_payload),
+        ):
+            patcher = mock.patch.object(discovery, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.loop = asyncio.new_event_loop()
+        self.stop = asyncio.Event()
+        self.thread = threading.Thread(
+            target=self.loop.run_until_complete,
+            args=(run_discovery(self.stop, port=self.port, group=GROUP, legacy_broadcast=False),),
+        )
+        self.thread.start()
+        self.addCleanup(self.shutdown)
+
+        self.peer = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.peer.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+        self.peer.bind(("", 0))
+        self.addCleanup(self.peer.close)
+        self.first_reply = self.wait_for_service()
+        self.peer.settimeout(5)
+
+    def wait_for_service(self):
+        # The service socket joins the group on its own thread; retry
+        # discover until it answers.
+        self.peer.settimeout(0.1)
+        for _ in range(50):
+            self.send({"type": "discover"})
+            try:
+                return self.receive("announce")
+            except socket.timeout:
+                continue
+        self.fail("discovery service never answered")
+
+    def shutdown(self):
+        self.loop.call_soon_threadsafe(self.stop.set)
+        self.thread.join(10)
+        self.loop.close()
+
+    def send(self, message):
+        self.peer.sendto(json.dumps(message).encode(), (GROUP, self.port))
+
+    def receive(self, msg_type):
+        while True:
+            data, _ = self.peer.recvfrom(discovery.DISCOVERY_MAX_DATAGRAM)
+            message = json.loads(data)
+            if message.get("type") == msg_type:
+                return message
+
+    def test_discover_is_answered_from_the_cached_announcement(self):
+        reply = self.first_reply
+        self.assertEqual(reply["mirror_id"], "MIRROR-LOCAL")
+        self.assertEqual(reply["digest"], discovery._payload_digest(reply))
+
+        builds = len(self.build_threads)
+        for _ in range(20):
+            self.send({"type": "discover"})
+            self.receive("announce")
+        # Replies reuse the announce task's payload; none is built, and
+        # every build ran on an executor thread, not the event loop.
+        self.assertEqual(len(self.build_threads), builds)
+        self.assertNotIn(self.thread, self.build_threads)
+
+    def wait_for_peer(self, key):
+        for _ in range(100):
+            if key in self.table._peers:
+                return self.table._peers[key]
+            threading.Event().wait(0.05)
+        self.fail(f"{key} was never recorded")
+
+    def test_announce_is_recorded_and_unknown_heartbeat_asks_for_discover(self):
+        announce = {
+            "type": "announce",
+            "mirror_id": "MIRROR-PEER",
+            "hostname": "peer-mirror",
+            "ip": "127.0.0.1",
+            "port": 8001,
+            "base_url": "http://127.0.0.1:8001",
+            "digest": "aaaa",
+        }
+        self.send(announce)
+        self.assertEqual(self.wait_for_peer("MIRROR-PEER").metadata["base_url"], "http://127.0.0.1:8001")
+
+        heartbeat = {key: announce[key] for key in ("mirror_id", "hostname", "ip", "port")}
+        self.send({**heartbeat, "type": "heartbeat", "digest": "bbbb"})
+        self.assertEqual(self.receive("discover"), {"type": "discover"})
+        # Heartbeats keep the last full metadata.
+        self.assertEqual(self.wait_for_peer("MIRROR-PEER").metadata["base_url"], "http://127.0.0.1:8001")
+
+    def test_own_announcements_are_ignored(self):
+        self.send({"type": "announce", "mirror_id": "MIRROR-LOCAL", "hostname": "local-mirror"})
+        self.send({"type": "announce", "mirror_id": "MIRROR-OTHER", "hostname": "other"})
+        self.wait_for_peer("MIRROR-OTHER")
+        self.assertNotIn("MIRROR-LOCAL", self.table._peers)
+
+
+def statements(ctx):
+    """Leading SQL verb of each captured query, leaving out savepoints."""
+    return [q["sql"].split()[0] for q in ctx.captured_queries if "SAVEPOINT" not in q["sql"]]
+
+
+@override_settings(MIRROR_ID="MIRROR-LOCAL", HOSTNAME="local-mirror")
+class PeerTableFlushTests(TempMediaMixin, TestCase):
+    def announce(self, table, n, **fields):
+        payload = {"type": "announce", "mirror_id": f"MIRROR-{n}", "hostname": f"peer-{n}",
+                   "ip": f"10.0.0.{n}", "port": 8000, "base_url": f"http://10.0.0.{n}:8000"}
+        table.record({**payload, **fields}, "192.0.2.1")
+
+    def test_many_announces_flush_as_one_select_update_and_insert(self):
+        for n in range(3):
+            Mirror.objects.create(hostname=f"peer-{n}", mirror_identity=f"MIRROR-{n}", port=1)
+        table = PeerTable(last_seen_tolerance=60)
+        for round_ in range(4):
+            for n in range(8):
+                self.announce(table, n, port=8000 + round_)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(table.flush(), 8)
+        self.assertEqual(statements(ctx), ["SELECT", "UPDATE", "INSERT"])
+
+        rows = Mirror.objects.filter(mirror_identity__startswith="MIRROR-").order_by("hostname")
+        self.assertEqual([m.hostname for m in rows], [f"peer-{n}" for n in range(8)])
+        self.assertTrue(all(m.port == 8003 for m in rows))
+        self.assertEqual(rows[0].metadata["base_url"], "http://10.0.0.0:8000")
+
+    def test_last_seen_only_change_waits_for_the_tolerance(self):
+        table = PeerTable(last_seen_tolerance=60)
+        self.announce(table, 1)
+        table.flush()
+        first_seen = Mirror.objects.get(mirror_identity="MIRROR-1").last_seen
+
+        self.announce(table, 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(table.flush(), 0)
+
+        later = timezone.now() + timedelta(seconds=61)
+        with mock.patch.object(discovery.timezone, "now", return_value=later):
+            self.announce(table, 1)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(table.flush(), 1)
+        self.assertEqual(statements(ctx), ["SELECT", "UPDATE"])
+        self.assertEqual(Mirror.objects.get(mirror_identity="MIRROR-1").last_seen, later)
+        self.assertGreater(later, first_seen)
+
+    def test_field_change_is_written_inside_the_tolerance(self):
+        table = PeerTable(last_seen_tolerance=60)
+        self.announce(table, 1)
+        table.flush()
+        self.announce(table, 1, ip="10.0.9.9")
+        self.assertEqual(table.flush(), 1)
+        self.assertEqual(Mirror.objects.get(mirror_identity="MIRROR-1").ip, "10.0.9.9")
+
+    def test_batch_conflict_falls_back_to_per_peer_writes(self):
+        # MIRROR-1 renames itself onto a hostname an older row still holds,
+        # so the batched bulk_update hits the unique constraint.
+        Mirror.objects.create(hostname="peer-1-old", mirror_identity="MIRROR-1")
+        squatter = Mirror.objects.create(hostname="peer-1")
+        table = PeerTable(last_seen_tolerance=60)
+        for n in (1, 2, 3):
+            self.announce(table, n)
+
+        with self.assertLogs("mirrors.discovery", "WARNING") as logs:
+            self.assertEqual(table.flush(), 2)
+        self.assertIn("peer-1 already used", logs.output[0])
+        self.assertEqual(
+            set(Mirror.objects.filter(hostname__in=["peer-2", "peer-3"]).values_list("mirror_identity", flat=True)),
+            {"MIRROR-2", "MIRROR-3"},
+        )
+        self.assertEqual(Mirror.objects.get(mirror_identity="MIRROR-1").hostname, "peer-1-old")
+
+        # The failed peer stays pending and goes through once the name frees up.
+        squatter.delete()
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(table.flush(), 1)
+        self.assertEqual(statements(ctx), ["SELECT", "UPDATE"])
+        self.assertEqual(Mirror.objects.get(mirror_identity="MIRROR-1").hostname, "peer-1")
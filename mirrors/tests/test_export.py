@@ -0,0 +1,100 @@
+import io
+import os
+import tempfile
+import time
+import tracemalloc
+import zipfile
+
+from django.test import TestCase
+
+from mirrors.models import Video
+from mirrors.utils import generate_export_token
+
+from .helpers import TempMediaMixin, make_session, make_video
+
+GiB = 1024 ** 3
+
+
+class SessionZipExportTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.session = make_session(device_id="phone-1")
+
+    def export_url(self, **extra):
+        token = generate_export_token(str(self.session.pk), "phone-1")
+        query = {"token": token, "device_id": "phone-1", "download": "zip", **extra}
+        return "/api/export?" + "&".join(f"{k}={v}" for k, v in query.items())
+
+    def test_zip_holds_every_video(self):
+        clips = {b"first clip": "a.mp4", b"second clip": "b.mp4"}
+        for data, name in clips.items():
+            make_video(self.session, data, name=name)
+
+        response = self.client.get(self.export_url())
+        self.assertEqual(response.status_code, 200)
+        body = b"".join(response.streaming_content)
+        self.assertEqual(len(body), int(response["Content-Length"]))
+
+        with zipfile.ZipFile(io.BytesIO(body)) as archive:
+            self.assertIsNone(archive.testzip())
+            contents = {info.filename: archive.read(info) for info in archive.infolist()}
+        # Entries carry the uploaded names, not the hash-named blobs.
+        self.assertEqual(contents, {name: data for data, name in clips.items()})
+
+    def test_duplicate_names_stay_distinct(self):
+        first = make_video(self.session, b"take one", name="clip.mp4")
+        second = make_video(self.session, b"take two", name="clip.mp4")
+        response = self.client.get(self.export_url())
+        with zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content))) as archive:
+            names = sorted(info.filename for info in archive.infolist())
+        self.assertEqual(len(set(names)), 2)
+        self.assertIn("clip.mp4", names)
+        self.assertTrue({f"{first.id}_clip.mp4", f"{second.id}_clip.mp4"} & set(names))
+
+    def test_html_page_offers_the_uploaded_names(self):
+        make_video(self.session, b"clip", name="Beach day.mp4")
+        token = generate_export_token(str(self.session.pk), "phone-1")
+        response = self.client.get(f"/api/export?token={token}&device_id=phone-1")
+        self.assertContains(response, 'download="Beach day.mp4"')
+
+    def test_multi_gigabyte_export_streams_in_flat_memory(self):
+        # Sparse files: gigabytes on paper, no disk blocks.
+        sizes = {"big.mp4": 4 * GiB + 512 * 1024 ** 2, "small.mp4": 512 * 1024 ** 2}
+        os.makedirs(os.path.join(self.media_dir, "videos"), exist_ok=True)
+        for name, size in sizes.items():
+            with open(os.path.join(self.media_dir, "videos", name), "wb") as f:
+                f.truncate(size)
+            Video.objects.create(session=self.session, file=f"videos/{name}", size_bytes=size, encrypted=False)
+
+        response = self.client.get(self.export_url())
+        self.assertEqual(response.status_code, 200)
+        expected_length = int(response["Content-Length"])
+
+        # Rebuild the archive as a sparse file to check its structure.
+        out = tempfile.NamedTemporaryFile(dir=self.media_dir, suffix=".zip")
+        self.addCleanup(out.close)
+        total = 0
+        start = time.monotonic()
+        tracemalloc.start()
+        try:
+            for chunk in response.streaming_content:
+                total += len(chunk)
+                if chunk.count(0) == len(chunk):
+                    out.seek(len(chunk), os.SEEK_CUR)
+                else:
+                    out.write(chunk)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        out.truncate(total)
+        out.flush()
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(total, expected_length)
+        self.assertGreater(total, sum(sizes.values()))
+        # One read chunk plus the central directory, regardless of size.
+        self.assertLess(peak, 8 * 1024 * 1024, f"peak {peak} bytes while streaming {total} bytes in {elapsed:.1f}s")
+
+        with zipfile.ZipFile(out.name) as archive:
+            listed = {info.filename: info.file_size for info in archive.infolist()}
+        self.assertEqual(listed, sizes)
@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.test import TestCase, override_settings
+
+from mirrors.models import Mirror, Session
+from mirrors.views import get_local_mirror
+
+from .helpers import TempMediaMixin, make_session
+
+
+class LocalMirrorCacheTests(TempMediaMixin, TestCase):
+    def test_cold_lookup_creates_the_row_once(self):
+        # get_or_create (select, savepoint, insert, release), then the
+        # identity claim and the metadata/identity save.
+        with self.assertNumQueries(6):
+            mirror = get_local_mirror()
+        self.assertEqual(mirror.hostname, settings.HOSTNAME)
+        self.assertEqual(mirror.mirror_identity, settings.MIRROR_ID)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_local_mirror().pk, mirror.pk)
+
+    def test_saving_the_local_mirror_invalidates_the_cache(self):
+        mirror = get_local_mirror()
+        Mirror.objects.filter(pk=mirror.pk).update(port=9000)
+        self.assertEqual(get_local_mirror().port, mirror.port)
+
+        mirror.port = 9001
+        mirror.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(get_local_mirror().port, 9001)
+
+    def test_peer_mirror_save_keeps_the_cache(self):
+        get_local_mirror()
+        Mirror.objects.create(hostname="peer-mirror")
+        with self.assertNumQueries(0):
+            get_local_mirror()
+
+    @override_settings(LOCAL_MIRROR_CACHE_SECONDS=0)
+    def test_cache_expires_after_the_ttl(self):
+        get_local_mirror()
+        with self.assertNumQueries(1):
+            get_local_mirror()
+
+
+class EndpointQueryCountTests(TempMediaMixin, TestCase):
+    """Warm-cache query counts of the endpoints that call get_local_mirror()."""
+
+    def setUp(self):
+        super().setUp()
+        self.session = make_session(status=Session.STATUS_PENDING)
+
+    def test_qr_status_is_a_single_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/session/qr/status")
+        self.assertEqual(response.json()["session_id"], str(self.session.pk))
+
+    def test_session_end(self):
+        with self.assertNumQueries(2):
+            response = self.client.post(
+                "/api/session/end", {"session_id": str(self.session.pk)}, content_type="application/json"
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_qr_create(self):
+        # End the open sessions, then insert the new one.
+        with self.assertNumQueries(2):
+            response = self.client.post("/api/session/qr/create")
+        self.assertEqual(response.status_code, 201)
@@ -0,0 +1,119 @@
+import io
+import json
+import logging
+import threading
+import uuid
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from utils import log
+from utils.log import AsyncStreamHandler, JsonFormatter
+
+
+def make_record(msg="hello %s", args=("world",), exc_info=None, **extra):
+    logger = logging.getLogger("mirrors.test")
+    return logger.makeRecord(logger.name, logging.INFO, __file__, 1, msg, args, exc_info, extra=extra)
+
+
+def raised(exc):
+    try:
+        raise exc
+    except Exception as e:
+        return (type(e), e, e.__traceback__)
+
+
+class JsonFormatterTests(SimpleTestCase):
+    def test_extra_context_becomes_top_level_keys(self):
+        session_id = uuid.uuid4()
+        entry = json.loads(JsonFormatter().format(make_record(session_id=session_id, mirror_id="MIRROR-A")))
+        self.assertEqual(entry["message"], "hello world")
+        self.assertEqual(entry["level"], "INFO")
+        self.assertEqual(entry["logger"], "mirrors.test")
+        self.assertEqual(entry["session_id"], str(session_id))
+        self.assertEqual(entry["mirror_id"], "MIRROR-A")
+        # Standard LogRecord attributes stay out of the line.
+        for key in ("args", "msg", "levelno", "pathname", "thread"):
+            self.assertNotIn(key, entry)
+
+    def test_exc_info_is_serialized(self):
+        record = make_record("pull failed", (), exc_info=raised(ValueError("boom")), video_id="v1")
+        entry = json.loads(JsonFormatter().format(record))
+        self.assertEqual(entry["message"], "pull failed")
+        self.assertEqual(entry["video_id"], "v1")
+        self.assertTrue(entry["exc_info"].startswith("Traceback (most recent call last):"))
+        self.assertIn("ValueError: boom", entry["exc_info"])
+
+    def test_prepared_record_keeps_its_traceback_text(self):
+        handler = AsyncStreamHandler.__new__(AsyncStreamHandler)
+        record = make_record("pull failed", (), exc_info=raised(KeyError("gone")))
+        prepared = handler.prepare(record)
+        self.assertIsNone(prepared.exc_info)
+        entry = json.loads(JsonFormatter().format(prepared))
+        self.assertIn("KeyError: 'gone'", entry["exc_info"])
+        # The caller's record is left alone for other handlers.
+        self.assertIsNotNone(record.exc_info)
+
+
+class AsyncStreamHandlerTests(SimpleTestCase):
+    def setUp(self):
+        self.stream = io.StringIO()
+        with mock.patch.object(log.atexit, "register") as register:
+            self.handler = AsyncStreamHandler(self.stream)
+        self.handler.setFormatter(JsonFormatter())
+        self.shutdown = register.call_args.args[0]
+        self.addCleanup(self.stop_listener)
+
+        self.logger = logging.getLogger("mirrors.test.async")
+        self.logger.addHandler(self.handler)
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        self.addCleanup(self.logger.removeHandler, self.handler)
+
+    def stop_listener(self):
+        if self.handler.listener._thread is not None:
+            self.handler.listener.stop()
+
+    def lines(self):
+        return [json.loads(line) for line in self.stream.getvalue().splitlines()]
+
+    def test_listener_is_started_and_stopped_at_exit(self):
+        self.assertTrue(self.handler.listener._thread.is_alive())
+        self.assertEqual(self.shutdown, self.handler.listener.stop)
+        self.shutdown()
+        self.assertIsNone(self.handler.listener._thread)
+
+    def test_shutdown_drains_every_queued_record(self):
+        def emit(n):
+            for i in range(250):
+                self.logger.info("record %d-%d", n, i, extra={"session_id": f"s{n}"})
+
+        threads = [threading.Thread(target=emit, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.shutdown()
+
+        lines = self.lines()
+        self.assertEqual(len(lines), 1000)
+        self.assertEqual(
+            {line["message"] for line in lines},
+            {f"record {n}-{i}" for n in range(4) for i in range(250)},
+        )
+        self.assertEqual({line["session_id"] for line in lines}, {"s0", "s1", "s2", "s3"})
+
+    def test_arguments_are_merged_on_the_calling_thread(self):
+        state = ["before"]
+        self.logger.info("state=%s", state)
+        state[0] = "after"
+        try:
+            raise RuntimeError("broken")
+        except RuntimeError:
+            self.logger.exception("failed", extra={"mirror_id": "MIRROR-B"})
+        self.shutdown()
+
+        first, second = self.lines()
+        self.assertEqual(first["message"], "state=['before']")
+        self.assertEqual(second["mirror_id"], "MIRROR-B")
+        self.assertIn("RuntimeError: broken", second["exc_info"])
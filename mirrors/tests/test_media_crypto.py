@@ -0,0 +1,170 @@
+import io
+import os
+import random
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from mirrors.models import Video
+from mirrors.serializers import VideoSerializer, serialize_video_list
+from mirrors.utils import generate_export_token
+from utils import storage as storage_module
+from utils.media_crypto import DecryptingReader, MediaCryptoError, encrypt_chunks, generate_key, load_key
+
+from .helpers import TempMediaMixin, make_session, make_video
+
+SEGMENT = 1024
+KEY = generate_key()
+
+
+def encrypt(data, segment_size=SEGMENT):
+    chunks = [data[i:i + 700] for i in range(0, len(data), 700)] or [b""]
+    return b"".join(encrypt_chunks(load_key(KEY), chunks, segment_size))
+
+
+def reader(ciphertext):
+    return DecryptingReader(io.BytesIO(ciphertext), load_key(KEY))
+
+
+class DecryptingReaderSeekTests(TestCase):
+    def test_reads_at_any_offset_match_the_plaintext(self):
+        rng = random.Random(24)
+        for size in (0, 1, SEGMENT - 1, SEGMENT, SEGMENT + 1, 3 * SEGMENT + 17):
+            data = os.urandom(size)
+            with reader(encrypt(data)) as f:
+                self.assertEqual(f.size, size)
+                self.assertEqual(f.read(), data)
+                for _ in range(50):
+                    start = rng.randint(0, size + 5)
+                    length = rng.randint(0, 2 * SEGMENT + 3)
+                    self.assertEqual(f.seek(start), start)
+                    self.assertEqual(f.read(length), data[start:start + length], (size, start, length))
+                    self.assertEqual(f.tell(), min(start + length, max(size, start)))
+
+    def test_relative_seeks(self):
+        data = os.urandom(3 * SEGMENT + 17)
+        with reader(encrypt(data)) as f:
+            f.seek(-20, io.SEEK_END)
+            self.assertEqual(f.read(), data[-20:])
+            f.seek(SEGMENT - 3)
+            f.read(2)
+            f.seek(5, io.SEEK_CUR)
+            self.assertEqual(f.read(10), data[SEGMENT + 4:SEGMENT + 14])
+            with self.assertRaises(ValueError):
+                f.seek(-1)
+
+    def test_reading_across_a_segment_boundary_crosses_once(self):
+        data = os.urandom(2 * SEGMENT)
+        with reader(encrypt(data)) as f:
+            f.seek(SEGMENT - 4)
+            self.assertEqual(f.read(8), data[SEGMENT - 4:SEGMENT + 4])
+
+    def test_tampered_segment_fails_only_when_read(self):
+        data = os.urandom(3 * SEGMENT)
+        ciphertext = bytearray(encrypt(data))
+        ciphertext[-10] ^= 1  # inside the last segment
+        with reader(bytes(ciphertext)) as f:
+            self.assertEqual(f.read(SEGMENT), data[:SEGMENT])
+            f.seek(2 * SEGMENT + 1)
+            with self.assertRaisesMessage(MediaCryptoError, "segment 2 failed authentication"):
+                f.read(1)
+
+    def test_file_cut_at_a_segment_boundary_is_rejected(self):
+        data = os.urandom(3 * SEGMENT)
+        ciphertext = encrypt(data)
+        # Drop the final segment: the new last one was not sealed as final.
+        truncated = ciphertext[:len(ciphertext) - (SEGMENT + 16)]
+        with reader(truncated) as f:
+            f.seek(f.size - 1)
+            with self.assertRaises(MediaCryptoError):
+                f.read(1)
+
+
+@override_settings(MEDIA_ENCRYPTION_KEY=KEY, MEDIA_ENCRYPTION_SEGMENT_SIZE=SEGMENT, VIDEO_STREAM_CHUNK_SIZE=700)
+class EncryptedVideoStreamTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.session = make_session(device_id="phone-1")
+        self.data = os.urandom(4 * SEGMENT + 321)
+        self.video = make_video(self.session, self.data)
+        self.assertTrue(self.video.encrypted)
+        self.url = f"/api/videos/{self.video.pk}/stream"
+
+    def get(self, range_header=None):
+        extra = {"HTTP_RANGE": range_header} if range_header else {}
+        response = self.client.get(self.url, **extra)
+        body = b"".join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_stored_file_is_ciphertext(self):
+        with open(self.video.file.path, "rb") as f:
+            self.assertNotIn(self.data[:64], f.read())
+
+    def test_full_get_returns_the_plaintext(self):
+        response, body = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(int(response["Content-Length"]), len(self.data))
+        self.assertEqual(body, self.data)
+
+    def test_ranges_return_the_plaintext_slice(self):
+        size = len(self.data)
+        cases = {
+            "bytes=0-0": (0, 0),
+            f"bytes={SEGMENT - 10}-{SEGMENT + 10}": (SEGMENT - 10, SEGMENT + 10),
+            f"bytes={2 * SEGMENT}-": (2 * SEGMENT, size - 1),
+            "bytes=-100": (size - 100, size - 1),
+            f"bytes=100-{size + 500}": (100, size - 1),
+        }
+        for header, (start, end) in cases.items():
+            response, body = self.get(header)
+            self.assertEqual(response.status_code, 206, header)
+            self.assertEqual(response["Content-Range"], f"bytes {start}-{end}/{size}", header)
+            self.assertEqual(int(response["Content-Length"]), end - start + 1, header)
+            self.assertEqual(body, self.data[start:end + 1], header)
+
+    def test_range_past_the_plaintext_end_is_unsatisfiable(self):
+        # The ciphertext is longer; the plaintext size is what counts.
+        response, _ = self.get(f"bytes={len(self.data)}-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], f"bytes */{len(self.data)}")
+
+    @override_settings(VIDEO_STREAM_ACCEL="x-accel-redirect")
+    def test_proxy_handoff_is_skipped_for_ciphertext(self):
+        response, body = self.get("bytes=5-9")
+        self.assertNotIn("X-Accel-Redirect", response)
+        self.assertEqual(body, self.data[5:10])
+
+    def test_links_point_at_the_stream_route(self):
+        stream_path = self.url
+        data = VideoSerializer(self.video).data
+        self.assertEqual(data["file"], stream_path)
+        self.assertEqual(data["file_url"], stream_path)
+
+        rows = serialize_video_list(Video.objects.all())
+        self.assertEqual((rows[0]["file"], rows[0]["file_url"]), (stream_path, stream_path))
+
+        token = generate_export_token(str(self.session.pk), "phone-1")
+        response = self.client.get(f"/api/export?token={token}&device_id=phone-1")
+        self.assertContains(response, f'href="{stream_path}"')
+        self.assertNotContains(response, "/media/blobs/")
+
+    def test_plaintext_path_uses_the_decrypt_dir(self):
+        storage = self.video.file.storage
+        with self.settings(MEDIA_DECRYPT_TMP_DIR=os.path.join(self.media_dir, "decrypt")):
+            with storage.plaintext_path(self.video.file.name) as path:
+                self.assertEqual(os.path.dirname(path), os.path.join(self.media_dir, "decrypt"))
+                with open(path, "rb") as f:
+                    self.assertEqual(f.read(), self.data)
+            self.assertFalse(os.path.exists(path))
+
+    def test_decrypt_dir_on_tmpfs_is_warned_about_once(self):
+        storage = self.video.file.storage
+        tmp_dir = os.path.join(self.media_dir, "ram")
+        with self.settings(MEDIA_DECRYPT_TMP_DIR=tmp_dir), \
+                mock.patch.object(storage_module, "_filesystem_type", return_value="tmpfs"), \
+                self.assertLogs("utils.storage", "WARNING") as logs:
+            for _ in range(2):
+                with storage.plaintext_path(self.video.file.name):
+                    pass
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn("held in RAM", logs.output[0])
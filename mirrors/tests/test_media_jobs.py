@@ -0,0 +1,114 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from mirrors import media_jobs
+from mirrors.models import MediaJob, Video
+
+from .helpers import TempMediaMixin, fake_media_tools, make_session, make_video
+
+
+class MediaJobWorkerTests(TempMediaMixin, TestCase):
+    """Drives the worker against fake ffmpeg/ffprobe binaries."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tools_dir = tempfile.mkdtemp(prefix="mirror-test-tools-")
+        ffmpeg, ffprobe = fake_media_tools(cls.tools_dir)
+        cls.log_path = os.path.join(cls.tools_dir, "calls.jsonl")
+        cls._tool_settings = override_settings(
+            FFMPEG_BINARY=ffmpeg,
+            FFPROBE_BINARY=ffprobe,
+            MEDIA_JOB_RETRY_SECONDS=0,
+            MEDIA_JOB_MAX_ATTEMPTS=2,
+        )
+        cls._tool_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls._tool_settings.disable()
+        shutil.rmtree(cls.tools_dir, ignore_errors=True)
+
+    def setUp(self):
+        super().setUp()
+        # The service reads FFMPEG_BINARY when it is built.
+        patcher = mock.patch("mirrors.thumbnails._service", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        env = mock.patch.dict(os.environ, {"FAKE_MEDIA_LOG": self.log_path, "FAKE_DURATION": "7.25"})
+        env.start()
+        self.addCleanup(env.stop)
+        open(self.log_path, "w").close()
+        self.session = make_session()
+
+    def calls(self):
+        with open(self.log_path) as f:
+            return [json.loads(line) for line in f]
+
+    def test_probe_and_thumbnail_jobs_fill_in_the_video(self):
+        video = make_video(self.session, b"MP4 data")
+        media_jobs.enqueue_video_jobs(video)
+        self.assertEqual(Video.objects.get(pk=video.pk).processing_status, Video.PROCESSING_PENDING)
+
+        self.assertEqual(media_jobs.run_pending_jobs(), 2)
+
+        video.refresh_from_db()
+        self.assertEqual(video.duration_seconds, 7.25)
+        self.assertEqual(video.processing_status, Video.PROCESSING_READY)
+        self.assertTrue(video.thumbnail.name.startswith("thumbnails/"))
+        self.assertTrue(os.path.getsize(video.thumbnail.path) > 0)
+        self.assertEqual(set(video.metadata["thumbnails"]), {"detail"})
+        self.assertEqual(
+            set(MediaJob.objects.filter(video=video).values_list("status", flat=True)),
+            {MediaJob.STATUS_DONE},
+        )
+        # One ffprobe run and a single ffmpeg run for every size.
+        self.assertEqual(len(self.calls()), 2)
+
+    def test_failing_job_is_retried_then_marked_failed(self):
+        video = make_video(self.session, b"BROKEN clip")
+        media_jobs.enqueue_video_jobs(video, kinds=[MediaJob.KIND_THUMBNAIL])
+
+        self.assertEqual(media_jobs.run_pending_jobs(), 2)
+
+        job = MediaJob.objects.get(video=video)
+        self.assertEqual(job.status, MediaJob.STATUS_FAILED)
+        self.assertEqual(job.attempts, 2)
+        self.assertIn("ffmpeg exited with 1", job.last_error)
+        self.assertEqual(Video.objects.get(pk=video.pk).processing_status, Video.PROCESSING_FAILED)
+        self.assertEqual(media_jobs.run_pending_jobs(), 0)
+
+    def test_probe_without_duration_fails(self):
+        video = make_video(self.session, b"NODUR clip")
+        media_jobs.enqueue_video_jobs(video, kinds=[MediaJob.KIND_PROBE])
+        media_jobs.run_pending_jobs()
+
+        job = MediaJob.objects.get(video=video)
+        self.assertEqual(job.status, MediaJob.STATUS_FAILED)
+        self.assertIn("no duration", job.last_error)
+        self.assertIsNone(Video.objects.get(pk=video.pk).duration_seconds)
+
+    def test_retry_waits_for_run_after(self):
+        video = make_video(self.session, b"BROKEN clip")
+        media_jobs.enqueue_video_jobs(video, kinds=[MediaJob.KIND_THUMBNAIL])
+        with override_settings(MEDIA_JOB_RETRY_SECONDS=3600):
+            self.assertEqual(media_jobs.run_pending_jobs(), 1)
+        job = MediaJob.objects.get(video=video)
+        self.assertEqual(job.status, MediaJob.STATUS_PENDING)
+        self.assertEqual(media_jobs.run_pending_jobs(), 0)
+
+    def test_claimed_job_is_not_claimed_again(self):
+        video = make_video(self.session)
+        media_jobs.enqueue_video_jobs(video)
+        first = media_jobs._claim_next_job()
+        second = media_jobs._claim_next_job()
+        self.assertNotEqual(first.pk, second.pk)
+        self.assertIsNone(media_jobs._claim_next_job())
+        self.assertEqual(first.status, MediaJob.STATUS_RUNNING)
+        self.assertEqual(first.attempts, 1)
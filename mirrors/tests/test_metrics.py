@@ -0,0 +1,121 @@
+import os
+import re
+from unittest import mock
+
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+
+from mirrors import views
+from utils import metrics
+from utils.metrics import MetricsRegistry
+
+from .helpers import TempMediaMixin, make_session, make_video
+
+PID = f'pid="{os.getpid()}"'
+
+
+def samples(text, name):
+    """{label string: value} for every sample of `name` in rendered output."""
+    found = {}
+    for line in text.splitlines():
+        match = re.fullmatch(rf"{name}\{{(.*)\}} (\S+)", line)
+        if match:
+            found[match.group(1)] = float(match.group(2))
+    return found
+
+
+class RenderTests(SimpleTestCase):
+    def test_histogram_buckets_are_cumulative_with_sum_and_count(self):
+        registry = MetricsRegistry()
+        labels = (("view", "api/videos/list"), ("method", "GET"))
+        for value in (0, 2, 2, 7, 500):
+            registry.observe("mirror_http_request_queries", value, labels, buckets=metrics.QUERY_BUCKETS)
+        text = registry.render()
+
+        prefix = f'{PID},view="api/videos/list",method="GET"'
+        buckets = samples(text, "mirror_http_request_queries_bucket")
+        self.assertEqual(buckets[f'{prefix},le="0"'], 1)
+        self.assertEqual(buckets[f'{prefix},le="1"'], 1)
+        self.assertEqual(buckets[f'{prefix},le="2"'], 3)
+        self.assertEqual(buckets[f'{prefix},le="10"'], 4)
+        self.assertEqual(buckets[f'{prefix},le="100"'], 4)
+        self.assertEqual(buckets[f'{prefix},le="+Inf"'], 5)
+        self.assertEqual(samples(text, "mirror_http_request_queries_sum"), {prefix: 511})
+        self.assertEqual(samples(text, "mirror_http_request_queries_count"), {prefix: 5})
+        self.assertIn("# TYPE mirror_http_request_queries histogram", text)
+
+    def test_counters_carry_the_pid_and_escape_label_values(self):
+        registry = MetricsRegistry()
+        registry.inc("mirror_http_requests_total", 2, (("view", 'a"b\\c'),))
+        registry.inc("mirror_http_requests_total", 1, (("view", 'a"b\\c'),))
+        text = registry.render()
+        self.assertIn(f'mirror_http_requests_total{{{PID},view="a\\"b\\\\c"}} 3', text)
+        self.assertIn("# TYPE mirror_http_requests_total counter", text)
+
+
+class MetricsMiddlewareTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.registry = MetricsRegistry()
+        for target in (mock.patch.object(metrics, "registry", self.registry),
+                       mock.patch.object(views, "metrics_registry", self.registry)):
+            target.start()
+            self.addCleanup(target.stop)
+        self.session = make_session()
+        make_video(self.session)
+
+    def test_request_is_recorded_by_route_with_its_query_count_and_bytes(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f"/api/videos/list?session_id={self.session.pk}")
+        self.assertEqual(response.status_code, 200)
+        text = self.registry.render()
+
+        labels = f'{PID},view="api/videos/list",method="GET"'
+        self.assertEqual(samples(text, "mirror_http_requests_total"), {f'{labels},status="200"': 1})
+        self.assertEqual(samples(text, "mirror_http_request_duration_seconds_count"), {labels: 1})
+        # The execute_wrapper sees exactly the statements the view ran.
+        self.assertGreater(len(ctx.captured_queries), 0)
+        self.assertEqual(samples(text, "mirror_http_request_queries_sum"), {labels: len(ctx.captured_queries)})
+        self.assertEqual(
+            samples(text, "mirror_http_request_bytes_total"),
+            {f'{labels},direction="out"': len(response.content)},
+        )
+
+    def test_request_body_bytes_and_unmatched_routes(self):
+        self.client.post("/api/session/end", {"session_id": str(self.session.pk)}, content_type="application/json")
+        self.client.get("/api/no-such-route")
+        text = self.registry.render()
+
+        bytes_total = samples(text, "mirror_http_request_bytes_total")
+        body = len(f'{{"session_id": "{self.session.pk}"}}')
+        self.assertEqual(bytes_total[f'{PID},view="api/session/end",method="POST",direction="in"'], body)
+        self.assertEqual(
+            samples(text, "mirror_http_requests_total")[f'{PID},view="unmatched",method="GET",status="404"'], 1
+        )
+
+    def test_subprocess_time_is_charged_to_the_request(self):
+        def fake_view(*args, **kwargs):
+            metrics.record_subprocess("ffprobe", 0.25)
+            return views.HttpResponse("ok")
+
+        with mock.patch.object(views.VideoListView, "get", side_effect=fake_view):
+            self.client.get("/api/videos/list")
+        metrics.record_subprocess("ffprobe", 1.0)  # outside a request
+        text = self.registry.render()
+
+        labels = f'{PID},view="api/videos/list",method="GET"'
+        self.assertEqual(samples(text, "mirror_http_request_subprocess_seconds_total"), {labels: 0.25})
+        self.assertEqual(samples(text, "mirror_subprocess_duration_seconds_count"), {f'{PID},command="ffprobe"': 2})
+
+    def test_metrics_endpoint_renders_the_registry(self):
+        self.client.get(f"/api/videos/list?session_id={self.session.pk}")
+        response = self.client.get("/api/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/plain; version=0.0.4; charset=utf-8")
+        text = response.content.decode()
+        self.assertIn("# TYPE mirror_http_requests_total counter", text)
+        self.assertIn(f'mirror_http_requests_total{{{PID},view="api/videos/list",method="GET",status="200"}} 1', text)
+        # The scrape itself is recorded after the body is rendered.
+        self.assertNotIn('view="api/metrics"', text)
+        self.assertIn('view="api/metrics"', self.registry.render())
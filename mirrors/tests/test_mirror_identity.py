@@ -0,0 +1,58 @@
+from django.test import TestCase
+
+from mirrors.discovery import PeerTable
+from mirrors.models import Mirror
+from mirrors.views import resolve_mirror_by_identity
+
+from .helpers import TempMediaMixin
+
+
+class ResolveMirrorByIdentityTests(TempMediaMixin, TestCase):
+    def test_identity_beats_hostname_beats_pk(self):
+        by_pk = Mirror.objects.create(hostname="by-pk")
+        by_hostname = Mirror.objects.create(hostname="shared")
+        by_identity = Mirror.objects.create(hostname="other", mirror_identity="shared")
+        self.assertEqual(resolve_mirror_by_identity("shared").pk, by_identity.pk)
+
+        pk_named = Mirror.objects.create(hostname=str(by_pk.pk))
+        self.assertEqual(resolve_mirror_by_identity(str(by_pk.pk)).pk, pk_named.pk)
+        pk_named.delete()
+        self.assertEqual(resolve_mirror_by_identity(str(by_pk.pk)).pk, by_pk.pk)
+        self.assertEqual(resolve_mirror_by_identity("by-pk").pk, by_pk.pk)
+        self.assertNotEqual(by_hostname.pk, by_identity.pk)
+
+    def test_single_query_and_non_uuid_identities(self):
+        Mirror.objects.create(hostname="mirror-a.local", mirror_identity="MIRROR-A")
+        with self.assertNumQueries(1):
+            self.assertEqual(resolve_mirror_by_identity("MIRROR-A").hostname, "mirror-a.local")
+        with self.assertNumQueries(1):
+            self.assertIsNone(resolve_mirror_by_identity("not-a-uuid"))
+        with self.assertNumQueries(0):
+            self.assertIsNone(resolve_mirror_by_identity(""))
+
+
+class PeerTableIdentityTests(TempMediaMixin, TestCase):
+    def announce(self, table, mirror_id, hostname):
+        table.record({"mirror_id": mirror_id, "hostname": hostname, "ip": "10.0.0.2", "port": 8000}, "10.0.0.2")
+        table.flush()
+
+    def test_renamed_peer_keeps_its_row(self):
+        table = PeerTable(last_seen_tolerance=0)
+        self.announce(table, "MIRROR-B", "old-name")
+        original = Mirror.objects.get(mirror_identity="MIRROR-B")
+
+        self.announce(table, "MIRROR-B", "new-name")
+        renamed = Mirror.objects.get(mirror_identity="MIRROR-B")
+        self.assertEqual(renamed.pk, original.pk)
+        self.assertEqual(renamed.hostname, "new-name")
+        self.assertEqual(renamed.metadata["mirror_id"], "MIRROR-B")
+
+    def test_hostname_conflict_does_not_block_other_peers(self):
+        Mirror.objects.create(hostname="taken", mirror_identity="MIRROR-OWNER")
+        table = PeerTable(last_seen_tolerance=0)
+        table.record({"mirror_id": "MIRROR-C", "hostname": "taken"}, "10.0.0.3")
+        table.record({"mirror_id": "MIRROR-D", "hostname": "free"}, "10.0.0.4")
+        with self.assertLogs("mirrors.discovery", "WARNING"):
+            table.flush()
+        self.assertTrue(Mirror.objects.filter(mirror_identity="MIRROR-D").exists())
+        self.assertEqual(Mirror.objects.get(hostname="taken").mirror_identity, "MIRROR-OWNER")
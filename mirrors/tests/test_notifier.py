@@ -0,0 +1,77 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from mirrors.models import Session
+from mirrors.notifier import current_session_version, notify_session_changed, wait_for_session_change
+
+from .helpers import TempMediaMixin, make_session
+
+ROOT = Path(settings.BASE_DIR)
+
+
+class SessionNotifierTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "session_changed")
+        override = override_settings(SESSION_NOTIFY_FILE=self.path, SESSION_NOTIFY_POLL_SECONDS=0.05)
+        override.enable()
+        self.addCleanup(override.disable)
+        open(self.path, "w").close()
+        # Let the watcher take in the new file before measuring.
+        wait_for_session_change(current_session_version(), 0.3)
+
+    def test_same_process_change_wakes_immediately(self):
+        version = current_session_version()
+        notify_session_changed()
+        start = time.monotonic()
+        self.assertNotEqual(wait_for_session_change(version, 5), version)
+        self.assertLess(time.monotonic() - start, 0.05)
+
+    def test_wait_times_out_without_a_change(self):
+        version = current_session_version()
+        self.assertEqual(wait_for_session_change(version, 0.3), version)
+
+    def test_change_in_another_process_wakes_the_waiter(self):
+        version = current_session_version()
+        notifier = subprocess.Popen(
+            [
+                sys.executable, "-c",
+                "import django; django.setup(); "
+                "from mirrors.notifier import notify_session_changed; notify_session_changed()",
+            ],
+            cwd=ROOT,
+            env={**os.environ, "DJANGO_SETTINGS_MODULE": "config.settings", "SESSION_NOTIFY_FILE": self.path},
+        )
+        self.addCleanup(notifier.wait)
+        self.assertNotEqual(wait_for_session_change(version, 10), version)
+        self.assertEqual(notifier.wait(), 0)
+
+
+class QRStatusWaitViewTests(TempMediaMixin, TestCase):
+    def test_returns_at_once_when_status_differs(self):
+        session = make_session(status=Session.STATUS_PENDING)
+        start = time.monotonic()
+        response = self.client.get("/api/session/qr/status/wait", {"timeout": 10})
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(response.json()["session_id"], str(session.pk))
+        self.assertEqual(response.json()["qr_status"], Session.STATUS_PENDING)
+
+    def test_times_out_with_the_unchanged_status(self):
+        session = make_session(status=Session.STATUS_PENDING)
+        response = self.client.get(
+            "/api/session/qr/status/wait",
+            {"session_id": str(session.pk), "qr_status": Session.STATUS_PENDING, "timeout": 0.2},
+        )
+        self.assertEqual(response.json()["qr_status"], Session.STATUS_PENDING)
+
+    def test_rejects_a_bad_timeout(self):
+        response = self.client.get("/api/session/qr/status/wait", {"timeout": "soon"})
+        self.assertEqual(response.status_code, 400)
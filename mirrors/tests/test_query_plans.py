@@ -0,0 +1,92 @@
+import hashlib
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from mirrors.models import Session, Video
+from mirrors.views import get_local_mirror
+
+from .helpers import TempMediaMixin, make_session, make_video
+
+
+def statements(queries):
+    # SAVEPOINT/RELEASE come from the test case's transaction wrapping.
+    return [q["sql"] for q in queries if not q["sql"].startswith(("SAVEPOINT", "RELEASE", "BEGIN", "COMMIT"))]
+
+
+def query_plan(sql):
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+        return "\n".join(row[-1] for row in cursor.fetchall())
+
+
+class QRActivationQueryTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.mirror = get_local_mirror()
+
+    def activate(self, token, user_id="user-1"):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f"/api/session/qr/activate?token={token}&user_id={user_id}")
+        return response, statements(ctx.captured_queries)
+
+    def test_new_session_takes_two_queries(self):
+        pending = make_session(status=Session.STATUS_PENDING, qr_token_hash=hashlib.sha256(b"tok").hexdigest())
+        response, sql = self.activate("tok")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["type"], "new")
+        self.assertEqual(len(sql), 2, sql)
+        self.assertTrue(sql[0].startswith("SELECT") and sql[1].startswith("UPDATE"))
+        pending.refresh_from_db()
+        self.assertEqual((pending.status, pending.user_id), (Session.STATUS_ACTIVE, "user-1"))
+
+    def test_resume_takes_two_queries_and_ends_the_pending_session(self):
+        previous = make_session(status=Session.STATUS_ENDED, user_id="user-1")
+        pending = make_session(status=Session.STATUS_PENDING, qr_token_hash=hashlib.sha256(b"tok").hexdigest())
+        response, sql = self.activate("tok")
+        self.assertEqual(response.json(), {"session_id": str(previous.pk), "status": "active", "type": "resumed"})
+        self.assertEqual(len(sql), 2, sql)
+        previous.refresh_from_db()
+        pending.refresh_from_db()
+        self.assertEqual(previous.status, Session.STATUS_ACTIVE)
+        self.assertEqual(pending.status, Session.STATUS_ENDED)
+
+    def test_invalid_token_takes_one_query(self):
+        response, sql = self.activate("nope")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(sql), 1, sql)
+
+    def test_activation_uses_the_session_indexes(self):
+        make_session(status=Session.STATUS_PENDING, qr_token_hash=hashlib.sha256(b"tok").hexdigest())
+        _, sql = self.activate("tok")
+        plan = query_plan(sql[0])
+        # Resume subquery on the user index, pending session on qr_token_hash.
+        self.assertIn("USING INDEX mirrors_ses_user_id_a2eb15_idx", plan)
+        self.assertIn("(qr_token_hash=?)", plan)
+        self.assertNotRegex(plan, r"\bSCAN (mirrors_session|U0)\b")
+
+    def test_status_uses_the_mirror_status_index(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get("/api/session/qr/status")
+        (sql,) = statements(ctx.captured_queries)
+        self.assertIn("mirrors_ses_mirror__293fdf_idx", query_plan(sql))
+
+
+class VideoListQueryPlanTests(TempMediaMixin, TestCase):
+    def test_keyset_pages_use_the_created_at_id_index(self):
+        session = make_session()
+        for i in range(3):
+            make_video(session, data=b"x%d" % i, name=f"clip{i}.mp4")
+
+        with CaptureQueriesContext(connection) as ctx:
+            first = self.client.get("/api/videos/list?limit=1")
+            self.client.get(f"/api/videos/list?limit=1&cursor={first['X-Next-Cursor']}")
+        video_queries = [sql for sql in statements(ctx.captured_queries) if 'FROM "mirrors_video"' in sql]
+        self.assertEqual(len(video_queries), 2, video_queries)
+        for sql in video_queries:
+            plan = query_plan(sql)
+            self.assertIn("mirrors_vid_created_50bd36_idx", plan)
+            # The index supplies the order; no sort step.
+            self.assertNotIn("TEMP B-TREE", plan)
+        self.assertEqual(Video.objects.count(), 3)
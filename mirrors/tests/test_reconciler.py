@@ -0,0 +1,103 @@
+import os
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from mirrors import media_jobs
+from mirrors.models import MediaJob, Video
+from mirrors.reconciler import reconcile_missing_durations, run_sweep
+
+from .helpers import TempMediaMixin, make_session, make_video
+
+
+class ReconcileMissingDurationsTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        session = make_session()
+        self.missing = [make_video(session, f"clip {i}".encode()) for i in range(3)]
+        self.known = make_video(session, b"known", duration_seconds=4.0)
+
+    def test_queues_one_probe_per_missing_video(self):
+        self.assertEqual(reconcile_missing_durations(batch_size=2), 3)
+        self.assertEqual(
+            set(MediaJob.objects.filter(kind=MediaJob.KIND_PROBE).values_list("video_id", flat=True)),
+            {video.pk for video in self.missing},
+        )
+        self.assertEqual(
+            set(Video.objects.filter(pk__in=[v.pk for v in self.missing]).values_list("processing_status", flat=True)),
+            {Video.PROCESSING_PENDING},
+        )
+        # A second sweep (or another process's sweeper) finds nothing new.
+        self.assertEqual(reconcile_missing_durations(), 0)
+
+    def test_failed_probe_is_not_retried_by_the_sweep(self):
+        reconcile_missing_durations()
+        MediaJob.objects.filter(video=self.missing[0]).update(
+            status=MediaJob.STATUS_FAILED, attempts=3
+        )
+        MediaJob.objects.exclude(video=self.missing[0]).delete()
+        self.assertEqual(reconcile_missing_durations(), 2)
+        self.assertEqual(MediaJob.objects.filter(video=self.missing[0]).count(), 1)
+
+    def test_sweep_leaves_probing_to_the_job_queue(self):
+        probed = []
+        with mock.patch.dict(media_jobs._HANDLERS, {MediaJob.KIND_PROBE: probed.append}):
+            reconcile_missing_durations()
+            self.assertEqual(probed, [])
+            media_jobs.run_pending_jobs()
+        self.assertEqual(sorted(v.pk for v in probed), sorted(v.pk for v in self.missing))
+
+
+class SweepBlobCollectionTests(TempMediaMixin, TestCase):
+    def test_sweep_removes_old_unreferenced_blobs(self):
+        kept = make_video(make_session(), b"kept", duration_seconds=1.0)
+        storage = kept.file.storage
+        orphan = storage.save("orphan.mp4", ContentFile(b"orphan"))
+        old = time.time() - 7200
+        os.utime(storage.path(orphan), (old, old))
+        os.utime(storage.path(kept.file.name), (old, old))
+
+        with override_settings(MEDIA_BLOB_GC_MIN_AGE_SECONDS=3600):
+            run_sweep(collect_blobs=False)
+            self.assertTrue(storage.exists(orphan))
+            run_sweep()
+        self.assertFalse(storage.exists(orphan))
+        self.assertTrue(storage.exists(kept.file.name))
+
+
+@override_settings(MEDIA_JOB_STALE_SECONDS=600)
+class SweepStaleJobTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        video = make_video(make_session(), b"clip", duration_seconds=1.0)
+        self.stale, self.fresh, self.ours = MediaJob.objects.bulk_create(
+            [MediaJob(video=video, kind=MediaJob.KIND_THUMBNAIL, status=MediaJob.STATUS_RUNNING) for _ in range(3)]
+        )
+        MediaJob.objects.filter(pk__in=[self.stale.pk, self.ours.pk]).update(
+            updated_at=timezone.now() - timedelta(seconds=601)
+        )
+
+    def status(self, job):
+        return MediaJob.objects.get(pk=job.pk).status
+
+    def test_sweep_requeues_jobs_orphaned_by_a_dead_worker(self):
+        # `ours` is still being run by this process's worker.
+        with mock.patch.object(media_jobs, "_running_job_ids", {self.ours.pk}), \
+                self.assertLogs("mirrors.reconciler", "WARNING") as logs:
+            run_sweep(collect_blobs=False)
+        self.assertIn("requeued 1 stale media job", logs.output[0])
+        self.assertEqual(self.status(self.stale), MediaJob.STATUS_PENDING)
+        self.assertEqual(self.status(self.fresh), MediaJob.STATUS_RUNNING)
+        self.assertEqual(self.status(self.ours), MediaJob.STATUS_RUNNING)
+
+    def test_requeued_job_runs_again(self):
+        ran = []
+        with mock.patch.dict(media_jobs._HANDLERS, {MediaJob.KIND_THUMBNAIL: ran.append}):
+            self.assertEqual(media_jobs.requeue_stale_jobs(), 2)
+            self.assertEqual(media_jobs.run_pending_jobs(), 2)
+        self.assertEqual(self.status(self.stale), MediaJob.STATUS_DONE)
+        self.assertEqual(media_jobs._running_job_ids, set())
@@ -0,0 +1,42 @@
+from django.test import RequestFactory, TestCase, override_settings
+from rest_framework.request import Request
+
+from mirrors.models import Video
+from mirrors.serializers import VideoSerializer, serialize_video_list
+from utils.media_crypto import generate_key
+
+from .helpers import TempMediaMixin, make_session, make_video
+
+
+class VideoListSerializationTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        session = make_session()
+        make_video(session, b"plain clip", name="clip one.mp4")
+        with_thumbs = make_video(session, b"clip with thumbnails")
+        with_thumbs.thumbnail.name = "thumbnails/abc.jpg"
+        with_thumbs.metadata = {"thumbnails": {"detail": "thumbnails/abc_detail.jpg"}}
+        with_thumbs.save()
+        with self.settings(MEDIA_ENCRYPTION_KEY=generate_key()):
+            self.assertTrue(make_video(session, b"encrypted clip").encrypted)
+        self.queryset = Video.objects.order_by("-created_at", "-id")
+        self.request = Request(RequestFactory().get("/api/videos/list", HTTP_HOST="mirror.test:8000"))
+
+    def assert_same_rows(self, request):
+        expected = [dict(row) for row in VideoSerializer(self.queryset, many=True, context={"request": request}).data]
+        self.assertEqual(serialize_video_list(self.queryset, request), expected)
+
+    def test_matches_video_serializer(self):
+        self.assert_same_rows(self.request)
+
+    @override_settings(PUBLIC_BASE_URL="https://mirror.example", DEVICE_IP="")
+    def test_matches_with_public_base_url(self):
+        self.assert_same_rows(self.request)
+
+    @override_settings(PUBLIC_BASE_URL="", DEVICE_IP="10.0.0.5")
+    def test_matches_with_device_ip(self):
+        self.assert_same_rows(self.request)
+
+    def test_list_is_one_query(self):
+        with self.assertNumQueries(1):
+            serialize_video_list(self.queryset, self.request)
@@ -0,0 +1,27 @@
+import subprocess
+import sys
+from pathlib import Path
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+SCRIPT = Path(settings.BASE_DIR) / "scripts" / "stress_sqlite.py"
+
+
+class SQLiteConcurrencyStressTests(SimpleTestCase):
+    """
+    Runs scripts/stress_sqlite.py briefly: three processes of discovery
+    flushes, uploads, QR creation and status polls on one SQLite file.
+    """
+
+    def test_concurrent_writers_hit_no_lock_errors(self):
+        result = subprocess.run(
+            [sys.executable, str(SCRIPT), "--processes", "3", "--seconds", "4"],
+            capture_output=True,
+            text=True,
+            timeout=180,
+        )
+        self.assertEqual(result.returncode, 0, result.stdout + result.stderr[-2000:])
+        self.assertIn("no errors", result.stdout)
+        for role in ("discovery flush", "upload", "qr create", "status poll"):
+            self.assertIn(role, result.stdout)
@@ -0,0 +1,136 @@
+import os
+import time
+
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils.http import http_date
+
+from mirrors.streaming import RangeFile
+from mirrors.views import VideoStreamView
+
+from .helpers import TempMediaMixin, make_session, make_video
+
+
+class VideoStreamTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.data = os.urandom(10_000)
+        self.video = make_video(make_session(), self.data)
+        self.url = f"/api/videos/{self.video.pk}/stream"
+        self.etag = f'"{self.video.sha256}"'
+
+    def get(self, **headers):
+        response = self.client.get(self.url, **headers)
+        body = b"".join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_full_get_sends_validators_from_the_row(self):
+        response, body = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.data)
+        self.assertEqual(response["ETag"], self.etag)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(response["Last-Modified"], http_date(self.video.created_at.timestamp()))
+
+    def test_last_modified_ignores_blob_mtime(self):
+        before, _ = self.get()
+        # A dedup hit on the shared blob refreshes its mtime.
+        later = time.time() + 3600
+        os.utime(self.video.file.path, (later, later))
+        after, _ = self.get()
+        self.assertEqual(after["Last-Modified"], before["Last-Modified"])
+
+    def test_if_none_match_returns_304(self):
+        response, body = self.get(HTTP_IF_NONE_MATCH=self.etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(body, b"")
+        self.assertEqual(response["ETag"], self.etag)
+
+        response, _ = self.get(HTTP_IF_NONE_MATCH='"something-else"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_if_modified_since_returns_304(self):
+        response, _ = self.get(HTTP_IF_MODIFIED_SINCE=http_date(self.video.created_at.timestamp()))
+        self.assertEqual(response.status_code, 304)
+
+    def test_range_returns_206(self):
+        response, body = self.get(HTTP_RANGE="bytes=100-199")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], f"bytes 100-199/{len(self.data)}")
+        self.assertEqual(response["Content-Length"], "100")
+        self.assertEqual(body, self.data[100:200])
+
+    def test_range_past_the_end_returns_416(self):
+        response, _ = self.get(HTTP_RANGE=f"bytes={len(self.data)}-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], f"bytes */{len(self.data)}")
+
+    def test_malformed_or_multi_range_serves_the_full_body(self):
+        for header in ("bytes=abc", "bytes=0-1,5-6", "items=0-1", "bytes=9-3"):
+            response, body = self.get(HTTP_RANGE=header)
+            self.assertEqual(response.status_code, 200, header)
+            self.assertEqual(body, self.data, header)
+
+    def test_if_range_with_matching_etag_honours_the_range(self):
+        response, body = self.get(HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE=self.etag)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.data[:10])
+
+    def test_if_range_with_stale_validator_returns_the_full_body(self):
+        stale_date = http_date(self.video.created_at.timestamp() - 60)
+        for if_range in ('"stale-etag"', f"W/{self.etag}", stale_date):
+            response, body = self.get(HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE=if_range)
+            self.assertEqual(response.status_code, 200, if_range)
+            self.assertEqual(body, self.data, if_range)
+            self.assertNotIn("Content-Range", response)
+
+    def test_if_range_with_matching_date_honours_the_range(self):
+        response, body = self.get(
+            HTTP_RANGE="bytes=5-9",
+            HTTP_IF_RANGE=http_date(self.video.created_at.timestamp()),
+        )
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.data[5:10])
+
+    def test_plaintext_range_exposes_fileno_for_sendfile(self):
+        # Called directly: the test client re-wraps streaming_content, which
+        # hides file_to_stream from the assertion.
+        request = RequestFactory().get(self.url, HTTP_RANGE="bytes=1000-1999")
+        response = VideoStreamView.as_view()(request, pk=self.video.pk)
+        stream = response.file_to_stream
+        self.assertIsInstance(stream, RangeFile)
+        # What a server's sendfile() copies: Content-Length bytes from the
+        # descriptor's current offset.
+        fd = stream.fileno()
+        offset = os.lseek(fd, 0, os.SEEK_CUR)
+        self.assertEqual(offset, 1000)
+        self.assertEqual(os.pread(fd, int(response["Content-Length"]), offset), self.data[1000:2000])
+        # A server that falls back to read() still gets the same bytes.
+        self.assertEqual(b"".join(iter(lambda: stream.read(300), b"")), self.data[1000:2000])
+        response.close()
+
+    def test_range_file_stops_at_the_range_end(self):
+        with open(self.video.file.path, "rb") as f:
+            f.seek(10)
+            stream = RangeFile(f, 25)
+            self.assertEqual(stream.read(20), self.data[10:30])
+            self.assertEqual(stream.read(), self.data[30:35])
+            self.assertEqual(stream.read(), b"")
+            self.assertEqual(stream.fileno(), f.fileno())
+
+    @override_settings(VIDEO_STREAM_ACCEL="x-accel-redirect", VIDEO_STREAM_ACCEL_PREFIX="/protected-media/")
+    def test_x_accel_redirect_hands_off_to_nginx(self):
+        response, body = self.get(HTTP_RANGE="bytes=0-9")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, b"")
+        self.assertEqual(response["X-Accel-Redirect"], f"/protected-media/{self.video.file.name}")
+        self.assertNotIn("X-Sendfile", response)
+        self.assertEqual(response["ETag"], self.etag)
+        self.assertIn('filename="clip.mp4"', response["Content-Disposition"])
+
+    @override_settings(VIDEO_STREAM_ACCEL="x-sendfile")
+    def test_x_sendfile_sends_the_absolute_path(self):
+        response, body = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, b"")
+        self.assertEqual(response["X-Sendfile"], self.video.file.path)
+        self.assertNotIn("X-Accel-Redirect", response)
@@ -0,0 +1,77 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TransactionTestCase
+
+from mirrors.models import Video
+
+from .helpers import TempMediaMixin, fake_media_tools, make_session, make_video
+
+
+class RegenerateThumbnailsCommandTests(TempMediaMixin, TransactionTestCase):
+    """Runs regenerate_thumbnails against the fake ffmpeg (renders run on a thread pool)."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tools_dir = tempfile.mkdtemp(prefix="mirror-test-tools-")
+        cls.ffmpeg, _ = fake_media_tools(cls.tools_dir)
+        cls.log_path = os.path.join(cls.tools_dir, "calls.jsonl")
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(cls.tools_dir, ignore_errors=True)
+
+    def setUp(self):
+        super().setUp()
+        env = mock.patch.dict(os.environ, {"FAKE_MEDIA_LOG": self.log_path})
+        env.start()
+        self.addCleanup(env.stop)
+        open(self.log_path, "w").close()
+
+        self.session = make_session()
+        self.blank = make_video(self.session, b"blank thumbnail")
+        self.null = make_video(self.session, b"null thumbnail")
+        Video.objects.filter(pk=self.null.pk).update(thumbnail=None)
+        self.done = make_video(self.session, b"has a thumbnail")
+        Video.objects.filter(pk=self.done.pk).update(thumbnail="thumbnails/done.jpg")
+
+    def run_command(self, *args):
+        out, err = io.StringIO(), io.StringIO()
+        call_command("regenerate_thumbnails", "--ffmpeg", self.ffmpeg, *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def ffmpeg_calls(self):
+        with open(self.log_path) as f:
+            return [json.loads(line) for line in f]
+
+    def test_missing_only_covers_blank_and_null_thumbnails(self):
+        out, err = self.run_command("--missing-only", "--batch-size", "1")
+        self.assertIn("Rendered thumbnails for 2 video(s), 0 failed", out)
+        self.assertEqual(err, "")
+        self.assertEqual(len(self.ffmpeg_calls()), 2)
+
+        thumbnails = dict(Video.objects.values_list("pk", "thumbnail"))
+        self.assertEqual(thumbnails[self.done.pk], "thumbnails/done.jpg")
+        for video in (self.blank, self.null):
+            self.assertTrue(thumbnails[video.pk].startswith("thumbnails/"), thumbnails[video.pk])
+            with Video.objects.get(pk=video.pk).thumbnail.open("rb") as f:
+                self.assertTrue(f.read().startswith(b"\xff\xd8"))
+
+    def test_without_missing_only_renders_every_video(self):
+        out, _ = self.run_command()
+        self.assertIn("Rendered thumbnails for 3 video(s), 0 failed", out)
+        self.assertNotEqual(Video.objects.get(pk=self.done.pk).thumbnail.name, "thumbnails/done.jpg")
+
+    def test_failures_are_reported_per_video(self):
+        broken = make_video(self.session, b"BROKEN clip")
+        out, err = self.run_command("--missing-only", "--session", str(self.session.pk))
+        self.assertIn("Rendered thumbnails for 2 video(s), 1 failed", out)
+        self.assertIn(str(broken.pk), err)
+        self.assertFalse(Video.objects.get(pk=broken.pk).thumbnail)
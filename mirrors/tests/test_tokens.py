@@ -0,0 +1,141 @@
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase
+
+from mirrors import tokens
+from mirrors.models import Mirror
+
+from .helpers import TransferKeysMixin, write_keypair
+
+
+class TransferKeyManagerTests(TransferKeysMixin, TestCase):
+    def test_round_trip(self):
+        token = tokens.generate_transfer_token("session-1", "mirror-a", "mirror-b")
+        payload = tokens.validate_transfer_token(token, expected_session="session-1", expected_to="mirror-b")
+        self.assertEqual(payload["from"], "mirror-a")
+
+    def test_pem_files_are_parsed_once(self):
+        tokens.validate_transfer_token(tokens.generate_transfer_token("s", "a", "b"))
+        with mock.patch.object(tokens.serialization, "load_pem_private_key") as load_private, \
+                mock.patch.object(tokens.serialization, "load_pem_public_key") as load_public:
+            for _ in range(5):
+                tokens.validate_transfer_token(tokens.generate_transfer_token("s", "a", "b"))
+        load_private.assert_not_called()
+        load_public.assert_not_called()
+
+    def test_rotated_key_files_are_picked_up_without_restart(self):
+        old_token = tokens.generate_transfer_token("s", "a", "b")
+        old_kid = jwt.get_unverified_header(old_token)["kid"]
+
+        # Replace the keypair in place; bump mtime in case the clock is coarse.
+        new_private, new_public = write_keypair(self.keys_dir, name="rotated")
+        os.replace(new_private, self.private_path)
+        os.replace(new_public, self.public_path)
+        later = time.time() + 5
+        os.utime(self.private_path, (later, later))
+        os.utime(self.public_path, (later, later))
+
+        new_token = tokens.generate_transfer_token("s", "a", "b")
+        self.assertNotEqual(jwt.get_unverified_header(new_token)["kid"], old_kid)
+        tokens.validate_transfer_token(new_token)
+        with self.assertRaises(jwt.InvalidTokenError):
+            tokens.validate_transfer_token(old_token)
+
+    def test_expired_token_is_accepted_within_leeway_only(self):
+        token = tokens.generate_transfer_token("s", "a", "b", exp_seconds=-10)
+        with self.assertRaises(jwt.ExpiredSignatureError):
+            tokens.validate_transfer_token(token)
+        tokens.validate_transfer_token(token, leeway=60)
+
+
+class MixedFleetTests(TransferKeysMixin, TestCase):
+    """RS256 and EdDSA mirrors verifying each other's tokens during a migration."""
+
+    def switch_to_ed25519(self, directory=None):
+        private_path, public_path = write_keypair(directory or self.keys_dir, name="ed", kind="ed25519")
+        self.use_signing_key(private_path, public_path, "EdDSA")
+        return private_path, public_path
+
+    def test_rs256_and_eddsa_tokens_verify_side_by_side(self):
+        rs_token = tokens.generate_transfer_token("s", "rsa-mirror", "b")
+        self.switch_to_ed25519()
+        ed_token = tokens.generate_transfer_token("s", "ed-mirror", "b")
+
+        self.assertEqual(jwt.get_unverified_header(rs_token)["alg"], "RS256")
+        self.assertEqual(jwt.get_unverified_header(ed_token)["alg"], "EdDSA")
+        # The RS256 public key is still in KEYS_DIR, so both verify.
+        self.assertEqual(tokens.validate_transfer_token(rs_token)["from"], "rsa-mirror")
+        self.assertEqual(tokens.validate_transfer_token(ed_token)["from"], "ed-mirror")
+
+    def test_peer_public_key_from_mirror_row_verifies(self):
+        rs_token = tokens.generate_transfer_token("s", "rsa-mirror", "b")
+        peer_dir = tempfile.mkdtemp(prefix="mirror-test-peer-keys-")
+        self.addCleanup(shutil.rmtree, peer_dir, True)
+
+        # A peer signing with EdDSA whose key only arrived through discovery.
+        _, peer_public = self.switch_to_ed25519(peer_dir)
+        ed_token = tokens.generate_transfer_token("s", "ed-peer", "b")
+        self.use_signing_key(self.private_path, self.public_path, "RS256")
+        with open(peer_public) as f:
+            Mirror.objects.create(hostname="ed-peer", public_key=f.read())
+
+        self.assertEqual(tokens.validate_transfer_token(ed_token)["from"], "ed-peer")
+        self.assertEqual(tokens.validate_transfer_token(rs_token)["from"], "rsa-mirror")
+
+    def test_peer_key_only_signs_for_its_own_mirror(self):
+        peer_dir = tempfile.mkdtemp(prefix="mirror-test-peer-keys-")
+        self.addCleanup(shutil.rmtree, peer_dir, True)
+        _, peer_public = self.switch_to_ed25519(peer_dir)
+        # The peer's own MIRROR_ID, then an attempt to pass as another mirror.
+        own_token = tokens.generate_transfer_token("s", "MIRROR-PEER", "b")
+        forged = tokens.generate_transfer_token("s", "MIRROR-VICTIM", "b")
+        self.use_signing_key(self.private_path, self.public_path, "RS256")
+        with open(peer_public) as f:
+            Mirror.objects.create(hostname="peer", mirror_identity="MIRROR-PEER", public_key=f.read())
+        Mirror.objects.create(hostname="victim", mirror_identity="MIRROR-VICTIM")
+
+        self.assertEqual(tokens.validate_transfer_token(own_token)["from"], "MIRROR-PEER")
+        with self.assertRaisesMessage(jwt.InvalidTokenError, "does not belong to the token issuer"):
+            tokens.validate_transfer_token(forged)
+
+        # Keys installed on this mirror still verify any issuer.
+        local_token = tokens.generate_transfer_token("s", "MIRROR-VICTIM", "b")
+        self.assertEqual(tokens.validate_transfer_token(local_token)["from"], "MIRROR-VICTIM")
+
+    def test_algorithm_is_bound_to_the_key_type(self):
+        rsa_kid = jwt.get_unverified_header(tokens.generate_transfer_token("s", "a", "b"))["kid"]
+        ed_dir = tempfile.mkdtemp(prefix="mirror-test-ed-")
+        self.addCleanup(shutil.rmtree, ed_dir, True)
+        ed_private, _ = write_keypair(ed_dir, kind="ed25519")
+        with open(ed_private, "rb") as f:
+            ed_key = serialization.load_pem_private_key(f.read(), password=None)
+        forged = jwt.encode(
+            {"sub": "s", "from": "a", "to": "b", "purpose": "session_transfer"},
+            ed_key,
+            algorithm="EdDSA",
+            headers={"kid": rsa_kid},
+        )
+        with self.assertRaises(jwt.InvalidTokenError):
+            tokens.validate_transfer_token(forged)
+
+    def test_signing_algorithm_must_match_the_key(self):
+        private_path, public_path = write_keypair(self.keys_dir, name="ed", kind="ed25519")
+        self.use_signing_key(private_path, public_path, "RS256")
+        with self.assertRaises(ImproperlyConfigured):
+            tokens.generate_transfer_token("s", "a", "b")
+
+    def test_unknown_kid_is_rejected(self):
+        other_dir = tempfile.mkdtemp(prefix="mirror-test-other-")
+        self.addCleanup(shutil.rmtree, other_dir, True)
+        self.switch_to_ed25519(other_dir)
+        token = tokens.generate_transfer_token("s", "a", "b")
+        self.use_signing_key(self.private_path, self.public_path, "RS256")
+        with self.assertRaisesMessage(jwt.InvalidTokenError, "Unknown signing key"):
+            tokens.validate_transfer_token(token)
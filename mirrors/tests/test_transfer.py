@@ -0,0 +1,393 @@
+import errno
+import hashlib
+import http.server
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from unittest import mock
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from mirrors import transfer, views
+from mirrors.discovery import PeerTable
+from mirrors.models import MediaJob, Mirror, TransferFile, TransferRequest, Video
+from mirrors.tokens import generate_transfer_token
+
+from .helpers import TempMediaMixin, TransferKeysMixin, make_session, make_video, write_keypair
+
+
+@override_settings(MIRROR_ID="mirror-b", HOSTNAME="mirror-b")
+class TransferSourceUrlTests(TransferKeysMixin, TempMediaMixin, TestCase):
+    """
+    transfer_session_complete must pull from the URL we know for the
+    source, never one taken from the request body alone.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.peers = PeerTable(last_seen_tolerance=0)
+        for target, value in (("discovery_peers", self.peers), ("start_session_pull", mock.DEFAULT)):
+            patcher = mock.patch.object(views, target, value)
+            started = patcher.start()
+            self.addCleanup(patcher.stop)
+            if target == "start_session_pull":
+                self.start_pull = started
+
+    def complete(self, source_base_url="http://169.254.169.254/latest"):
+        token = generate_transfer_token("8d1f6c3e-2f7a-4d0e-9a59-3f8f4f1f0001", "mirror-a", "mirror-b")
+        return self.client.post(
+            "/api/transfer_session_complete",
+            {"token": token, "source_base_url": source_base_url},
+            content_type="application/json",
+        )
+
+    def pulled_from(self):
+        self.start_pull.assert_called_once()
+        return self.start_pull.call_args.args[2]
+
+    def test_known_source_uses_its_recorded_url(self):
+        Mirror.objects.create(hostname="mirror-a", mirror_identity="mirror-a", ip="10.0.0.5", port=8000)
+        response = self.complete()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.pulled_from(), "http://10.0.0.5:8000/api")
+
+    def test_unknown_source_is_not_pulled(self):
+        response = self.complete()
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn("transfer_id", response.json())
+        self.start_pull.assert_not_called()
+        self.assertFalse(Mirror.objects.filter(mirror_identity="mirror-a").exists())
+
+    def test_announced_source_url_is_accepted(self):
+        self.peers.record(
+            {"mirror_id": "mirror-a", "hostname": "mirror-a", "ip": "10.0.0.5", "port": 8000,
+             "base_url": "http://10.0.0.5:8000/api"},
+            "10.0.0.5",
+        )
+        response = self.complete("http://10.0.0.5:8000/api/")
+        self.assertIn("transfer_id", response.json())
+        self.assertEqual(self.pulled_from(), "http://10.0.0.5:8000/api")
+        self.assertTrue(Mirror.objects.filter(mirror_identity="mirror-a").exists())
+
+    def test_url_not_announced_by_the_source_is_rejected(self):
+        self.peers.record({"mirror_id": "mirror-a", "hostname": "mirror-a", "ip": "10.0.0.5", "port": 8000}, "10.0.0.5")
+        response = self.complete("http://10.0.0.99:8000/api")
+        self.assertNotIn("transfer_id", response.json())
+        self.start_pull.assert_not_called()
+
+
+class PullSessionMixin(TempMediaMixin):
+    """Runs pull_session against a canned snapshot/manifest and chunk writer."""
+
+    def setUp(self):
+        super().setUp()
+        source = Mirror.objects.create(hostname="mirror-a", ip="127.0.0.1", port=8001)
+        self.session = make_session()
+        self.transfer = TransferRequest.objects.create(
+            session=self.session, from_mirror=source, to_mirror=self.session.mirror,
+            token="t", expires_at=timezone.now(),
+        )
+        self.data = os.urandom(1000)
+        self.entry = {"id": "1c9bd0f1-3bd7-4fd3-8d3f-0e3f5e0c0001", "file": "clip.mp4"}
+        self.downloads = 0
+
+    def pull(self, snapshot, manifest=None):
+        def request_json(method, url, token, body=None):
+            if "snapshot" in url:
+                return snapshot
+            if url.endswith("/manifest"):
+                return manifest
+            return {}
+
+        def download_chunks(state, url, token):
+            self.downloads += 1
+            with open(state.partial_path, "wb") as f:
+                f.write(self.data)
+            TransferFile.objects.filter(pk=state.pk).update(chunks_done=1)
+
+        with mock.patch.object(transfer, "_request_json", request_json), \
+                mock.patch.object(transfer, "_download_chunks", download_chunks):
+            ok = transfer.pull_session(self.transfer.pk, "t", "http://127.0.0.1:8001/api")
+        self.transfer.refresh_from_db()
+        return ok
+
+    def manifest(self, data=None):
+        data = self.data if data is None else data
+        digest = hashlib.sha256(data).hexdigest()
+        return {"size": len(data), "sha256": digest, "chunk_size": 64 * 1024, "chunks": [digest]}
+
+
+@override_settings(TRANSFER_PULL_CONCURRENCY=1, TRANSFER_PULL_ATTEMPTS=2)
+class PullErrorTests(PullSessionMixin, TransactionTestCase):
+    """
+    Unexpected errors mark the transfer failed and remove partial files
+    instead of leaving it "running" with data on disk.
+    """
+
+    def test_disk_full_while_storing_fails_the_video_and_removes_the_partial(self):
+        manifest = self.manifest()
+        with mock.patch.object(transfer, "save_video_file", side_effect=OSError(errno.ENOSPC, "No space left")), \
+                self.assertLogs("mirrors.transfer", "ERROR"):
+            ok = self.pull({"videos": [{**self.entry, "sha256": manifest["sha256"]}]}, manifest)
+        self.assertFalse(ok)
+        self.assertEqual(self.transfer.status, TransferRequest.STATUS_FAILED)
+        self.assertIn("No space left", str(self.transfer.logs[-1]["failures"]))
+        self.assertFalse(TransferFile.objects.exists())
+        self.assertEqual(os.listdir(settings.TRANSFER_PARTIAL_DIR), [])
+        self.assertFalse(Video.objects.filter(pk=self.entry["id"]).exists())
+
+    def test_malformed_entry_fails_the_transfer(self):
+        with self.assertLogs("mirrors.transfer", "ERROR"):
+            ok = self.pull({"videos": [{"file": "clip.mp4"}]})
+        self.assertFalse(ok)
+        self.assertEqual(self.transfer.status, TransferRequest.STATUS_FAILED)
+        self.assertIn("KeyError", str(self.transfer.logs[-1]["failures"]))
+
+    def test_session_level_error_fails_the_transfer_and_cleans_up(self):
+        partial = os.path.join(settings.TRANSFER_PARTIAL_DIR, "leftover.part")
+        os.makedirs(settings.TRANSFER_PARTIAL_DIR, exist_ok=True)
+        with open(partial, "wb") as f:
+            f.write(b"x")
+        TransferFile.objects.create(
+            video_id=self.entry["id"], transfer=self.transfer, size=1, sha256="0" * 64,
+            chunk_size=1, chunk_hashes=[], partial_path=partial,
+        )
+        with self.assertLogs("mirrors.transfer", "ERROR"):
+            ok = self.pull(["not", "a", "snapshot"])
+        self.assertFalse(ok)
+        self.assertEqual(self.transfer.status, TransferRequest.STATUS_FAILED)
+        self.assertEqual(self.transfer.logs[-1]["event"], "transfer failed")
+        self.assertFalse(os.path.exists(partial))
+        self.assertFalse(TransferFile.objects.exists())
+
+
+@override_settings(TRANSFER_PULL_CONCURRENCY=1, TRANSFER_PULL_ATTEMPTS=2)
+class PullDedupTests(PullSessionMixin, TransactionTestCase):
+    """A source's claims about content are only trusted once checked here."""
+
+    def setUp(self):
+        super().setUp()
+        self.secret = os.urandom(1000)
+        self.stored = make_video(make_session(), self.secret, name="private.mp4")
+
+    def test_blob_is_shared_when_the_chunk_hashes_match(self):
+        self.data = self.secret
+        manifest = self.manifest()
+        self.assertTrue(self.pull({"videos": [{**self.entry, "sha256": manifest["sha256"]}]}, manifest))
+        self.assertEqual(self.downloads, 0)
+        self.assertEqual(Video.objects.get(pk=self.entry["id"]).file.name, self.stored.file.name)
+
+    def test_claimed_sha256_alone_does_not_share_a_stored_blob(self):
+        # The source knows the digest of a clip stored here but not its bytes.
+        manifest = {**self.manifest(self.secret), "chunks": ["0" * 64]}
+        self.data = os.urandom(1000)
+        with self.assertLogs("mirrors.transfer", "WARNING"):
+            ok = self.pull({"videos": [{**self.entry, "sha256": manifest["sha256"]}]}, manifest)
+        self.assertFalse(ok)
+        self.assertEqual(self.downloads, settings.TRANSFER_PULL_ATTEMPTS)
+        self.assertIn("checksum mismatch", str(self.transfer.logs[-1]["failures"]))
+        self.assertFalse(Video.objects.filter(file=self.stored.file.name).exclude(pk=self.stored.pk).exists())
+
+    def test_tiny_proof_chunks_fall_back_to_downloading(self):
+        self.data = self.secret
+        manifest = {**self.manifest(), "chunk_size": 16, "chunks": ["0" * 64] * 63}
+        with mock.patch.object(transfer, "build_chunk_manifest") as rehash:
+            self.pull({"videos": [{**self.entry, "sha256": manifest["sha256"]}]}, manifest)
+        rehash.assert_not_called()
+        self.assertEqual(self.downloads, 1)
+
+    def test_source_thumbnail_names_are_not_copied(self):
+        metadata = {
+            "original_filename": "holiday.mp4",
+            "thumbnails": {"detail": self.stored.file.name},
+        }
+        manifest = self.manifest()
+        self.assertTrue(self.pull({"videos": [{**self.entry, "sha256": manifest["sha256"], "metadata": metadata}]},
+                                  manifest))
+        received = Video.objects.get(pk=self.entry["id"])
+        self.assertEqual(received.metadata, {"original_filename": "holiday.mp4"})
+        self.assertEqual(
+            sorted(received.jobs.values_list("kind", flat=True)),
+            sorted([MediaJob.KIND_THUMBNAIL, MediaJob.KIND_PROBE]),
+        )
+
+
+SERVER_SETTINGS = '''\
+from config.settings import *  # noqa
+
+DATABASES = {{"default": {{"ENGINE": "django.db.backends.sqlite3", "NAME": {root!r} + "/{name}.db", "OPTIONS": {{}}}}}}
+MEDIA_ROOT = {root!r} + "/{name}_media"
+TRANSFER_PARTIAL_DIR = {root!r} + "/{name}_partial"
+MEDIA_DECRYPT_TMP_DIR = {root!r} + "/{name}_decrypt"
+SESSION_NOTIFY_FILE = {root!r} + "/{name}.notify"
+HOSTNAME = MIRROR_ID = "mirror-{name}"
+DISCOVERY_ENABLED = MEDIA_WORKER_ENABLED = METADATA_SWEEP_ENABLED = False
+MEDIA_ENCRYPTION_KEY = ""
+PUBLIC_BASE_URL = ""
+TRANSFER_CHUNK_SIZE = 64 * 1024
+TRANSFER_TOKEN = {{
+    **TRANSFER_TOKEN,
+    "PRIVATE_KEY_PATH": {private!r},
+    "PUBLIC_KEY_PATH": {public!r},
+    "KEYS_DIR": {keys!r},
+}}
+'''
+
+SEED_SOURCE = '''
+import hashlib, os
+from django.core.files.base import ContentFile
+from mirrors.media_store import save_video_file
+from mirrors.models import Session, Video
+from mirrors.tokens import generate_transfer_token
+from mirrors.views import get_local_mirror
+
+session = Session.objects.create(mirror=get_local_mirror(), status="active", user_id="user-1")
+data = os.urandom(300 * 1024)
+video = Video(session=session, sha256=hashlib.sha256(data).hexdigest(), size_bytes=len(data))
+save_video_file(video, "clip.mp4", ContentFile(data, name="clip.mp4"))
+video.save()
+print("SEED", session.id, video.id, video.sha256, generate_transfer_token(str(session.id), "mirror-a", "mirror-b"))
+'''
+
+SEED_TARGET = '''
+from mirrors.models import Mirror
+Mirror.objects.create(hostname="mirror-a", mirror_identity="mirror-a", ip="127.0.0.1", port={port})
+'''
+
+
+def free_tcp_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class _Trap(http.server.BaseHTTPRequestHandler):
+    hits = []
+
+    def do_GET(self):
+        self.hits.append(self.path)
+        self.send_response(500)
+        self.end_headers()
+
+    do_POST = do_GET
+
+    def log_message(self, *args):
+        pass
+
+
+class TwoMirrorTransferTests(SimpleTestCase):
+    """
+    Two real servers on loopback: mirror-b pulls a session from mirror-a
+    while the request names a different source_base_url, which must
+    never be contacted.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.root = tempfile.mkdtemp(prefix="mirror-e2e-")
+        cls.addClassCleanup(shutil.rmtree, cls.root, True)
+        private, public = write_keypair(cls.root)
+        cls.env = {
+            **os.environ,
+            "PYTHONPATH": os.pathsep.join([cls.root, str(settings.BASE_DIR)]),
+            "LOG_LEVEL": "WARNING",
+        }
+        cls.env.pop("DATABASE_URL", None)
+        cls.ports = {"a": free_tcp_port(), "b": free_tcp_port()}
+        for name in cls.ports:
+            with open(os.path.join(cls.root, f"settings_{name}.py"), "w") as f:
+                f.write(SERVER_SETTINGS.format(
+                    root=cls.root, name=name, private=private, public=public, keys=cls.root,
+                ))
+            cls.manage(name, "migrate", "--verbosity", "0")
+
+        seed = cls.manage("a", "shell", "-c", SEED_SOURCE)
+        line = next(line for line in seed.splitlines() if line.startswith("SEED "))
+        cls.session_id, cls.video_id, cls.sha256, cls.token = line.split()[1:]
+        cls.manage("b", "shell", "-c", SEED_TARGET.format(port=cls.ports["a"]))
+
+        for name, port in cls.ports.items():
+            server = subprocess.Popen(
+                [sys.executable, "manage.py", "runserver", "--noreload", f"127.0.0.1:{port}"],
+                cwd=settings.BASE_DIR,
+                env={**cls.env, "DJANGO_SETTINGS_MODULE": f"settings_{name}"},
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            cls.addClassCleanup(server.wait, 10)
+            cls.addClassCleanup(server.terminate)
+            cls.wait_until_up(port)
+
+        cls.trap = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Trap)
+        threading.Thread(target=cls.trap.serve_forever, daemon=True).start()
+        cls.addClassCleanup(cls.trap.server_close)
+        cls.addClassCleanup(cls.trap.shutdown)
+
+    @classmethod
+    def manage(cls, name, *args):
+        return subprocess.run(
+            [sys.executable, "manage.py", *args],
+            cwd=settings.BASE_DIR,
+            env={**cls.env, "DJANGO_SETTINGS_MODULE": f"settings_{name}"},
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+
+    @staticmethod
+    def wait_until_up(port):
+        for _ in range(100):
+            try:
+                with urlopen(f"http://127.0.0.1:{port}/api/session/qr/status", timeout=1):
+                    return
+            except OSError:
+                time.sleep(0.1)
+        raise RuntimeError(f"server on port {port} did not start")
+
+    def call(self, name, path, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        request = Request(
+            f"http://127.0.0.1:{self.ports[name]}/api/{path}",
+            data=data,
+            headers={"Content-Type": "application/json"},
+        )
+        try:
+            with urlopen(request, timeout=10) as response:
+                return response.status, json.loads(response.read())
+        except HTTPError as exc:
+            return exc.code, None
+
+    def test_target_pulls_from_the_known_source_only(self):
+        trap_url = f"http://127.0.0.1:{self.trap.server_address[1]}/api"
+        code, body = self.call("b", "transfer_session_complete", {
+            "token": self.token,
+            "source_base_url": trap_url,
+            "session_metadata": {"user_id": "user-1"},
+        })
+        self.assertEqual(code, 201)
+
+        for _ in range(100):
+            _, status = self.call("b", f"transfer/status?transfer_id={body['transfer_id']}")
+            if status["status"] in (TransferRequest.STATUS_DONE, TransferRequest.STATUS_FAILED):
+                break
+            time.sleep(0.1)
+        self.assertEqual(status["status"], TransferRequest.STATUS_DONE, status["logs"])
+        self.assertEqual(status["receipts"], {self.video_id: self.sha256})
+        self.assertEqual(_Trap.hits, [])
+
+        # The source finalized: its copy of the session is gone.
+        code, _ = self.call("a", f"transfer_session_snapshot?session_id={self.session_id}")
+        self.assertEqual(code, 404)
+        _, videos = self.call("b", f"videos/list?session_id={self.session_id}")
+        self.assertEqual([v["sha256"] for v in videos], [self.sha256])
@@ -0,0 +1,161 @@
+import hashlib
+import http.server
+import json
+import os
+import threading
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+
+from mirrors import transfer
+from mirrors.models import TransferFile, Video
+
+from .helpers import TempMediaMixin, make_session
+
+CHUNK = 64 * 1024
+
+
+class _FaultySource(http.server.BaseHTTPRequestHandler):
+    """
+    Serves one video's manifest and bytes (with Range support) like a
+    source mirror. Each media request takes the next fault queued on
+    server.faults: ("kill", offset) drops the connection at that byte,
+    ("corrupt", offset) flips it, ("garbage", None) answers with an
+    invalid status line.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        if self.path.endswith("/manifest"):
+            body = json.dumps(server.manifest).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        start = 0
+        range_header = self.headers.get("Range")
+        server.ranges.append(range_header)
+        if range_header and not server.ignore_range:
+            start = int(range_header.split("=")[1].rstrip("-"))
+        kind, offset = server.faults.pop(0) if server.faults else (None, None)
+        data = bytearray(server.data)
+        if kind == "corrupt":
+            data[offset] ^= 0xFF
+        body = bytes(data[start:])
+
+        if kind == "garbage":
+            self.wfile.write(b"NOT-HTTP garbage\r\n\r\n")
+            self.close_connection = True
+            return
+        self.send_response(206 if start else 200)
+        if start:
+            self.send_header("Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if kind == "kill":
+            # Drop the connection mid-body, like a killed source.
+            self.wfile.write(body[: offset - start])
+            self.wfile.flush()
+            self.close_connection = True
+            self.connection.shutdown(2)
+            return
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(TRANSFER_CHUNK_SIZE=CHUNK)
+class ChunkedTransferFaultTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.data = os.urandom(5 * CHUNK + 1234)
+        chunks = [self.data[i:i + CHUNK] for i in range(0, len(self.data), CHUNK)]
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _FaultySource)
+        self.server.data = self.data
+        self.server.manifest = {
+            "size": len(self.data),
+            "sha256": hashlib.sha256(self.data).hexdigest(),
+            "chunk_size": CHUNK,
+            "chunks": [hashlib.sha256(c).hexdigest() for c in chunks],
+        }
+        self.server.ranges = []
+        self.server.faults = []
+        self.server.ignore_range = False
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.session = make_session()
+        self.entry = {
+            "id": "5b0c8f9e-55a4-4c4e-b1a4-7d2a3c000022",
+            "sha256": self.server.manifest["sha256"],
+            "file": "clip.mp4",
+        }
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}/api"
+
+    def pull(self):
+        return transfer._pull_video(self.session, self.entry, "token", self.base_url)
+
+    def assert_stored(self, digest):
+        self.assertEqual(digest, self.entry["sha256"])
+        video = Video.objects.get(pk=self.entry["id"])
+        with video.file.open("rb") as f:
+            self.assertEqual(f.read(), self.data)
+        self.assertEqual(video.metadata["original_filename"], "clip.mp4")
+        self.assertFalse(TransferFile.objects.exists())
+        self.assertEqual(os.listdir(settings.TRANSFER_PARTIAL_DIR), [])
+
+    def test_killed_mid_chunk_resumes_from_the_last_verified_chunk(self):
+        self.server.faults = [("kill", 2 * CHUNK + CHUNK // 2)]
+        with self.assertRaisesMessage(transfer.TransferError, "interrupted at chunk 2/6"):
+            self.pull()
+
+        state = TransferFile.objects.get(video_id=self.entry["id"])
+        self.assertEqual(state.chunks_done, 2)
+        # The half-received chunk never reached the partial file.
+        self.assertEqual(os.path.getsize(state.partial_path), 2 * CHUNK)
+
+        self.assert_stored(self.pull())
+        self.assertEqual(self.server.ranges, ["bytes=0-", f"bytes={2 * CHUNK}-"])
+
+    def test_corrupt_chunk_is_rejected_and_refetched(self):
+        self.server.faults = [("corrupt", 3 * CHUNK + 10)]
+        with self.assertRaisesMessage(transfer.TransferError, "chunk 3 of"):
+            self.pull()
+        state = TransferFile.objects.get(video_id=self.entry["id"])
+        self.assertEqual(state.chunks_done, 3)
+        self.assertEqual(os.path.getsize(state.partial_path), 3 * CHUNK)
+
+        self.assert_stored(self.pull())
+        self.assertEqual(self.server.ranges[-1], f"bytes={3 * CHUNK}-")
+
+    def test_source_ignoring_range_restarts_from_zero(self):
+        self.server.faults = [("kill", 4 * CHUNK + 1)]
+        with self.assertRaisesMessage(transfer.TransferError, "interrupted at chunk 4/6"):
+            self.pull()
+        self.server.ignore_range = True
+        self.assert_stored(self.pull())
+        self.assertEqual(self.server.ranges[-1], f"bytes={4 * CHUNK}-")
+
+    @override_settings(TRANSFER_PULL_ATTEMPTS=3)
+    def test_retries_survive_a_kill_then_a_corrupt_chunk(self):
+        self.server.faults = [("kill", CHUNK + 5), ("corrupt", 4 * CHUNK)]
+        video_id, digest, error = transfer._pull_video_safely(self.session, self.entry, "token", self.base_url)
+        self.assertIsNone(error)
+        self.assertEqual(video_id, self.entry["id"])
+        self.assert_stored(digest)
+        self.assertEqual(self.server.ranges, ["bytes=0-", f"bytes={CHUNK}-", f"bytes={4 * CHUNK}-"])
+
+    def test_malformed_response_counts_as_a_network_error(self):
+        self.server.faults = [("kill", 3 * CHUNK), ("garbage", None)]
+        for _ in range(2):
+            with self.assertRaisesMessage(transfer.TransferError, "interrupted at chunk"):
+                self.pull()
+        # Kept for the next attempt rather than discarded as a hard failure.
+        self.assertEqual(TransferFile.objects.get(video_id=self.entry["id"]).chunks_done, 3)
+        self.assert_stored(self.pull())
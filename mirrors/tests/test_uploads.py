@@ -0,0 +1,105 @@
+import errno
+import hashlib
+import os
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+
+from mirrors.models import MediaJob, Video
+from utils.storage import BLOB_PREFIX, INCOMING_DIR, blob_name
+
+from .helpers import TempMediaMixin, make_session
+
+
+class VideoUploadHashingTests(TempMediaMixin, TestCase):
+    def upload(self, data, name="clip.mp4"):
+        session = make_session()
+        response = self.client.post(
+            "/api/videos/upload",
+            {"session_id": str(session.pk), "file": SimpleUploadedFile(name, data, "video/mp4")},
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        return Video.objects.get(pk=response.json()["id"])
+
+    def test_small_upload_is_hashed_in_memory(self):
+        data = os.urandom(64 * 1024)
+        video = self.upload(data)
+        self.assertEqual(video.sha256, hashlib.sha256(data).hexdigest())
+        self.assertEqual(video.size_bytes, len(data))
+        with video.file.open("rb") as f:
+            self.assertEqual(f.read(), data)
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=1024 * 1024)
+    def test_large_upload_is_hashed_through_temporary_file(self):
+        data = os.urandom(3 * 1024 * 1024 + 17)
+        video = self.upload(data)
+        self.assertEqual(video.sha256, hashlib.sha256(data).hexdigest())
+        self.assertEqual(video.size_bytes, len(data))
+
+    def test_stored_file_is_not_read_back_for_the_checksum(self):
+        data = os.urandom(128 * 1024)
+        reread = AssertionError("upload was re-read to compute its checksum")
+        with mock.patch("mirrors.utils.compute_sha256", side_effect=reread), \
+                mock.patch("utils.storage._hash_content", side_effect=reread):
+            video = self.upload(data)
+        self.assertEqual(video.sha256, hashlib.sha256(data).hexdigest())
+
+    def test_upload_enqueues_probe_job(self):
+        video = self.upload(os.urandom(1024))
+        self.assertTrue(MediaJob.objects.filter(video=video, kind=MediaJob.KIND_PROBE).exists())
+
+
+class OriginalFilenameTests(TempMediaMixin, TestCase):
+    def test_upload_keeps_its_name_for_downloads(self):
+        session = make_session()
+        response = self.client.post(
+            "/api/videos/upload",
+            {"session_id": str(session.pk), "file": SimpleUploadedFile("Beach day.mp4", b"clip", "video/mp4")},
+        )
+        video = Video.objects.get(pk=response.json()["id"])
+        self.assertTrue(video.file.name.startswith("blobs/"))
+        self.assertEqual(video.metadata["original_filename"], "Beach day.mp4")
+
+        response = self.client.get(f"/api/videos/{video.pk}/stream")
+        self.assertEqual(response["Content-Disposition"], 'inline; filename="Beach day.mp4"')
+
+    def test_same_bytes_under_two_names_share_a_blob(self):
+        session = make_session()
+        names = []
+        for name in ("first.mp4", "second.mp4"):
+            response = self.client.post(
+                "/api/videos/upload",
+                {"session_id": str(session.pk), "file": SimpleUploadedFile(name, b"same bytes", "video/mp4")},
+            )
+            names.append(Video.objects.get(pk=response.json()["id"]))
+        self.assertEqual(names[0].file.name, names[1].file.name)
+        self.assertEqual([v.metadata["original_filename"] for v in names], ["first.mp4", "second.mp4"])
+
+
+class _FailingFile(ContentFile):
+    """Yields one chunk, then fails like a full disk."""
+
+    def chunks(self, chunk_size=None):
+        yield self.read()[:4]
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+
+class BlobWriteFailureTests(TempMediaMixin, TestCase):
+    def test_failed_write_leaves_no_truncated_blob(self):
+        data = b"full clip bytes"
+        storage = Video._meta.get_field("file").storage
+        digest = hashlib.sha256(data).hexdigest()
+        name = blob_name(digest, ".mp4")
+        content = _FailingFile(data)
+        content.sha256 = digest  # as the hashing upload handlers attach it
+        with self.assertRaisesMessage(OSError, "No space left"):
+            storage.save("clip.mp4", content)
+        self.assertFalse(storage.exists(name))
+        self.assertEqual(os.listdir(storage.path(f"{BLOB_PREFIX}/{INCOMING_DIR}")), [])
+
+        # The next writer of the same content is not fooled by a leftover.
+        self.assertEqual(storage.save("clip.mp4", ContentFile(data)), name)
+        with storage.open(name) as f:
+            self.assertEqual(f.read(), data)
@@ -0,0 +1,128 @@
+import base64
+from datetime import datetime, timedelta, timezone as dt_timezone
+from urllib.parse import parse_qs, urlsplit
+
+from django.test import TestCase, override_settings
+
+from mirrors.models import Video
+
+from .helpers import TempMediaMixin, make_session, make_video
+
+BASE = datetime(2026, 3, 1, 12, 0, 0, 250_000, tzinfo=dt_timezone.utc)
+
+
+class VideoListViewTests(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.session = make_session()
+        self.other_session = make_session()
+        # Offsets in seconds; the repeats share created_at, so only the id
+        # tie-break keeps them apart across page boundaries.
+        self.videos = []
+        for i, offset in enumerate((0, 10, 10, 10, 20, 30, 30, 40)):
+            video = make_video(self.session, f"clip-{i}".encode(), codec="hevc" if i % 2 else "h264")
+            Video.objects.filter(pk=video.pk).update(created_at=BASE + timedelta(seconds=offset))
+            self.videos.append(video)
+        self.elsewhere = make_video(self.other_session, b"elsewhere")
+        Video.objects.filter(pk=self.elsewhere.pk).update(created_at=BASE + timedelta(seconds=5))
+
+    def expected_ids(self, queryset):
+        return [str(pk) for pk in queryset.order_by("-created_at", "-id").values_list("id", flat=True)]
+
+    def walk(self, query):
+        """Follows X-Next-Cursor to the end; returns (ids, responses)."""
+        ids, responses = [], []
+        url = f"/api/videos/list?{query}"
+        for _ in range(20):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            responses.append(response)
+            ids.extend(row["id"] for row in response.json())
+            cursor = response.get("X-Next-Cursor")
+            if cursor is None:
+                return ids, responses
+            url = f"/api/videos/list?{query}&cursor={cursor}"
+        self.fail(f"X-Next-Cursor never ran out: {ids}")
+
+    def test_pages_cover_every_row_once_in_order(self):
+        for limit in (1, 2, 3, 4, 9, 10):
+            ids, responses = self.walk(f"limit={limit}")
+            self.assertEqual(ids, self.expected_ids(Video.objects.all()), limit)
+            self.assertEqual(len(responses), -(-9 // limit), limit)
+            self.assertTrue(all(len(r.json()) <= limit for r in responses), limit)
+
+    def test_cursor_splits_rows_sharing_created_at(self):
+        # limit=2 puts a page boundary between the three rows at +10s.
+        ids, _ = self.walk("limit=2")
+        tied = self.expected_ids(Video.objects.filter(created_at=BASE + timedelta(seconds=10)))
+        self.assertEqual(len(tied), 3)
+        self.assertEqual([i for i in ids if i in tied], tied)
+
+    def test_link_header_points_at_the_next_page(self):
+        response = self.client.get(f"/api/videos/list?session_id={self.session.pk}&limit=3")
+        cursor = response["X-Next-Cursor"]
+        url, rel = response["Link"].split("; ")
+        self.assertEqual(rel, 'rel="next"')
+        self.assertTrue(url.startswith("<http://testserver/api/videos/list?") and url.endswith(">"))
+        query = parse_qs(urlsplit(url[1:-1]).query)
+        self.assertEqual(query, {"session_id": [str(self.session.pk)], "limit": ["3"], "cursor": [cursor]})
+
+        last_page = self.client.get(f"/api/videos/list?session_id={self.session.pk}&limit=8")
+        self.assertEqual(len(last_page.json()), 8)
+        self.assertNotIn("X-Next-Cursor", last_page)
+        self.assertNotIn("Link", last_page)
+
+    @override_settings(VIDEO_LIST_PAGE_SIZE=4, VIDEO_LIST_MAX_PAGE_SIZE=6)
+    def test_limit_defaults_and_is_clamped(self):
+        self.assertEqual(len(self.client.get("/api/videos/list").json()), 4)
+        response = self.client.get("/api/videos/list?limit=1000")
+        self.assertEqual(len(response.json()), 6)
+        self.assertIn("X-Next-Cursor", response)
+
+    @override_settings(VIDEO_LIST_PAGE_SIZE=50, VIDEO_LIST_MAX_PAGE_SIZE=3)
+    def test_default_limit_never_exceeds_the_maximum(self):
+        self.assertEqual(len(self.client.get("/api/videos/list").json()), 3)
+
+    def test_bad_parameters_are_400(self):
+        not_json = base64.urlsafe_b64encode(b"nope").decode()
+        bad_id = base64.urlsafe_b64encode(b'["2026-03-01T12:00:00Z","not-a-uuid"]').decode()
+        bad_date = base64.urlsafe_b64encode(b'["yesterday","00000000-0000-0000-0000-000000000000"]').decode()
+        cases = {
+            "limit=abc": "limit must be an integer",
+            "limit=0": "limit must be positive",
+            "limit=-5": "limit must be positive",
+            "cursor=%25%25%25": "invalid cursor",
+            f"cursor={not_json}": "invalid cursor",
+            f"cursor={bad_id}": "invalid cursor",
+            f"cursor={bad_date}": "invalid cursor",
+            "created_after=yesterday": "created_after must be an ISO 8601 datetime",
+            "created_before=2026-13-45": "created_before must be an ISO 8601 datetime",
+        }
+        for query, detail in cases.items():
+            response = self.client.get(f"/api/videos/list?{query}")
+            self.assertEqual(response.status_code, 400, query)
+            self.assertEqual(response.json(), {"detail": detail}, query)
+
+    def test_session_and_codec_filters(self):
+        ids, _ = self.walk(f"session_id={self.other_session.pk}")
+        self.assertEqual(ids, [str(self.elsewhere.pk)])
+
+        ids, _ = self.walk(f"session_id={self.session.pk}&codec=hevc&limit=2")
+        self.assertEqual(ids, self.expected_ids(Video.objects.filter(session=self.session, codec="hevc")))
+        self.assertEqual(len(ids), 4)
+
+    def test_created_range_is_inclusive_then_exclusive(self):
+        after = (BASE + timedelta(seconds=10)).isoformat()
+        before = (BASE + timedelta(seconds=30)).isoformat()
+        ids, _ = self.walk(f"created_after={after.replace('+', '%2B')}&created_before={before.replace('+', '%2B')}&limit=2")
+        self.assertEqual(ids, self.expected_ids(Video.objects.filter(
+            created_at__gte=BASE + timedelta(seconds=10),
+            created_at__lt=BASE + timedelta(seconds=30),
+        )))
+        self.assertEqual(len(ids), 4)
+
+    @override_settings(TIME_ZONE="UTC")
+    def test_naive_dates_are_read_as_the_current_timezone(self):
+        naive = (BASE + timedelta(seconds=35)).replace(tzinfo=None).isoformat()
+        ids, _ = self.walk(f"created_after={naive}")
+        self.assertEqual(ids, [str(self.videos[-1].pk)])
@@ -0,0 +1,180 @@
+import os
+import subprocess
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .models import Video
+from .utils import run_media_tool
+
+DEFAULT_SIZES = {"grid": 320, "detail": 1280}
+THUMBNAIL_DIR = "thumbnails"
+
+
+class ThumbnailError(Exception):
+    pass
+
+
+class ThumbnailService:
+    """
+    Renders all thumbnail sizes of a clip with a single ffmpeg run: input
+    seeking (-ss before -i) jumps to the nearest keyframe instead of
+    decoding from the start, one frame is decoded, then split and scaled
+    once per size. Runs go through a bounded pool so at most `max_workers`
+    ffmpeg processes exist at a time.
+
+    `ffmpeg_binary` defaults to settings.FFMPEG_BINARY; pass a stub
+    executable to exercise the service without ffmpeg.
+    """
+
+    def __init__(self, ffmpeg_binary=None, sizes=None, seek_seconds=None, max_workers=None):
+        self.ffmpeg_binary = ffmpeg_binary or settings.FFMPEG_BINARY
+        self.sizes = dict(sizes or getattr(settings, "THUMBNAIL_SIZES", DEFAULT_SIZES))
+        if "grid" not in self.sizes:
+            raise ValueError("THUMBNAIL_SIZES needs a 'grid' size for Video.thumbnail")
+        self.seek_seconds = seek_seconds if seek_seconds is not None else getattr(
+            settings, "THUMBNAIL_SEEK_SECONDS", 1.0
+        )
+        self.max_workers = max_workers or getattr(settings, "THUMBNAIL_WORKERS", 2)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def build_command(self, source, outputs: dict, seek: float) -> list:
+        names = list(outputs)
+        labels = "".join(f"[{name}_in]" for name in names)
+        filters = [f"[0:v]split={len(names)}{labels}"]
+        for name in names:
+            width = int(self.sizes[name])
+            # Never upscale; -2 keeps the aspect ratio with an even height.
+            filters.append(f"[{name}_in]scale='min({width},iw)':-2[{name}]")
+
+        command = [
+            self.ffmpeg_binary,
+            "-hide_banner",
+            "-loglevel", "error",
+            "-y",
+            "-ss", f"{seek:.3f}",
+            "-i", str(source),
+            "-filter_complex", ";".join(filters),
+        ]
+        for name in names:
+            command += ["-map", f"[{name}]", "-frames:v", "1", "-q:v", "3", str(outputs[name])]
+        return command
+
+    def render(self, source, outputs: dict, seek=None) -> None:
+        """
+        Writes every size in `outputs` ({size name: path}) from `source`.
+        Clips shorter than the seek point are retried from the start.
+        """
+        seek = self.seek_seconds if seek is None else seek
+        for attempt_seek in (seek, 0.0) if seek > 0 else (0.0,):
+            for path in outputs.values():
+                Path(path).parent.mkdir(parents=True, exist_ok=True)
+            result = run_media_tool(
+                self.build_command(source, outputs, attempt_seek),
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+            )
+            if result.returncode == 0 and all(_non_empty(path) for path in outputs.values()):
+                return
+        for path in outputs.values():
+            Path(path).unlink(missing_ok=True)
+        detail = (result.stderr or b"").decode("utf-8", "replace").strip()[-500:]
+        raise ThumbnailError(f"ffmpeg exited with {result.returncode}: {detail or 'no output'}")
+
+    def render_video(self, video: Video) -> dict:
+        """
+        Renders and stores the thumbnails of a video: the grid size becomes
+        Video.thumbnail, the others go to metadata["thumbnails"]. Files it
+        replaces are removed. Returns {size name: storage name}.
+        """
+        if not video.file:
+            raise ThumbnailError("Video has no file")
+
+        thumbnail_storage = video.thumbnail.storage
+        stem = uuid.uuid4().hex
+        names = {
+            size: f"{THUMBNAIL_DIR}/{stem}.jpg" if size == "grid" else f"{THUMBNAIL_DIR}/{stem}_{size}.jpg"
+            for size in self.sizes
+        }
+        outputs = {size: thumbnail_storage.path(name) for size, name in names.items()}
+
+        seek = self.seek_seconds
+        if video.duration_seconds:
+            seek = min(seek, video.duration_seconds / 2)
+
+        with video.file.storage.plaintext_path(video.file.name) as source:
+            self.render(source, outputs, seek=seek)
+
+        metadata = dict(video.metadata or {})
+        previous = [video.thumbnail.name, *(metadata.get("thumbnails") or {}).values()]
+        metadata["thumbnails"] = {size: name for size, name in names.items() if size != "grid"}
+        Video.objects.filter(pk=video.pk).update(thumbnail=names["grid"], metadata=metadata)
+        video.thumbnail.name = names["grid"]
+        video.metadata = metadata
+
+        for name in previous:
+            if name and name not in names.values():
+                thumbnail_storage.delete(name)
+        return names
+
+    def submit(self, video: Video):
+        return self._executor().submit(self._render_pooled, video)
+
+    def render_many(self, videos):
+        """
+        Renders a batch through the pool. Yields (video, names, error) as
+        each finishes; one failure does not stop the others.
+        """
+        futures = {self.submit(video): video for video in videos}
+        for future in as_completed(futures):
+            video = futures[future]
+            try:
+                yield video, future.result(), None
+            except Exception as exc:
+                yield video, None, exc
+
+    def shutdown(self) -> None:
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+                self._pool = None
+
+    def _render_pooled(self, video):
+        try:
+            return self.render_video(video)
+        finally:
+            close_old_connections()
+
+    def _executor(self) -> ThreadPoolExecutor:
+        # Threads only wait on ffmpeg, so the pool size is the process cap.
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="mirror-thumbnails",
+                )
+            return self._pool
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_thumbnail_service() -> ThumbnailService:
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = ThumbnailService()
+        return _service
+
+
+def _non_empty(path) -> bool:
+    try:
+        return os.path.getsize(path) > 0
+    except OSError:
+        return False
@@ -1,21 +1,240 @@
 import jwt
 import datetime
+import hashlib
+import logging
+import os
+import threading
+import time
 from pathlib import Path
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 
 # Load transfer configuration
 TRANSFER_CONF = settings.TRANSFER_TOKEN
 
+_LOG = logging.getLogger(__name__)
+
+
+# -------------------------------------------
+# KEY MANAGER (parsed keys, reloaded on change)
+# -------------------------------------------
+def key_id(public_key) -> str:
+    """
+    Stable key id: truncated SHA-256 of the DER SubjectPublicKeyInfo.
+    Every mirror derives the same kid for the same public key.
+    """
+    der = public_key.public_bytes(
+        serialization.Encoding.DER,
+        serialization.PublicFormat.SubjectPublicKeyInfo,
+    )
+    return hashlib.sha256(der).hexdigest()[:16]
+
+
+RSA_ALGORITHMS = ("RS256", "RS384", "RS512")
+EDDSA_ALGORITHMS = ("EdDSA",)
+
+
+def signing_algorithm(private_key) -> str:
+    """
+    Returns TRANSFER_ALG after checking it matches the signing key type:
+    RS* for RSA keys, EdDSA for Ed25519 keys.
+    """
+    algorithm = TRANSFER_CONF["ALGORITHM"]
+    if isinstance(private_key, ed25519.Ed25519PrivateKey):
+        allowed = EDDSA_ALGORITHMS
+    elif isinstance(private_key, rsa.RSAPrivateKey):
+        allowed = RSA_ALGORITHMS
+    else:
+        raise ImproperlyConfigured("Transfer signing key must be RSA or Ed25519")
+
+    if algorithm not in allowed:
+        raise ImproperlyConfigured(
+            f"TRANSFER_ALG={algorithm} does not match the signing key type "
+            f"(expected one of {', '.join(allowed)})"
+        )
+    return algorithm
+
+
+def verification_algorithms(public_key) -> list[str]:
+    """
+    Algorithms accepted for a verification key. Bound to the key type, so
+    a mixed fleet can verify RS256 and EdDSA tokens side by side without
+    allowing algorithm confusion.
+    """
+    if isinstance(public_key, ed25519.Ed25519PublicKey):
+        return list(EDDSA_ALGORITHMS)
+    if isinstance(public_key, rsa.RSAPublicKey):
+        return list(RSA_ALGORITHMS)
+    raise jwt.InvalidTokenError("Unsupported verification key type")
+
+
+def _load_pem_as_public_key(data: bytes):
+    try:
+        return serialization.load_pem_public_key(data)
+    except ValueError:
+        return serialization.load_pem_private_key(data, password=None).public_key()
+
+
+class TransferKeyManager:
+    """
+    Parses the transfer PEM files once into `cryptography` key objects and
+    keeps them in memory. Each lookup only stats the file; a changed
+    mtime/size triggers a reload, so rotating keys on disk needs no restart.
+
+    Verification keys are indexed by kid, from every PEM in KEYS_DIR plus
+    the configured public key and peers' Mirror.public_key, so a token is
+    checked against exactly one key. A key learned from a Mirror row only
+    speaks for that mirror.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._dir_stamp = None
+        self._dir_checked_at = None
+        self._dir_keys = {}
+        self._peer_keys = {}
+        self._peer_keys_loaded_at = None
+
+    def private_key(self):
+        return self._get(
+            TRANSFER_CONF["PRIVATE_KEY_PATH"],
+            lambda data: serialization.load_pem_private_key(data, password=None),
+        )
+
+    def public_key(self):
+        return self._get(
+            TRANSFER_CONF["PUBLIC_KEY_PATH"],
+            serialization.load_pem_public_key,
+        )
+
+    def signing_kid(self) -> str:
+        return self._get(
+            TRANSFER_CONF["PRIVATE_KEY_PATH"],
+            lambda data: key_id(_load_pem_as_public_key(data)),
+            slot="kid",
+        )
+
+    def verification_key(self, kid: str):
+        """
+        Returns (public_key, owners) for `kid`, or None. `owners` is None for
+        keys installed on this mirror, which may sign for any issuer;
+        otherwise it is the identities (MIRROR_ID, hostname, pk) of the
+        Mirror rows publishing the key.
+        """
+        configured_kid = self._get(
+            TRANSFER_CONF["PUBLIC_KEY_PATH"],
+            lambda data: key_id(serialization.load_pem_public_key(data)),
+            slot="kid",
+        )
+        if kid == configured_kid:
+            return self.public_key(), None
+
+        key = self._local_keys().get(kid)
+        if key is not None:
+            return key, None
+        return self._peer_key(kid)
+
+    def _get(self, path, loader, slot="key"):
+        stat = os.stat(path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+
+        entry = self._entries.get((path, slot))
+        if entry and entry[0] == stamp:
+            return entry[1]
+
+        with self._lock:
+            entry = self._entries.get((path, slot))
+            if entry and entry[0] == stamp:
+                return entry[1]
+            value = loader(Path(path).read_bytes())
+            self._entries[(path, slot)] = (stamp, value)
+            return value
+
+    def _local_keys(self) -> dict:
+        # Rescan the directory at most once per KEYS_DIR_RECHECK_SECONDS.
+        now = time.monotonic()
+        recheck = TRANSFER_CONF.get("KEYS_DIR_RECHECK_SECONDS", 5)
+        if self._dir_checked_at is not None and now - self._dir_checked_at < recheck:
+            return self._dir_keys
+        self._dir_checked_at = now
+
+        keys_dir = TRANSFER_CONF.get("KEYS_DIR")
+        if not keys_dir or not os.path.isdir(keys_dir):
+            return {}
+
+        with os.scandir(keys_dir) as it:
+            files = sorted(
+                (entry.path, entry.stat().st_mtime_ns, entry.stat().st_size)
+                for entry in it
+                if entry.is_file() and entry.name.endswith(".pem")
+            )
+        stamp = tuple(files)
+        if stamp == self._dir_stamp:
+            return self._dir_keys
+
+        keys = {}
+        for path, _, _ in files:
+            try:
+                public_key = _load_pem_as_public_key(Path(path).read_bytes())
+            except (ValueError, TypeError, OSError) as exc:
+                _LOG.warning("Skipping unreadable transfer key %s: %s", path, exc)
+                continue
+            keys[key_id(public_key)] = public_key
+
+        with self._lock:
+            self._dir_keys = keys
+            self._dir_stamp = stamp
+        return keys
+
+    def _peer_key(self, kid: str):
+        entry = self._peer_keys.get(kid)
+        if entry is not None:
+            return entry
+
+        # Unknown kid: rebuild the peer index, at most once per refresh window.
+        refresh = TRANSFER_CONF.get("PEER_KEY_REFRESH_SECONDS", 30)
+        now = time.monotonic()
+        loaded_at = self._peer_keys_loaded_at
+        if loaded_at is not None and now - loaded_at < refresh:
+            return None
+
+        from .models import Mirror
+
+        keys = {}
+        rows = Mirror.objects.exclude(public_key__isnull=True).exclude(
+            public_key=""
+        ).values_list("public_key", "id", "hostname", "mirror_identity")
+        for pem, pk, hostname, mirror_identity in rows:
+            try:
+                public_key = serialization.load_pem_public_key(pem.encode("utf-8"))
+            except (ValueError, TypeError):
+                continue
+            kid = key_id(public_key)
+            owners = {str(pk), hostname} | ({mirror_identity} if mirror_identity else set())
+            if kid in keys:
+                owners |= keys[kid][1]
+            keys[kid] = (public_key, frozenset(owners))
+
+        with self._lock:
+            self._peer_keys = keys
+            self._peer_keys_loaded_at = now
+        return keys.get(kid)
+
+
+_key_manager = TransferKeyManager()
+
 
 # -------------------------------------------
 # LOAD PRIVATE KEY (for signing tokens)
 # -------------------------------------------
 def load_private_key():
     """
-    Reads the RSA private key used to sign transfer tokens.
+    Returns the private key (RSA or Ed25519) used to sign transfer tokens.
     """
-    private_path = Path(TRANSFER_CONF["PRIVATE_KEY_PATH"])
-    return private_path.read_text()
+    return _key_manager.private_key()
 
 
 # -------------------------------------------
@@ -23,10 +242,9 @@ def load_private_key():
 # -------------------------------------------
 def load_public_key():
     """
-    Reads the RSA public key used to verify transfer tokens.
+    Returns the public key (RSA or Ed25519) used to verify transfer tokens.
     """
-    public_path = Path(TRANSFER_CONF["PUBLIC_KEY_PATH"])
-    return public_path.read_text()
+    return _key_manager.public_key()
 
 
 # -------------------------------------------
@@ -34,7 +252,8 @@ def load_public_key():
 # -------------------------------------------
 def generate_transfer_token(session_id: str, from_mirror_id: str, to_mirror_id: str, exp_seconds=None):
     """
-    Create an RS256-signed token authorizing a session transfer between mirrors.
+    Create a signed token (RS256 or EdDSA, per TRANSFER_ALG) authorizing a
+    session transfer between mirrors.
     Token includes:
       - session ID
       - source mirror ID
@@ -43,7 +262,8 @@ def generate_transfer_token(session_id: str, from_mirror_id: str, to_mirror_id:
       - purpose: 'session_transfer'
     """
     exp_seconds = exp_seconds or TRANSFER_CONF.get("EXP_SECONDS", 120)
-    now = datetime.datetime.utcnow()
+    # Aware UTC time: a naive utcnow().timestamp() is read as local time.
+    now = datetime.datetime.now(datetime.timezone.utc)
 
     payload = {
         "sub": str(session_id),
@@ -60,7 +280,8 @@ def generate_transfer_token(session_id: str, from_mirror_id: str, to_mirror_id:
     token = jwt.encode(
         payload,
         private_key,
-        algorithm=TRANSFER_CONF["ALGORITHM"]
+        algorithm=signing_algorithm(private_key),
+        headers={"kid": _key_manager.signing_kid()},
     )
 
     return token
@@ -69,23 +290,42 @@ def generate_transfer_token(session_id: str, from_mirror_id: str, to_mirror_id:
 # -------------------------------------------
 # VALIDATE TRANSFER TOKEN
 # -------------------------------------------
-def validate_transfer_token(token: str, expected_session=None, expected_to=None):
+def validate_transfer_token(token: str, expected_session=None, expected_to=None, leeway=0):
     """
-    Validates RS256-signed transfer token.
+    Validates an RS256- or EdDSA-signed transfer token.
     Raises jwt exceptions automatically on failure.
 
+    The verification key is picked by the token's `kid` header from the
+    keyring; tokens without a kid fall back to the configured public key.
+    A key taken from a peer's Mirror row must belong to the mirror named
+    in the token's `from` claim, so one peer cannot sign as another.
+
     Optional:
       expected_session: enforce correct session ID
       expected_to: ensure destination mirror matches
+      leeway: seconds past `exp` still accepted
     """
-    public_key = load_public_key()
+    kid = jwt.get_unverified_header(token).get("kid")
+    owners = None
+    if kid:
+        entry = _key_manager.verification_key(kid)
+        if entry is None:
+            raise jwt.InvalidTokenError("Unknown signing key")
+        public_key, owners = entry
+    else:
+        public_key = load_public_key()
 
     payload = jwt.decode(
         token,
         public_key,
-        algorithms=[TRANSFER_CONF["ALGORITHM"]],
+        algorithms=verification_algorithms(public_key),
+        leeway=leeway,
     )
 
+    # Ensure a peer's key only vouches for that peer
+    if owners is not None and payload.get("from") not in owners:
+        raise jwt.InvalidTokenError("Signing key does not belong to the token issuer")
+
     # Ensure token is correct purpose
     if payload.get("purpose") != "session_transfer":
         raise jwt.InvalidTokenError("Invalid token purpose")
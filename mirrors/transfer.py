@@ -0,0 +1,439 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPException
+from urllib.error import HTTPError, URLError
+from urllib.parse import quote, urlencode, urlsplit
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.core.files import File
+from django.db import close_old_connections
+from django.utils import timezone
+
+from utils.storage import video_storage
+
+from .media_jobs import enqueue_video_jobs
+from .media_store import ORIGINAL_FILENAME_KEY, find_blob, save_video_file
+from .models import MediaJob, TransferFile, TransferRequest, Video
+from .utils import HASH_CHUNK_SIZE, compute_sha256
+
+_LOG = logging.getLogger(__name__)
+
+
+class TransferError(Exception):
+    pass
+
+
+_manifest_cache = {}
+_manifest_lock = threading.Lock()
+_MANIFEST_CACHE_SIZE = 64
+# Smallest source chunk size a stored blob is rehashed at to prove a match.
+_MIN_PROOF_CHUNK_SIZE = 64 * 1024
+
+
+def build_chunk_manifest(storage, name, chunk_size=None) -> dict:
+    """
+    Returns {"size", "sha256", "chunk_size", "chunks"} for a stored file,
+    where `chunks` lists the SHA-256 of each chunk_size piece of its
+    plaintext. Cached per (path, size, mtime) since video files do not
+    change once written.
+    """
+    chunk_size = chunk_size or getattr(settings, "TRANSFER_CHUNK_SIZE", 4 * 1024 * 1024)
+    path = storage.path(name)
+    stat = os.stat(path)
+    key = (str(path), stat.st_size, stat.st_mtime_ns, chunk_size)
+    with _manifest_lock:
+        cached = _manifest_cache.get(key)
+    if cached is not None:
+        return cached
+
+    whole = hashlib.sha256()
+    chunks = []
+    size = 0
+    with storage.open(name, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            whole.update(chunk)
+            chunks.append(hashlib.sha256(chunk).hexdigest())
+            size += len(chunk)
+    manifest = {
+        "size": size,
+        "sha256": whole.hexdigest(),
+        "chunk_size": chunk_size,
+        "chunks": chunks,
+    }
+
+    with _manifest_lock:
+        if len(_manifest_cache) >= _MANIFEST_CACHE_SIZE:
+            _manifest_cache.pop(next(iter(_manifest_cache)))
+        _manifest_cache[key] = manifest
+    return manifest
+
+
+def peer_base_url(mirror) -> str:
+    """
+    API root of a peer mirror: the base_url it announced over discovery,
+    else built from its address.
+    """
+    base_url = (mirror.metadata or {}).get("base_url")
+    if base_url:
+        return base_url.rstrip("/")
+    return f"http://{mirror.ip}:{mirror.port}/api"
+
+
+def start_session_pull(transfer: TransferRequest, token: str, base_url: str) -> threading.Thread:
+    """
+    Pulls the session's videos from the source mirror in a background
+    thread. Progress is tracked on `transfer` (status, receipts, logs).
+    """
+    thread = threading.Thread(
+        target=pull_session,
+        args=(transfer.pk, token, base_url),
+        name=f"mirror-transfer-{transfer.session_id}",
+        daemon=True,
+    )
+    thread.start()
+    return thread
+
+
+def pull_session(transfer_id, token: str, base_url: str) -> bool:
+    """
+    Downloads every video listed in the source's session snapshot, verifies
+    each against its sha256, then asks the source to finalize with the
+    receipts. The source only deletes its copy once every checksum
+    matches. Returns True when the transfer finished.
+    """
+    close_old_connections()
+    transfer = TransferRequest.objects.select_related("session").get(pk=transfer_id)
+    extra = {"session_id": str(transfer.session_id)}
+
+    try:
+        _set_status(transfer, TransferRequest.STATUS_RUNNING)
+        query = urlencode({"session_id": str(transfer.session_id)})
+        snapshot = _request_json("GET", f"{base_url}/transfer_session_snapshot?{query}", token)
+        entries = snapshot.get("videos", [])
+
+        concurrency = max(getattr(settings, "TRANSFER_PULL_CONCURRENCY", 3), 1)
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="mirror-transfer-pull") as pool:
+            results = list(pool.map(
+                lambda entry: _pull_video_safely(transfer.session, entry, token, base_url),
+                entries,
+            ))
+
+        receipts = {video_id: digest for video_id, digest, _ in results if digest}
+        failures = {video_id: error for video_id, _, error in results if error}
+        transfer.receipts = receipts
+        transfer.save(update_fields=["receipts"])
+
+        if failures:
+            _log(transfer, "pull failed", failures=failures)
+            _set_status(transfer, TransferRequest.STATUS_FAILED)
+            _LOG.warning("Transfer pull failed for %d video(s)", len(failures), extra=extra)
+            return False
+
+        _request_json("POST", f"{base_url}/transfer_session_finalize", token, {
+            "token": token,
+            "receipts": receipts,
+        })
+    except TransferError as exc:
+        _log(transfer, "transfer failed", error=str(exc))
+        _set_status(transfer, TransferRequest.STATUS_FAILED)
+        _LOG.warning("Transfer failed: %s", exc, extra=extra)
+        return False
+    except Exception as exc:
+        # Not a network problem (disk full, database error, bad payload):
+        # never leave the transfer "running" or its partial files behind.
+        _LOG.exception("Transfer failed unexpectedly", extra=extra)
+        try:
+            _log(transfer, "transfer failed", error=f"{type(exc).__name__}: {exc}")
+            _set_status(transfer, TransferRequest.STATUS_FAILED)
+        except Exception:
+            _LOG.exception("Could not record the failed transfer", extra=extra)
+        _discard_transfer_partials(transfer)
+        return False
+    finally:
+        close_old_connections()
+
+    transfer.completed = True
+    transfer.completed_at = timezone.now()
+    transfer.status = TransferRequest.STATUS_DONE
+    transfer.save(update_fields=["completed", "completed_at", "status"])
+    _log(transfer, "transfer finalized", videos=len(receipts))
+    _LOG.info("Transfer finished, %d video(s) received", len(receipts), extra=extra)
+    return True
+
+
+def _pull_video_safely(session, entry, token, base_url):
+    video_id = str(entry.get("id"))
+    attempts = max(getattr(settings, "TRANSFER_PULL_ATTEMPTS", 3), 1)
+    error = None
+    for _ in range(attempts):
+        try:
+            return video_id, _pull_video(session, entry, token, base_url), None
+        except TransferError as exc:
+            error = str(exc)
+        except Exception as exc:
+            # Retrying will not fix these, and the partial file may not
+            # match its recorded progress.
+            _LOG.exception("Pulling video %s failed", video_id, extra={"video_id": video_id})
+            _discard_video_partial(video_id)
+            return video_id, None, f"{type(exc).__name__}: {exc}"
+        finally:
+            close_old_connections()
+    _LOG.warning("Giving up on video %s: %s", video_id, error, extra={"video_id": video_id})
+    return video_id, None, error
+
+
+def _pull_video(session, entry, token, base_url) -> str:
+    video_id = entry["id"]
+    expected = entry.get("sha256") or ""
+
+    existing = Video.objects.filter(pk=video_id).only("id", "session_id", "sha256", "file").first()
+    if existing is not None:
+        if existing.session_id != session.pk:
+            raise TransferError(f"video {video_id} already belongs to another session")
+        if existing.file and (not expected or existing.sha256 == expected):
+            return existing.sha256
+
+    video = existing or Video(id=video_id, session=session)
+    video.duration_seconds = entry.get("duration_seconds")
+    video.codec = entry.get("codec") or video.codec
+    video.metadata = _received_metadata(entry, video.metadata)
+
+    media_url = f"{base_url}/transfer/media/{quote(str(video_id))}"
+    manifest = _request_json("GET", f"{media_url}/manifest", token)
+    if expected and manifest.get("sha256") != expected:
+        raise TransferError(f"manifest checksum differs from snapshot for video {video_id}")
+
+    blob = _stored_copy(manifest)
+    if blob is not None:
+        # The bytes are already stored here (e.g. the clip came back from
+        # a peer): share the blob instead of downloading it again.
+        video.file.name = blob
+        video.size_bytes = video.file.size
+        video.encrypted = video.file.storage.is_encrypted(blob)
+        video.sha256 = manifest["sha256"]
+        video.save()
+        digest = video.sha256
+    else:
+        digest = _download_video(video, entry, manifest, media_url, token)
+
+    # Thumbnails are regenerated locally rather than transferred.
+    kinds = [MediaJob.KIND_THUMBNAIL]
+    if video.duration_seconds is None:
+        kinds.append(MediaJob.KIND_PROBE)
+    enqueue_video_jobs(video, kinds=kinds)
+    return digest
+
+
+def _received_metadata(entry, current) -> dict:
+    metadata = entry.get("metadata")
+    metadata = dict(metadata) if isinstance(metadata, dict) else {}
+    # Thumbnail names point into the source's storage, and render_video()
+    # deletes the names it replaces. Keep ours; the thumbnail job renders
+    # this mirror's own.
+    metadata.pop("thumbnails", None)
+    thumbnails = (current or {}).get("thumbnails")
+    if thumbnails:
+        metadata["thumbnails"] = thumbnails
+    return metadata
+
+
+def _stored_copy(manifest) -> str | None:
+    """
+    Name of a local blob holding the manifest's file, or None. The sha256
+    is the source's claim, so a blob found by it is only shared once its
+    own chunk hashes match every chunk hash in the manifest: a source
+    that never had the bytes cannot produce those.
+    """
+    blob = find_blob(manifest.get("sha256"))
+    if blob is None:
+        return None
+    chunk_size = manifest.get("chunk_size")
+    if not isinstance(chunk_size, int) or chunk_size < _MIN_PROOF_CHUNK_SIZE:
+        return None
+    local = build_chunk_manifest(video_storage(), blob, chunk_size)
+    if local["size"] != manifest.get("size") or local["chunks"] != manifest.get("chunks"):
+        return None
+    return blob
+
+
+def _download_video(video, entry, manifest, media_url, token) -> str:
+    video_id = entry["id"]
+    state = _transfer_file_state(video.session, video_id, manifest)
+    _download_chunks(state, media_url, token)
+
+    with open(state.partial_path, "rb") as f:
+        digest = compute_sha256(f)
+        if digest != manifest["sha256"]:
+            # Every chunk matched but the whole does not: start over.
+            state.chunks_done = 0
+            state.save(update_fields=["chunks_done", "updated_at"])
+            raise TransferError(f"checksum mismatch for video {video_id}")
+
+        f.seek(0)
+        # The snapshot's file is a URL to a hash-named blob; prefer the
+        # uploaded name the source recorded.
+        name = (video.metadata or {}).get(ORIGINAL_FILENAME_KEY) or os.path.basename(
+            urlsplit(entry.get("file") or "").path
+        )
+        content = File(f, name=name or f"{video_id}.mp4")
+        content.sha256 = digest
+        video.size_bytes = state.size
+        video.sha256 = digest
+        save_video_file(video, content.name, content)
+        video.save()
+
+    _discard_partial(state)
+    return digest
+
+
+def _transfer_file_state(session, video_id, manifest) -> TransferFile:
+    transfer = (
+        TransferRequest.objects.filter(session=session, status=TransferRequest.STATUS_RUNNING)
+        .order_by("-created_at")
+        .first()
+    )
+    partial_dir = getattr(settings, "TRANSFER_PARTIAL_DIR", None) or tempfile.gettempdir()
+    os.makedirs(partial_dir, exist_ok=True)
+
+    state, created = TransferFile.objects.get_or_create(
+        video_id=video_id,
+        defaults={
+            "transfer": transfer,
+            "size": manifest["size"],
+            "sha256": manifest["sha256"],
+            "chunk_size": manifest["chunk_size"],
+            "chunk_hashes": manifest["chunks"],
+            "partial_path": os.path.join(partial_dir, f"{video_id}.part"),
+        },
+    )
+    if not created and (
+        state.sha256 != manifest["sha256"]
+        or state.chunk_size != manifest["chunk_size"]
+        or state.chunk_hashes != manifest["chunks"]
+    ):
+        # The source file or its chunking changed; old chunks are useless.
+        state.size = manifest["size"]
+        state.sha256 = manifest["sha256"]
+        state.chunk_size = manifest["chunk_size"]
+        state.chunk_hashes = manifest["chunks"]
+        state.chunks_done = 0
+    state.transfer = transfer
+    state.save()
+    return state
+
+
+def _download_chunks(state: TransferFile, url: str, token: str) -> None:
+    """
+    Fetches the file from the first unverified chunk onwards with one
+    Range request, checking and committing each chunk as it completes. A
+    dropped connection loses at most the chunk in flight.
+    """
+    total = len(state.chunk_hashes)
+    mode = "r+b" if os.path.exists(state.partial_path) else "w+b"
+    with open(state.partial_path, mode) as out:
+        # Anything past the verified prefix is from an interrupted chunk.
+        out.truncate(state.offset)
+        out.seek(state.offset)
+        if state.chunks_done >= total:
+            return
+
+        request = _build_request("GET", url, token)
+        request.add_header("Range", f"bytes={state.offset}-")
+        try:
+            with urlopen(request, timeout=_timeout()) as response:
+                if state.offset and response.status != 206:
+                    # The source sent the whole file; take it from the top.
+                    state.chunks_done = 0
+                    TransferFile.objects.filter(pk=state.pk).update(chunks_done=0)
+                    out.seek(0)
+                    out.truncate()
+                while state.chunks_done < total:
+                    index = state.chunks_done
+                    expected_len = min(state.chunk_size, state.size - index * state.chunk_size)
+                    chunk = _read_exactly(response, expected_len)
+                    if hashlib.sha256(chunk).hexdigest() != state.chunk_hashes[index]:
+                        raise TransferError(f"chunk {index} of {url} failed verification")
+                    out.write(chunk)
+                    out.flush()
+                    os.fsync(out.fileno())
+                    state.chunks_done = index + 1
+                    TransferFile.objects.filter(pk=state.pk).update(chunks_done=state.chunks_done)
+        except (HTTPError, URLError, OSError, HTTPException) as exc:
+            raise TransferError(
+                f"download of {url} interrupted at chunk {state.chunks_done}/{total}: {exc}"
+            ) from exc
+
+
+def _read_exactly(response, length: int) -> bytes:
+    parts = []
+    remaining = length
+    while remaining > 0:
+        data = response.read(min(remaining, HASH_CHUNK_SIZE))
+        if not data:
+            raise ConnectionError("connection closed mid-chunk")
+        parts.append(data)
+        remaining -= len(data)
+    return b"".join(parts)
+
+
+def _discard_partial(state: TransferFile) -> None:
+    try:
+        os.remove(state.partial_path)
+    except FileNotFoundError:
+        pass
+    state.delete()
+
+
+def _discard_video_partial(video_id) -> None:
+    try:
+        for state in TransferFile.objects.filter(video_id=video_id):
+            _discard_partial(state)
+    except Exception:
+        _LOG.exception("Could not remove the partial download of video %s", video_id)
+
+
+def _discard_transfer_partials(transfer) -> None:
+    try:
+        for state in TransferFile.objects.filter(transfer=transfer):
+            _discard_partial(state)
+    except Exception:
+        _LOG.exception("Could not remove partial downloads", extra={"session_id": str(transfer.session_id)})
+
+
+def _request_json(method, url, token, body=None):
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    try:
+        with urlopen(_build_request(method, url, token, data), timeout=_timeout()) as response:
+            return json.loads(response.read() or b"{}")
+    except HTTPError as exc:
+        detail = exc.read()[:500].decode("utf-8", "replace")
+        raise TransferError(f"{method} {url} returned {exc.code}: {detail}") from exc
+    except (URLError, OSError, ValueError, HTTPException) as exc:
+        raise TransferError(f"{method} {url} failed: {exc}") from exc
+
+
+def _build_request(method, url, token, data=None):
+    headers = {"Authorization": f"Bearer {token}", "Accept": "application/json"}
+    if data is not None:
+        headers["Content-Type"] = "application/json"
+    return Request(url, data=data, headers=headers, method=method)
+
+
+def _timeout():
+    return getattr(settings, "TRANSFER_HTTP_TIMEOUT", 30)
+
+
+def _set_status(transfer, status):
+    transfer.status = status
+    transfer.save(update_fields=["status"])
+
+
+def _log(transfer, event, **fields):
+    transfer.logs = [*(transfer.logs or []), {"at": timezone.now().isoformat(), "event": event, **fields}]
+    transfer.save(update_fields=["logs"])
@@ -5,20 +5,26 @@ from .views import (
     VideoUploadView,
     VideoListView,
     VideoDetailView,
+    VideoStreamView,
     VideoDeleteView,
     PeerSessionsView,
     TransferSessionRequestView,
     TransferSessionCompleteView,
     TransferSessionSnapshotView,
+    TransferMediaView,
+    TransferMediaManifestView,
+    TransferStatusView,
     TransferSessionFinalizeView,
     QRSessionCreateView,
     QRSessionActivateView,
     QRActivationHTMLView,
     QRSessionStatusView,
+    QRSessionStatusWaitView,
     StartRecordingView,
     StopRecordingView,
     ExportTokenView, 
     ExportDownloadView,
+    MetricsView,
 )
 
 urlpatterns = [
@@ -28,10 +34,12 @@ urlpatterns = [
     path("session/qr/activate", QRSessionActivateView.as_view()),
     path("qr/activate", QRActivationHTMLView.as_view(), name = "qr_activation_html"),
     path("session/qr/status", QRSessionStatusView.as_view()),
+    path("session/qr/status/wait", QRSessionStatusWaitView.as_view()),
 
     path("videos/upload", VideoUploadView.as_view(), name="videos_upload"),
     path("videos/list", VideoListView.as_view(), name="videos_list"),
     path("videos/<uuid:pk>", VideoDetailView.as_view(), name="video_detail"),
+    path("videos/<uuid:pk>/stream", VideoStreamView.as_view(), name="video_stream"),
     path("videos/delete", VideoDeleteView.as_view()),
 
     path("peer/sessions", PeerSessionsView.as_view(), name="peer_sessions"),
@@ -40,6 +48,9 @@ urlpatterns = [
     path("transfer_session_complete", TransferSessionCompleteView.as_view(), name="transfer_complete"),
     path("transfer_session_snapshot", TransferSessionSnapshotView.as_view(), name="transfer_snapshot"),
     path("transfer_session_finalize", TransferSessionFinalizeView.as_view(), name="transfer_finalize"),
+    path("transfer/media/<uuid:pk>", TransferMediaView.as_view(), name="transfer_media"),
+    path("transfer/media/<uuid:pk>/manifest", TransferMediaManifestView.as_view(), name="transfer_media_manifest"),
+    path("transfer/status", TransferStatusView.as_view(), name="transfer_status"),
 
     path("record/start", StartRecordingView.as_view()),
     path("record/stop", StopRecordingView.as_view()),
@@ -47,4 +58,6 @@ urlpatterns = [
     path("export/token", ExportTokenView.as_view()),
     path("export", ExportDownloadView.as_view()),
 
+    path("metrics", MetricsView.as_view(), name="metrics"),
+
 ]
@@ -5,9 +5,13 @@ import jwt
 from datetime import datetime, timedelta
 from django.conf import settings
 import subprocess
+import time
 from pathlib import Path
 
+from utils.metrics import record_subprocess
+
 EXPORT_TOKEN_TTL_SECONDS = 600  # 10 minutes
+HASH_CHUNK_SIZE = 1024 * 1024
 
 def generate_qr_token():
     """
@@ -20,6 +24,31 @@ def generate_qr_token():
     return raw, hashed
 
 
+def compute_sha256(file_obj):
+    """
+    Streams a file object through SHA-256 in fixed-size chunks.
+    """
+    sha = hashlib.sha256()
+    for chunk in iter(lambda: file_obj.read(HASH_CHUNK_SIZE), b""):
+        sha.update(chunk)
+    return sha.hexdigest()
+
+
+def get_upload_sha256(uploaded_file):
+    """
+    Returns the digest computed by the hashing upload handlers, falling back
+    to a chunked read for files that did not come through them.
+    """
+    digest = getattr(uploaded_file, "sha256", None)
+    if digest:
+        return digest
+
+    uploaded_file.seek(0)
+    digest = compute_sha256(uploaded_file)
+    uploaded_file.seek(0)
+    return digest
+
+
 def generate_export_token(session_id: str, device_id: str) -> str:
     payload = {
         "session_id": session_id,
@@ -58,25 +87,39 @@ def get_public_base_url(request=None):
     host = request.get_host()
     return f"{scheme}://{host}"
 
+def run_media_tool(args, **kwargs):
+    """
+    subprocess.run wrapper for ffmpeg/ffprobe that records run time in the
+    metrics registry (and against the current request, if any).
+    """
+    start = time.perf_counter()
+    try:
+        return subprocess.run(args, **kwargs)
+    finally:
+        record_subprocess(Path(args[0]).name, time.perf_counter() - start)
+
 def generate_video_thumbnail(video_path, output_path):
-    subprocess.run([
-        "ffmpeg",
+    # -ss before -i seeks the input to the nearest keyframe instead of
+    # decoding everything up to 1s. See mirrors.thumbnails for the
+    # multi-size service used by the media worker.
+    run_media_tool([
+        settings.FFMPEG_BINARY,
         "-y",
-        "-i", video_path,
         "-ss", "00:00:01",
-        "-vframes", "1",
-        output_path
-    ], check=True)
+        "-i", str(video_path),
+        "-frames:v", "1",
+        str(output_path),
+    ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
 
 def get_video_duration_seconds(video_path):
     try:
-        result = subprocess.run(
+        result = run_media_tool(
             [
-                "ffprobe",
+                settings.FFPROBE_BINARY,
                 "-v", "error",
                 "-show_entries", "format=duration",
                 "-of", "default=noprint_wrappers=1:nokey=1",
-                video_path,
+                str(video_path),
             ],
             capture_output=True,
             text=True,
@@ -2,41 +2,124 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
 from django.shortcuts import get_object_or_404
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Case, F, Q, Subquery, Value, When
 from django.utils import timezone
-from datetime import timedelta
+from django.utils.dateparse import parse_datetime
+from datetime import datetime, timedelta, timezone as dt_timezone
 from django.conf import settings
-from django.http import HttpResponse, HttpResponseForbidden
+from django.core.exceptions import ValidationError
+from django.urls import reverse
+from django.http import Http404, HttpResponse, HttpResponseForbidden, StreamingHttpResponse
+from django.utils.html import escape
+from django.utils.http import content_disposition_header
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+import base64
 import hashlib
-from pathlib import Path
-import subprocess
+import json
+import logging
+import mimetypes
+from functools import partial
+from urllib.parse import urlencode
+import threading
+import time
 import uuid
 
-from .models import Mirror, Session, Video, TransferRequest
+from utils.metrics import registry as metrics_registry
+
+from .models import Mirror, Session, Video, TransferRequest, MediaJob
+from .discovery import peers as discovery_peers
+from .media_jobs import enqueue_video_jobs
+from .media_store import download_name, release_video_file, save_video_file
+from .streaming import accel_redirect_response, stream_file
+from .transfer import build_chunk_manifest, peer_base_url, start_session_pull
+from .zipstream import ZipEntry, iter_zip, zip_stream_size
+from .notifier import (
+    current_session_version,
+    notify_session_changed,
+    wait_for_session_change,
+)
 
 from .serializers import (
     SessionSerializer,
     VideoSerializer,
     MirrorSerializer,
+    serialize_video_list,
 )
 from .tokens import generate_transfer_token, validate_transfer_token
 from .utils import (
     generate_qr_token,
     generate_export_token,
     validate_export_token,
-    generate_video_thumbnail,
-    get_video_duration_seconds,
     get_public_base_url,
+    get_upload_sha256,
+    compute_sha256,
 )
 
 
 
+_LOG = logging.getLogger(__name__)
+
+
 # -------------------------------------------
 # Helper: Get or create this device's Mirror
 # -------------------------------------------
+_local_mirror_lock = threading.Lock()
+_local_mirror_cache = {"mirror": None, "expires_at": 0.0}
+
+
 def get_local_mirror():
-    print("DEBUG: Resolving local mirror using HOSTNAME =", settings.HOSTNAME)
+    """
+    Returns this device's Mirror row, cached process-wide so hot endpoints
+    don't pay a get_or_create per request. The cache is dropped whenever the
+    local Mirror is saved or deleted, and otherwise expires after
+    LOCAL_MIRROR_CACHE_SECONDS.
+    """
+    with _local_mirror_lock:
+        mirror = _local_mirror_cache["mirror"]
+        if mirror is not None and time.monotonic() < _local_mirror_cache["expires_at"]:
+            return mirror
+
+    mirror = _load_local_mirror()
+
+    ttl = getattr(settings, "LOCAL_MIRROR_CACHE_SECONDS", 60)
+    with _local_mirror_lock:
+        _local_mirror_cache["mirror"] = mirror
+        _local_mirror_cache["expires_at"] = time.monotonic() + ttl
+    return mirror
+
+
+def invalidate_local_mirror_cache():
+    with _local_mirror_lock:
+        _local_mirror_cache["mirror"] = None
+        _local_mirror_cache["expires_at"] = 0.0
+
+
+@receiver(post_save, sender=Mirror, dispatch_uid="mirrors.local_mirror_saved")
+@receiver(post_delete, sender=Mirror, dispatch_uid="mirrors.local_mirror_deleted")
+def _on_mirror_changed(sender, instance, **kwargs):
+    if instance.hostname == settings.HOSTNAME:
+        invalidate_local_mirror_cache()
+
+
+@receiver(post_save, sender=Session, dispatch_uid="mirrors.session_saved")
+@receiver(post_delete, sender=Session, dispatch_uid="mirrors.session_deleted")
+def _on_session_changed(sender, instance, **kwargs):
+    # Waiters re-read the row when woken, so only signal once it is visible.
+    transaction.on_commit(notify_session_changed)
 
+
+@receiver(post_delete, sender=Video, dispatch_uid="mirrors.video_deleted")
+def _on_video_deleted(sender, instance, **kwargs):
+    # Blobs are shared between rows; drop the file only once the last
+    # reference is committed away.
+    name = instance.file.name
+    if name:
+        transaction.on_commit(lambda: release_video_file(name))
+
+
+def _load_local_mirror():
     hostname = settings.HOSTNAME
     mirror, created = Mirror.objects.get_or_create(
         hostname=hostname,
@@ -44,36 +127,54 @@ def get_local_mirror():
     )
 
     if created:
-        print("DEBUG: Created new Mirror entry:", mirror)
-    else:
-        print("DEBUG: Using existing Mirror entry:", mirror)
+        _LOG.info("Created local Mirror entry %s for HOSTNAME=%s", mirror.id, hostname)
 
     mirror_id = getattr(settings, "MIRROR_ID", "") or hostname
     metadata = mirror.metadata or {}
+    update_fields = []
     if metadata.get("mirror_id") != mirror_id:
         metadata["mirror_id"] = mirror_id
         mirror.metadata = metadata
-        mirror.save(update_fields=["metadata"])
+        update_fields.append("metadata")
+    if mirror.mirror_identity != mirror_id:
+        # A peer row may have claimed this identity before MIRROR_ID moved here.
+        Mirror.objects.filter(mirror_identity=mirror_id).exclude(pk=mirror.pk).update(mirror_identity=None)
+        mirror.mirror_identity = mirror_id
+        update_fields.append("mirror_identity")
+    if update_fields:
+        mirror.save(update_fields=update_fields)
 
     return mirror
 
 
+def mirror_identity_q(identity: str, prefix: str = "") -> Q:
+    """
+    Q matching a Mirror by MIRROR_ID, hostname or primary key (only when
+    `identity` is a UUID), optionally through a relation `prefix`.
+    """
+    q = Q(**{f"{prefix}mirror_identity": identity}) | Q(**{f"{prefix}hostname": identity})
+    try:
+        q |= Q(**{f"{prefix}id": uuid.UUID(str(identity))})
+    except ValueError:
+        pass
+    return q
+
+
 def resolve_mirror_by_identity(identity: str) -> Mirror | None:
     if not identity:
         return None
 
-    mirror = Mirror.objects.filter(metadata__mirror_id=identity).first()
-    if mirror:
-        return mirror
-
-    mirror = Mirror.objects.filter(hostname=identity).first()
-    if mirror:
-        return mirror
-
-    try:
-        return Mirror.objects.get(pk=identity)
-    except Mirror.DoesNotExist:
-        return None
+    # One indexed OR query. Each branch matches a unique column, so at most
+    # three rows come back; precedence is identity, then hostname, then pk.
+    candidates = list(Mirror.objects.filter(mirror_identity_q(identity)))
+    for matches in (
+        lambda m: m.mirror_identity == identity,
+        lambda m: m.hostname == identity,
+    ):
+        for mirror in candidates:
+            if matches(mirror):
+                return mirror
+    return candidates[0] if candidates else None
 
 
 
@@ -104,11 +205,6 @@ class QRSessionCreateView(APIView):
     permission_classes = [permissions.AllowAny]
 
     def post(self, request):
-        print("\n===================================")
-        print("DEBUG: QRSessionCreateView POST CALLED")
-        print("Request META:", request.META.get("REMOTE_ADDR"))
-        print("===================================\n")
-
         mirror = get_local_mirror()
 
         Session.objects.filter(
@@ -119,11 +215,7 @@ class QRSessionCreateView(APIView):
             ended_at=timezone.now(),
         )
 
-        print("DEBUG: Mirror resolved:", mirror)
-
         raw_token, hashed = generate_qr_token()
-        print("DEBUG: QR raw token:", raw_token)
-        print("DEBUG: QR hashed token:", hashed)
 
         base_url = get_public_base_url(request)
         if not base_url and settings.DEVICE_IP:
@@ -131,8 +223,6 @@ class QRSessionCreateView(APIView):
 
         qr_url = f"{base_url}/api/qr/activate?token={raw_token}"
 
-        print("DEBUG: Generated QR URL =", qr_url)
-
         try:
             session = Session.objects.create(
                 mirror=mirror,
@@ -140,19 +230,25 @@ class QRSessionCreateView(APIView):
                 qr_url=qr_url,
                 status=Session.STATUS_PENDING,
             )
-            print("DEBUG: Session created successfully:", session.id)
-
         except Exception as e:
-            print("ERROR: Failed to create Session:", str(e))
+            _LOG.exception("Failed to create QR session", extra={"mirror_id": str(mirror.id)})
             return Response({"error": str(e)}, status=500)
 
+        _LOG.info(
+            "QR session created",
+            extra={
+                "session_id": str(session.id),
+                "mirror_id": str(mirror.id),
+                "remote_addr": request.META.get("REMOTE_ADDR"),
+            },
+        )
+
         response_data = {
             "session_id": str(session.id),
             "qr_url": qr_url,
             "qr_status": session.status,
             "qr_token": raw_token,  # Include raw token for reactivation
         }
-        print("DEBUG: Returning JSON:", response_data)
 
         return Response(response_data, status=201)
 
@@ -176,17 +272,15 @@ class QRSessionActivateView(APIView):
         if not device_id:
             device_id = user_id
 
-        print(
-            f"🔐 QR Activation: token={raw_token[:20]}... "
-            f"user_id={user_id} device_id={device_id}"
-        )
+        _LOG.debug("QR activation requested user_id=%s device_id=%s", user_id, device_id)
 
         hashed = hashlib.sha256(raw_token.encode()).hexdigest()
 
         local = get_local_mirror()
-        
-        # Prefer resuming the most recent local session for this user.
-        existing_local = Session.objects.filter(
+
+        # Prefer resuming the most recent local session for this user;
+        # otherwise activate the pending session tied to this token.
+        resume = Session.objects.filter(
             user_id=user_id,
             mirror=local,
         ).exclude(
@@ -194,67 +288,67 @@ class QRSessionActivateView(APIView):
         ).order_by(
             "-activated_at",
             "-started_at"
-        ).first()
-
-        if existing_local:
-            print(
-                f"✅ Resuming local session {existing_local.id} for user {user_id}"
-            )
-            existing_local.status = Session.STATUS_ACTIVE
-            existing_local.activated_at = timezone.now()
-            existing_local.ended_at = None
-            if device_id:
-                existing_local.device_id = device_id
-            existing_local.save(
-                update_fields=["status", "activated_at", "ended_at", "device_id"]
-            )
-
-            # End the newly created pending session tied to this token (if any).
-            pending = Session.objects.filter(
-                qr_token_hash=hashed,
-                status=Session.STATUS_PENDING,
-            ).exclude(id=existing_local.id).first()
-            if pending:
-                pending.status = Session.STATUS_ENDED
-                pending.ended_at = timezone.now()
-                pending.save(update_fields=["status", "ended_at"])
-
-            return Response({
-                "session_id": str(existing_local.id),
-                "status": "active",
-                "type": "resumed"
-            })
-
-        # If there is an active session for this user on another mirror,
-        # activate a new local session (transfer will follow).
-        existing_remote = Session.objects.filter(
-            user_id=user_id,
-            status=Session.STATUS_ACTIVE,
-        ).exclude(mirror=local).order_by("-activated_at").first()
-        if existing_remote:
-            print(
-                f"ℹ️ Active session for user {user_id} is on another mirror "
-                f"({existing_remote.mirror.hostname}); activating new session here."
+        ).values("pk")[:1]
+
+        with transaction.atomic():
+            # Query 1: the resumable session and the token's pending session.
+            candidates = list(
+                Session.objects.select_for_update()
+                .filter(
+                    Q(pk=Subquery(resume))
+                    | Q(qr_token_hash=hashed, status=Session.STATUS_PENDING)
+                )
+                .only("id", "status", "qr_token_hash")
             )
+            pending = next((s for s in candidates if s.status == Session.STATUS_PENDING), None)
+            resumed = next((s for s in candidates if s.status != Session.STATUS_PENDING), None)
+
+            target = resumed or pending
+            if target is None:
+                return Response({"detail": "Invalid or expired QR"}, status=400)
+
+            # Query 2: activate the target and, when resuming, end the
+            # now-unused pending session, in one UPDATE.
+            now = timezone.now()
+            is_target = Q(pk=target.pk)
+            updates = {
+                "status": Case(
+                    When(is_target, then=Value(Session.STATUS_ACTIVE)),
+                    default=Value(Session.STATUS_ENDED),
+                ),
+                "activated_at": Case(When(is_target, then=Value(now)), default=F("activated_at")),
+                "ended_at": Case(When(is_target, then=Value(None)), default=Value(now)),
+                "device_id": Case(When(is_target, then=Value(device_id)), default=F("device_id")),
+            }
+            if target is pending:
+                updates["user_id"] = Value(user_id)
+            Session.objects.filter(pk__in=[s.pk for s in candidates]).update(**updates)
 
-        try:
-            session = Session.objects.get(
-                qr_token_hash=hashed,
-                status=Session.STATUS_PENDING
-            )
-        except Session.DoesNotExist:
-            return Response({"detail": "Invalid or expired QR"}, status=400)
+            # update() bypasses post_save, so wake QR status pollers here.
+            transaction.on_commit(notify_session_changed)
 
-        print(
-            f"✅ Activating new session {session.id} "
-            f"with user_id={user_id} device_id={device_id}"
+        _LOG.info(
+            "%s session for user %s", "Resuming local" if resumed else "Activating new", user_id,
+            extra={"session_id": str(target.id), "mirror_id": str(local.id)},
         )
-        session.mark_active(device_id=device_id, user_id=user_id)
+
+        if not resumed and _LOG.isEnabledFor(logging.DEBUG):
+            # Only feeds a debug message, so skipped unless debug is enabled.
+            existing_remote = Session.objects.filter(
+                user_id=user_id,
+                status=Session.STATUS_ACTIVE,
+            ).exclude(mirror=local).select_related("mirror").order_by("-activated_at").first()
+            if existing_remote:
+                _LOG.debug(
+                    "Active session for user %s is on another mirror (%s); activated new session here",
+                    user_id, existing_remote.mirror.hostname,
+                    extra={"session_id": str(existing_remote.id)},
+                )
 
         return Response({
-            "session_id": str(session.id),
+            "session_id": str(target.id),
             "status": "active",
-            "type": "new"
+            "type": "resumed" if resumed else "new",
         })
 
 
@@ -390,34 +484,83 @@ class QRActivationHTMLView(APIView):
 # -------------------------------------------
 
 
+def _qr_status_payload(mirror):
+    # 🔴 FIND THE TRUTH FROM DB, NOT FROM CLIENT
+    # Active session wins, otherwise the newest pending one (single query).
+    session = Session.objects.filter(
+        mirror=mirror,
+        status__in=[Session.STATUS_ACTIVE, Session.STATUS_PENDING],
+    ).order_by(
+        Case(
+            When(status=Session.STATUS_ACTIVE, then=Value(0)),
+            default=Value(1),
+        ),
+        "-started_at",
+    ).only("id", "status", "activated_at").first()
+
+    if not session:
+        return {
+            "session_id": None,
+            "qr_status": "none",
+            "activated_at": None,
+        }
+
+    return {
+        "session_id": str(session.id),
+        "qr_status": session.status,
+        "activated_at": session.activated_at,
+    }
+
+
 class QRSessionStatusView(APIView):
     permission_classes = [permissions.AllowAny]
 
     def get(self, request):
         mirror = get_local_mirror()
+        return Response(_qr_status_payload(mirror))
 
-        # 🔴 FIND THE TRUTH FROM DB, NOT FROM CLIENT
-        session = Session.objects.filter(
-            mirror=mirror,
-            status=Session.STATUS_ACTIVE
-        ).first()
 
-        if not session:
-            session = Session.objects.filter(
-                mirror=mirror,
-                status=Session.STATUS_PENDING
-            ).order_by("-started_at").first()
-            # return Response({
-            #     "session_id": None,
-            #     "qr_status": "none",
-            #     "activated_at": None,
-            # })
+class QRSessionStatusWaitView(APIView):
+    """
+    Long-poll variant of QRSessionStatusView. The client passes the
+    session_id/qr_status it last saw; the request blocks until that changes
+    or `timeout` seconds pass, then returns the current status.
 
-        return Response({
-            "session_id": str(session.id),
-            "qr_status": session.status,
-            "activated_at": session.activated_at,
-        })
+    Changes made in this process wake the request immediately, changes
+    made by another worker process within SESSION_NOTIFY_POLL_SECONDS
+    (see mirrors.notifier). The database is also re-checked every
+    QR_STATUS_RECHECK_SECONDS in case a signal is lost. A waiting request
+    occupies one gunicorn thread, not a whole worker.
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        known = (
+            request.query_params.get("session_id") or None,
+            request.query_params.get("qr_status") or None,
+        )
+        max_timeout = getattr(settings, "QR_STATUS_WAIT_MAX_SECONDS", 25)
+        try:
+            timeout = float(request.query_params.get("timeout", max_timeout))
+        except ValueError:
+            return Response({"detail": "timeout must be a number"}, status=400)
+        timeout = min(max(timeout, 0.0), max_timeout)
+        recheck = getattr(settings, "QR_STATUS_RECHECK_SECONDS", 1.0)
+
+        mirror = get_local_mirror()
+        deadline = time.monotonic() + timeout
+
+        while True:
+            version = current_session_version()
+            payload = _qr_status_payload(mirror)
+            if (payload["session_id"], payload["qr_status"]) != known:
+                return Response(payload)
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return Response(payload)
+
+            wait_for_session_change(version, min(remaining, recheck))
 
 
 # class QRSessionStatusView(APIView):
@@ -462,7 +605,7 @@ class SessionEndView(APIView):
         session = get_object_or_404(Session, pk=session_id)
 
         local = get_local_mirror()
-        if session.mirror != local:
+        if session.mirror_id != local.pk:
             return Response({"detail": "Not owner"}, status=status.HTTP_403_FORBIDDEN)
 
         session.status = "ended"
@@ -487,21 +630,20 @@ class VideoUploadView(APIView):
         session = get_object_or_404(Session, pk=session_id)
         local = get_local_mirror()
 
-        if session.mirror != local:
+        if session.mirror_id != local.pk:
             return Response({"detail": "Not owner of session"}, status=403)
 
-        video = Video(session=session, file=file, size_bytes=file.size)
+        # SHA256 checksum comes from the upload handlers, which hash the
+        # bytes as they stream in, so the stored file is never re-read.
+        video = Video(
+            session=session,
+            size_bytes=file.size,
+            sha256=get_upload_sha256(file),
+        )
+        save_video_file(video, file.name, file)
         video.save()
 
-        # SHA256 checksum
-        with video.file.open("rb") as f:
-            sha = hashlib.sha256(f.read()).hexdigest()
-
-        video.sha256 = sha
-        duration_seconds = get_video_duration_seconds(video.file.path)
-        if duration_seconds is not None:
-            video.duration_seconds = duration_seconds
-        video.save()
+        enqueue_video_jobs(video, kinds=[MediaJob.KIND_PROBE])
 
         return Response(VideoSerializer(video).data, status=201)
 
@@ -510,30 +652,109 @@ class VideoUploadView(APIView):
 #  VIDEO LIST
 # -------------------------------------------
 class VideoListView(APIView):
+    """
+    Newest-first video list with keyset pagination on (created_at, id).
+
+    Query params: session_id, codec, created_after / created_before (ISO
+    8601), limit, cursor. The body stays a plain list; when more rows
+    exist the next page is advertised in `X-Next-Cursor` and a
+    `Link: <...>; rel="next"` header.
+    """
     permission_classes = [permissions.AllowAny]
 
     def get(self, request):
-        session_id = request.query_params.get("session_id")
+        params = request.query_params
+        videos = Video.objects.all()
 
+        session_id = params.get("session_id")
         if session_id:
-            videos = Video.objects.filter(session__id=session_id)
-        else:
-            videos = Video.objects.all()
+            videos = videos.filter(session__id=session_id)
 
-        # Best-effort backfill for missing durations.
-        for video in videos.filter(duration_seconds__isnull=True):
-            duration_seconds = get_video_duration_seconds(video.file.path)
-            if duration_seconds is not None:
-                video.duration_seconds = duration_seconds
-                video.save(update_fields=["duration_seconds"])
+        codec = params.get("codec")
+        if codec:
+            videos = videos.filter(codec=codec)
 
-        return Response(
-            VideoSerializer(
-                videos,
-                many=True,
-                context={"request": request}
-            ).data
-        )
+        try:
+            created_after = _parse_datetime_param(params, "created_after")
+            created_before = _parse_datetime_param(params, "created_before")
+            limit = _parse_limit(params.get("limit"))
+            cursor = _decode_video_cursor(params.get("cursor"))
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=400)
+
+        if created_after:
+            videos = videos.filter(created_at__gte=created_after)
+        if created_before:
+            videos = videos.filter(created_at__lt=created_before)
+        if cursor:
+            cursor_created_at, cursor_id = cursor
+            videos = videos.filter(
+                Q(created_at__lt=cursor_created_at)
+                | Q(created_at=cursor_created_at, id__lt=cursor_id)
+            )
+
+        # One extra row tells us whether there is a next page.
+        videos = videos.order_by("-created_at", "-id")[: limit + 1]
+
+        # Missing durations are backfilled by mirrors.reconciler, never here.
+        rows = serialize_video_list(videos, request)
+
+        response = Response(rows[:limit])
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = _encode_video_cursor(last["created_at"], last["id"])
+            query = request.GET.copy()
+            query["cursor"] = next_cursor
+            next_url = request.build_absolute_uri(f"{request.path}?{query.urlencode()}")
+            response["X-Next-Cursor"] = next_cursor
+            response["Link"] = f'<{next_url}>; rel="next"'
+        return response
+
+
+def _parse_limit(value):
+    default = getattr(settings, "VIDEO_LIST_PAGE_SIZE", 100)
+    maximum = getattr(settings, "VIDEO_LIST_MAX_PAGE_SIZE", 500)
+    if not value:
+        return min(default, maximum)
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    return min(limit, maximum)
+
+
+def _parse_datetime_param(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(f"{name} must be an ISO 8601 datetime")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _encode_video_cursor(created_at, video_id):
+    raw = json.dumps([created_at, str(video_id)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_video_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, video_id = json.loads(raw)
+        created_at = parse_datetime(created_at)
+        video_id = uuid.UUID(video_id)
+    except (ValueError, TypeError):
+        raise ValueError("invalid cursor")
+    if created_at is None:
+        raise ValueError("invalid cursor")
+    return created_at, video_id
 
 
 
@@ -548,6 +769,60 @@ class VideoDetailView(APIView):
         return Response(VideoSerializer(video).data)
 
 
+# -------------------------------------------
+#  VIDEO STREAM (Range / conditional GET)
+# -------------------------------------------
+class VideoStreamView(APIView):
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, pk):
+        video = get_object_or_404(Video.objects.only("id", "file", "sha256", "metadata", "created_at"), pk=pk)
+        return _video_file_response(request, video)
+
+
+def _video_file_response(request, video):
+    """Range/conditional response for a video's file (or a proxy handoff)."""
+    if not video.file:
+        raise Http404("Video has no file")
+
+    storage = video.file.storage
+    path = video.file.path
+    content_type = mimetypes.guess_type(path)[0] or "video/mp4"
+
+    try:
+        # The proxy would serve ciphertext, so encrypted files stay here.
+        encrypted = storage.is_encrypted(video.file.name)
+    except FileNotFoundError:
+        raise Http404("Video file missing")
+
+    accel = getattr(settings, "VIDEO_STREAM_ACCEL", "")
+    if accel and not encrypted:
+        response = accel_redirect_response(
+            accel, video.file.name, path,
+            etag=video.sha256 or None,
+            content_type=content_type,
+        )
+    else:
+        try:
+            f = storage.open(video.file.name, "rb")
+        except FileNotFoundError:
+            raise Http404("Video file missing")
+
+        response = stream_file(
+            request,
+            f,
+            f.size,
+            etag=video.sha256 or None,
+            # Not the file's mtime: shared blobs are touched on every
+            # dedup hit, which would defeat If-Modified-Since and If-Range.
+            last_modified=video.created_at.timestamp(),
+            content_type=content_type,
+        )
+    # Stored names are content hashes; "save as" gets the uploaded name.
+    response["Content-Disposition"] = content_disposition_header(False, download_name(video))
+    return response
+
+
 # -------------------------------------------
 #  PEER SESSIONS
 # -------------------------------------------
@@ -559,7 +834,7 @@ class PeerSessionsView(APIView):
 
         mirror_data = MirrorSerializer(local).data
         sessions_data = SessionSerializer(
-            local.sessions.filter(status="active"),
+            Session.objects.filter(mirror=local, status="active").select_related("mirror"),
             many=True
         ).data
 
@@ -589,7 +864,7 @@ class TransferSessionRequestView(APIView):
         session = get_object_or_404(Session, pk=session_id)
         local = get_local_mirror()
 
-        if session.mirror != local:
+        if session.mirror_id != local.pk:
             return Response({"detail": "Not owner"}, status=403)
 
         to_mirror = resolve_mirror_by_identity(to_mirror_id)
@@ -625,7 +900,7 @@ class TransferSessionSnapshotView(APIView):
         session = get_object_or_404(Session, pk=session_id)
         local = get_local_mirror()
 
-        if session.mirror != local:
+        if session.mirror_id != local.pk:
             return Response({"detail": "Not owner"}, status=403)
 
         videos = Video.objects.filter(session=session)
@@ -633,9 +908,7 @@ class TransferSessionSnapshotView(APIView):
         return Response(
             {
                 "session": SessionSerializer(session).data,
-                "videos": VideoSerializer(
-                    videos, many=True, context={"request": request}
-                ).data,
+                "videos": serialize_video_list(videos, request),
             }
         )
 
@@ -683,7 +956,7 @@ class TransferSessionCompleteView(APIView):
             },
         )
 
-        if not created and session.mirror != local:
+        if not created and session.mirror_id != local.pk:
             return Response({"detail": "Session owned by another mirror"}, status=403)
 
         updates = []
@@ -706,10 +979,166 @@ class TransferSessionCompleteView(APIView):
         if updates:
             session.save(update_fields=updates)
 
-        return Response(
-            {"detail": "transfer ready", "session_id": session_id},
-            status=201 if created else 200,
+        body = {"detail": "transfer ready", "session_id": session_id}
+
+        # Pull the videos from the source; it deletes its copy only once
+        # we report every checksum back through finalize. The URL comes
+        # from our own peer records, never from the request alone.
+        source = resolve_mirror_by_identity(from_mirror_id)
+        if source is None:
+            source = _announced_source(from_mirror_id, request.data.get("source_base_url"))
+        if source is not None:
+            transfer = TransferRequest.objects.create(
+                session=session,
+                from_mirror=source,
+                to_mirror=local,
+                token=token,
+                expires_at=datetime.fromtimestamp(payload["exp"], tz=dt_timezone.utc),
+            )
+            start_session_pull(transfer, token, peer_base_url(source))
+            body["transfer_id"] = str(transfer.id)
+            body["status_url"] = request.build_absolute_uri(
+                f"{reverse('transfer_status')}?{urlencode({'transfer_id': str(transfer.id)})}"
+            )
+        else:
+            _LOG.warning(
+                "Unknown source mirror %s; videos will not be pulled", from_mirror_id,
+                extra={"session_id": str(session_id)},
+            )
+
+        return Response(body, status=201 if created else 200)
+
+
+def _announced_source(identity, source_url):
+    """
+    Mirror row for a source that discovery has heard but not written yet.
+    The client-supplied `source_url` is accepted only when it is the URL
+    that peer announced; the pending discovery rows are then flushed.
+    """
+    if not source_url:
+        return None
+    announced = discovery_peers.get(identity)
+    if announced is None:
+        _LOG.warning("Ignoring source_base_url for unknown mirror %s", identity)
+        return None
+    hostname, mirror_identity, ip, port, metadata = announced
+    announced_url = peer_base_url(Mirror(hostname=hostname, ip=ip, port=port, metadata=metadata))
+    if source_url.rstrip("/") != announced_url:
+        _LOG.warning(
+            "source_base_url %s does not match the URL announced by %s", source_url, identity,
         )
+        return None
+    discovery_peers.flush()
+    return resolve_mirror_by_identity(identity)
+
+
+# -------------------------------------------
+#  SESSION TRANSFER STATUS (receiver)
+# -------------------------------------------
+class TransferStatusView(APIView):
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        transfer_id = request.query_params.get("transfer_id")
+        session_id = request.query_params.get("session_id")
+        if not transfer_id and not session_id:
+            return Response({"detail": "transfer_id or session_id required"}, status=400)
+
+        local = get_local_mirror()
+        transfers = TransferRequest.objects.filter(to_mirror=local).order_by("-created_at")
+        try:
+            if transfer_id:
+                transfer = transfers.filter(pk=transfer_id).first()
+            else:
+                transfer = transfers.filter(session_id=session_id).first()
+        except ValidationError:
+            return Response({"detail": "Invalid id"}, status=400)
+        if transfer is None:
+            return Response({"detail": "Not found"}, status=404)
+
+        return Response({
+            "transfer_id": str(transfer.id),
+            "session_id": str(transfer.session_id),
+            "status": transfer.status,
+            "completed": transfer.completed,
+            "completed_at": transfer.completed_at,
+            "receipts": transfer.receipts,
+            "logs": transfer.logs,
+        })
+
+
+# -------------------------------------------
+#  SESSION TRANSFER MEDIA (source serves target)
+# -------------------------------------------
+class TransferMediaView(APIView):
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, pk):
+        video, error = _transfer_video(request, pk)
+        if error is not None:
+            return error
+        return _video_file_response(request, video)
+
+
+class TransferMediaManifestView(APIView):
+    """
+    Per-chunk SHA-256 manifest of a video, so the receiver can verify each
+    chunk as it lands and resume an interrupted download from the last
+    good chunk with a Range request.
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, pk):
+        video, error = _transfer_video(request, pk)
+        if error is not None:
+            return error
+        if not video.file:
+            raise Http404("Video has no file")
+
+        try:
+            manifest = build_chunk_manifest(video.file.storage, video.file.name)
+        except FileNotFoundError:
+            raise Http404("Video file missing")
+        return Response({"id": str(video.id), **manifest})
+
+
+def _transfer_video(request, pk):
+    """
+    Resolves a video for a transfer media request, authorised by the
+    transfer token of its session. Returns (video, None) or (None, error).
+    """
+    token = _transfer_token(request)
+    if not token:
+        return None, Response({"detail": "token required"}, status=401)
+
+    try:
+        payload = validate_transfer_token(token, leeway=_transfer_grace())
+    except Exception as e:
+        return None, Response({"detail": f"Invalid token: {str(e)}"}, status=403)
+
+    local = get_local_mirror()
+    local_identity = getattr(settings, "MIRROR_ID", local.hostname)
+    if str(local_identity) != str(payload["from"]):
+        return None, Response({"detail": "Token not for this mirror"}, status=403)
+
+    video = get_object_or_404(
+        Video.objects.only("id", "file", "sha256", "metadata", "created_at"),
+        pk=pk,
+        session_id=payload["sub"],
+        session__mirror=local,
+    )
+    return video, None
+
+
+def _transfer_token(request):
+    auth = request.META.get("HTTP_AUTHORIZATION", "")
+    if auth.startswith("Bearer "):
+        return auth[len("Bearer "):].strip()
+    return request.query_params.get("token")
+
+
+def _transfer_grace():
+    return settings.TRANSFER_TOKEN.get("PULL_GRACE_SECONDS", 0)
 
 
 # -------------------------------------------
@@ -724,7 +1153,7 @@ class TransferSessionFinalizeView(APIView):
             return Response({"detail": "token required"}, status=400)
 
         try:
-            payload = validate_transfer_token(token)
+            payload = validate_transfer_token(token, leeway=_transfer_grace())
         except Exception as e:
             return Response({"detail": f"Invalid token: {str(e)}"}, status=400)
 
@@ -737,20 +1166,39 @@ class TransferSessionFinalizeView(APIView):
         if str(local_identity) != str(from_mirror_id):
             return Response({"detail": "Token not for this mirror"}, status=403)
 
+        session = get_object_or_404(Session, pk=session_id, mirror=local)
+
+        # The receiver must confirm every video by checksum before anything
+        # is deleted here.
+        receipts = request.data.get("receipts")
+        if not isinstance(receipts, dict):
+            return Response({"detail": "receipts required"}, status=400)
+        missing, mismatched = _unconfirmed_videos(session, receipts)
+        if missing or mismatched:
+            return Response(
+                {
+                    "detail": "transfer not confirmed",
+                    "missing": missing,
+                    "mismatched": mismatched,
+                },
+                status=409,
+            )
+
         TransferRequest.objects.filter(
             session__id=session_id,
             from_mirror=local,
         ).filter(
-            Q(to_mirror__metadata__mirror_id=to_mirror_id)
-            | Q(to_mirror__hostname=to_mirror_id)
-            | Q(to_mirror__id=to_mirror_id)
-        ).update(completed=True, completed_at=timezone.now())
-
-        session = get_object_or_404(Session, pk=session_id, mirror=local)
+            mirror_identity_q(to_mirror_id, prefix="to_mirror__")
+        ).update(
+            completed=True,
+            completed_at=timezone.now(),
+            status=TransferRequest.STATUS_DONE,
+            receipts=receipts,
+        )
 
+        # Video files are released by the post_delete receiver once no
+        # other row shares their blob.
         for video in session.videos.all():
-            if video.file:
-                video.file.delete(save=False)
             if video.thumbnail:
                 video.thumbnail.delete(save=False)
         session.delete()
@@ -758,6 +1206,24 @@ class TransferSessionFinalizeView(APIView):
         return Response({"detail": "transfer finalized", "session_id": session_id}, status=200)
 
 
+def _unconfirmed_videos(session, receipts):
+    missing, mismatched = [], []
+    for video in session.videos.only("id", "file", "sha256"):
+        digest = video.sha256
+        if not digest and video.file:
+            # Legacy rows without a stored checksum: hash once and keep it.
+            with video.file.open("rb") as f:
+                digest = compute_sha256(f)
+            Video.objects.filter(pk=video.pk).update(sha256=digest)
+
+        received = receipts.get(str(video.id))
+        if received is None:
+            missing.append(str(video.id))
+        elif received != digest:
+            mismatched.append(str(video.id))
+    return missing, mismatched
+
+
 class VideoDeleteView(APIView):
     permission_classes = [permissions.AllowAny]
 
@@ -780,7 +1246,7 @@ class StartRecordingView(APIView):
         if not session_id:
             return Response({"detail": "session_id required"}, status=400)
 
-        print("🔴 RECORDING STARTED for session:", session_id)
+        _LOG.info("Recording started", extra={"session_id": session_id})
 
         # In real system → trigger native agent
         return Response({"status": "recording_started"})
@@ -790,9 +1256,7 @@ class StartRecordingView(APIView):
 #     permission_classes = [permissions.AllowAny]
 
 #     def post(self, request):
-#         print("DEBUG STOP:", request.FILES, request.data)
-
-#         session_id = request.data.get("session_id")
+# #         session_id = request.data.get("session_id")
 #         file = request.FILES.get("file")  # MUST NOT BE NONE
 
 #         if file is None:
@@ -813,8 +1277,6 @@ class StopRecordingView(APIView):
     permission_classes = [permissions.AllowAny]
 
     def post(self, request):
-        print("DEBUG STOP:", request.FILES, request.data)
-
         session_id = request.data.get("session_id")
         file = request.FILES.get("file")
 
@@ -827,53 +1289,24 @@ class StopRecordingView(APIView):
         session = get_object_or_404(Session, pk=session_id)
 
         # 1️⃣ Save video
-        video = Video.objects.create(
+        video = Video(
             session=session,
-            file=file,
-            size_bytes=file.size
+            size_bytes=file.size,
+            sha256=get_upload_sha256(file),
         )
+        save_video_file(video, file.name, file)
+        video.save()
 
-        duration_seconds = get_video_duration_seconds(video.file.path)
-        if duration_seconds is not None:
-            video.duration_seconds = duration_seconds
-            video.save(update_fields=["duration_seconds"])
-
-        # 2️⃣ Generate thumbnail (best effort)
-        try:
-            video_path = Path(video.file.path)
-
-            thumb_name = f"{uuid.uuid4().hex}.jpg"
-            thumb_rel_path = Path("thumbnails") / thumb_name
-            thumb_abs_path = Path(settings.MEDIA_ROOT) / thumb_rel_path
-
-            thumb_abs_path.parent.mkdir(parents=True, exist_ok=True)
-
-            subprocess.run(
-                [
-                    "ffmpeg",
-                    "-y",
-                    "-i", str(video_path),
-                    "-ss", "00:00:01",
-                    "-vframes", "1",
-                    str(thumb_abs_path),
-                ],
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-                check=True,
-            )
-
-            video.thumbnail = str(thumb_rel_path)
-            video.save(update_fields=["thumbnail"])
-
-        except Exception as e:
-            # ⚠️ Thumbnail failure should NOT block video save
-            print("⚠️ Thumbnail generation failed:", e)
+        # 2️⃣ Duration + thumbnail are filled in by the media worker;
+        # clients poll videos/<id> for processing_status.
+        enqueue_video_jobs(video)
 
         return Response(
             {
                 "status": "saved",
                 "video_id": str(video.id),
                 "thumbnail": video.thumbnail.url if video.thumbnail else None,
+                "processing_status": video.processing_status,
             },
             status=201,
         )
@@ -909,7 +1342,10 @@ class ExportTokenView(APIView):
         if not base_url:
             base_url = f"http://{request.get_host()}"
         export_url = f"{base_url}/api/export?token={token}"
-        print(f"✅ Export token generated for session {session.id} with device_id={session.device_id}")
+        _LOG.info(
+            "Export token generated for device %s", session.device_id,
+            extra={"session_id": str(session.id)},
+        )
 
         return Response({"export_url": export_url}, status=status.HTTP_200_OK)
 
@@ -925,9 +1361,8 @@ class ExportDownloadView(APIView):
 
         try:
             payload = validate_export_token(token)
-            print(f"🔐 Export Download: token validated. session_id={payload['session_id']}, device_id={payload['device_id']}")
         except Exception as e:
-            print(f"❌ Export Download: token validation failed: {e}")
+            _LOG.info("Export token validation failed: %s", e)
             return HttpResponseForbidden("Invalid or expired token")
 
         session = get_object_or_404(Session, pk=payload["session_id"])
@@ -976,15 +1411,23 @@ class ExportDownloadView(APIView):
 
         # 🔒 TOKEN ↔ SESSION
         if session.device_id != payload["device_id"]:
-            print(f"❌ Device mismatch! Session device_id={session.device_id}, Token device_id={payload['device_id']}")
+            _LOG.warning(
+                "Export token device mismatch (session=%s token=%s)",
+                session.device_id, payload["device_id"],
+                extra={"session_id": str(session.id)},
+            )
             return HttpResponseForbidden("Device mismatch")
 
         # 🔒 REQUEST ↔ SESSION
         if session.device_id != device_id:
-            print(f"❌ Request device mismatch! Session device_id={session.device_id}, request device_id={device_id}")
+            _LOG.warning(
+                "Export request device mismatch (session=%s request=%s)",
+                session.device_id, device_id,
+                extra={"session_id": str(session.id)},
+            )
             return HttpResponseForbidden("Device mismatch")
 
-        print(f"✅ Device match confirmed. Proceeding with export for session {session.id}")
+        _LOG.debug("Export device verified", extra={"session_id": str(session.id)})
 
         # 🔒 ONE-TIME USE
         # if session.export_used:
@@ -1004,6 +1447,11 @@ class ExportDownloadView(APIView):
 
         videos = session.videos.all()
 
+        if request.GET.get("download") == "zip":
+            return _session_zip_response(session, videos)
+
+        zip_query = urlencode({"token": token, "device_id": device_id, "download": "zip"})
+
         html = """
         <html>
         <head>
@@ -1017,6 +1465,9 @@ class ExportDownloadView(APIView):
         </head>
         <body>
         <h2>Your Videos</h2>
+        """
+        html += f'<a href="?{escape(zip_query)}" download>Download all (ZIP)</a>'
+        html += """
         <div class="grid">
         """
 
@@ -1025,10 +1476,71 @@ class ExportDownloadView(APIView):
             html += f"""
             <div class="card">
                 <img src="{thumb}" />
-                <a href="{v.file.url}" download>Download</a>
+                <a href="{escape(_video_download_url(v))}" download="{escape(download_name(v))}">Download</a>
             </div>
             """
 
         html += "</div></body></html>"
 
         return HttpResponse(html)
+
+
+def _video_download_url(video):
+    # MEDIA_URL would hand out ciphertext; the stream route decrypts.
+    if video.encrypted:
+        return reverse("video_stream", args=[video.pk])
+    return video.file.url
+
+
+def _session_zip_response(session, videos):
+    """
+    Streams every video of the session as one uncompressed ZIP, generated
+    on the fly. Content-Length is exact because STORE entries have known
+    sizes, so phones can show download progress.
+    """
+    entries = []
+    used_names = set()
+    for video in videos:
+        if not video.file:
+            continue
+        try:
+            size = video.file.size
+        except FileNotFoundError:
+            _LOG.warning("Skipping missing file in export", extra={"video_id": str(video.id)})
+            continue
+
+        name = download_name(video)
+        if name in used_names:
+            name = f"{video.id}_{name}"
+        used_names.add(name)
+
+        entries.append(ZipEntry(
+            name=name,
+            size=size,
+            mtime=timezone.localtime(video.created_at).replace(tzinfo=None),
+            open=partial(video.file.storage.open, video.file.name, "rb"),
+        ))
+
+    chunk_size = getattr(settings, "VIDEO_STREAM_CHUNK_SIZE", 1024 * 1024)
+    response = StreamingHttpResponse(
+        iter_zip(entries, chunk_size=chunk_size),
+        content_type="application/zip",
+    )
+    response["Content-Length"] = str(zip_stream_size(entries))
+    response["Content-Disposition"] = f'attachment; filename="session-{session.id}.zip"'
+    return response
+
+
+# -------------------------------------------
+#  METRICS (Prometheus text format)
+# -------------------------------------------
+class MetricsView(APIView):
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        # Per-process registry: each gunicorn worker reports its own series,
+        # labelled with its pid.
+        return HttpResponse(
+            metrics_registry.render(),
+            content_type="text/plain; version=0.0.4; charset=utf-8",
+        )
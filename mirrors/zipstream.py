@@ -0,0 +1,219 @@
+import struct
+import zlib
+from typing import Callable, NamedTuple
+from datetime import datetime
+
+# Streams an uncompressed (STORE) ZIP archive. Entry sizes are known up
+# front and CRCs travel in data descriptors after each entry, so the total
+# archive length is computable before a single byte is read.
+
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP_FILECOUNT_LIMIT = 0xFFFF
+
+_FLAGS = 0x0808  # bit 3: data descriptor follows, bit 11: UTF-8 names
+_VERSION = 20
+_VERSION_ZIP64 = 45
+_EXTERNAL_ATTR = 0o100644 << 16
+
+
+class ZipEntry(NamedTuple):
+    name: str
+    size: int
+    mtime: datetime
+    open: Callable  # returns a binary file object positioned at 0
+
+
+class _Layout(NamedTuple):
+    entry: ZipEntry
+    name: bytes
+    offset: int
+    zip64: bool
+
+
+def zip_stream_size(entries) -> int:
+    return _plan(entries)[1]
+
+
+def iter_zip(entries, chunk_size=1024 * 1024):
+    """
+    Yields the archive as bytes chunks, reading one entry at a time in
+    `chunk_size` pieces. Memory use is bounded by chunk_size plus the
+    central directory.
+    """
+    layouts, _ = _plan(entries)
+    central = []
+
+    for layout in layouts:
+        entry = layout.entry
+        yield _local_header(layout)
+
+        crc = 0
+        remaining = entry.size
+        with entry.open() as f:
+            while remaining > 0:
+                chunk = f.read(min(chunk_size, remaining))
+                if not chunk:
+                    raise IOError(f"{entry.name} is shorter than its declared size")
+                crc = zlib.crc32(chunk, crc)
+                remaining -= len(chunk)
+                yield chunk
+
+        if layout.zip64:
+            yield struct.pack("<LLQQ", 0x08074B50, crc, entry.size, entry.size)
+        else:
+            yield struct.pack("<LLLL", 0x08074B50, crc, entry.size, entry.size)
+
+        central.append(_central_header(layout, crc))
+
+    cd_offset = _archive_body_size(layouts)
+    cd = b"".join(central)
+    yield cd
+    yield _end_records(len(layouts), len(cd), cd_offset)
+
+
+def _plan(entries):
+    layouts = []
+    offset = 0
+    for entry in entries:
+        name = entry.name.encode("utf-8")
+        zip64 = entry.size >= ZIP64_LIMIT
+        layout = _Layout(entry, name, offset, zip64)
+        layouts.append(layout)
+        offset += _local_size(layout)
+
+    cd_size = sum(_central_size(layout) for layout in layouts)
+    total = offset + cd_size + _end_size(len(layouts), cd_size, offset)
+    return layouts, total
+
+
+def _local_size(layout: _Layout) -> int:
+    header = 30 + len(layout.name) + (20 if layout.zip64 else 0)
+    descriptor = 24 if layout.zip64 else 16
+    return header + layout.entry.size + descriptor
+
+
+def _archive_body_size(layouts) -> int:
+    if not layouts:
+        return 0
+    last = layouts[-1]
+    return last.offset + _local_size(last)
+
+
+def _central_extra(layout: _Layout) -> bytes:
+    fields = []
+    if layout.zip64:
+        fields += [layout.entry.size, layout.entry.size]
+    if layout.offset >= ZIP64_LIMIT:
+        fields.append(layout.offset)
+    if not fields:
+        return b""
+    return struct.pack(f"<HH{len(fields)}Q", 0x0001, 8 * len(fields), *fields)
+
+
+def _central_size(layout: _Layout) -> int:
+    return 46 + len(layout.name) + len(_central_extra(layout))
+
+
+def _needs_zip64_end(count, cd_size, cd_offset) -> bool:
+    return count >= ZIP_FILECOUNT_LIMIT or cd_size >= ZIP64_LIMIT or cd_offset >= ZIP64_LIMIT
+
+
+def _end_size(count, cd_size, cd_offset) -> int:
+    return 22 + (56 + 20 if _needs_zip64_end(count, cd_size, cd_offset) else 0)
+
+
+def _dos_datetime(value: datetime):
+    if value.year < 1980:
+        value = datetime(1980, 1, 1)
+    dos_date = ((value.year - 1980) << 9) | (value.month << 5) | value.day
+    dos_time = (value.hour << 11) | (value.minute << 5) | (value.second // 2)
+    return dos_time, dos_date
+
+
+def _local_header(layout: _Layout) -> bytes:
+    dos_time, dos_date = _dos_datetime(layout.entry.mtime)
+    if layout.zip64:
+        version = _VERSION_ZIP64
+        size_field = ZIP64_LIMIT
+        extra = struct.pack("<HHQQ", 0x0001, 16, 0, 0)
+    else:
+        version = _VERSION
+        size_field = 0
+        extra = b""
+
+    return struct.pack(
+        "<LHHHHHLLLHH",
+        0x04034B50,
+        version,
+        _FLAGS,
+        0,  # STORE
+        dos_time,
+        dos_date,
+        0,  # CRC lives in the data descriptor
+        size_field,
+        size_field,
+        len(layout.name),
+        len(extra),
+    ) + layout.name + extra
+
+
+def _central_header(layout: _Layout, crc: int) -> bytes:
+    dos_time, dos_date = _dos_datetime(layout.entry.mtime)
+    extra = _central_extra(layout)
+    size_field = ZIP64_LIMIT if layout.zip64 else layout.entry.size
+    offset_field = ZIP64_LIMIT if layout.offset >= ZIP64_LIMIT else layout.offset
+    version = _VERSION_ZIP64 if extra else _VERSION
+
+    return struct.pack(
+        "<LHHHHHHLLLHHHHHLL",
+        0x02014B50,
+        (3 << 8) | version,  # made by: UNIX
+        version,
+        _FLAGS,
+        0,
+        dos_time,
+        dos_date,
+        crc,
+        size_field,
+        size_field,
+        len(layout.name),
+        len(extra),
+        0,  # comment length
+        0,  # disk number
+        0,  # internal attributes
+        _EXTERNAL_ATTR,
+        offset_field,
+    ) + layout.name + extra
+
+
+def _end_records(count, cd_size, cd_offset) -> bytes:
+    records = b""
+    if _needs_zip64_end(count, cd_size, cd_offset):
+        zip64_end_offset = cd_offset + cd_size
+        records += struct.pack(
+            "<LQHHLLQQQQ",
+            0x06064B50,
+            44,
+            (3 << 8) | _VERSION_ZIP64,
+            _VERSION_ZIP64,
+            0,
+            0,
+            count,
+            count,
+            cd_size,
+            cd_offset,
+        )
+        records += struct.pack("<LLQL", 0x07064B50, 0, zip64_end_offset, 1)
+
+    records += struct.pack(
+        "<LHHHHLLH",
+        0x06054B50,
+        0,
+        0,
+        min(count, ZIP_FILECOUNT_LIMIT),
+        min(count, ZIP_FILECOUNT_LIMIT),
+        min(cd_size, ZIP64_LIMIT),
+        min(cd_offset, ZIP64_LIMIT),
+        0,
+    )
+    return records
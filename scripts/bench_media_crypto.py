@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+"""
+Throughput of the at-rest media encryption (utils/media_crypto.py).
+
+Usage: python scripts/bench_media_crypto.py [--size-mb 256] [--segment-kb 64 256 1024]
+
+For each segment size, encrypts a random file to disk, decrypts it
+sequentially, and times random 1 MiB range reads (what a seeking video
+player asks for). Run it on the mirror hardware before changing
+MEDIA_ENCRYPTION_SEGMENT_SIZE.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.media_crypto import DecryptingReader, encrypt_chunks, load_key, generate_key  # noqa: E402
+
+CHUNK = 1024 * 1024
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=256)
+    parser.add_argument("--segment-kb", type=int, nargs="+", default=[64, 256, 1024])
+    parser.add_argument("--range-reads", type=int, default=200)
+    args = parser.parse_args()
+
+    key = load_key(generate_key())
+    size = args.size_mb * 1024 * 1024
+    with tempfile.TemporaryDirectory() as tmp:
+        plain_path = os.path.join(tmp, "plain.bin")
+        with open(plain_path, "wb") as f:
+            for _ in range(args.size_mb):
+                f.write(os.urandom(CHUNK))
+
+        print(f"{args.size_mb} MiB file, {args.range_reads} random 1 MiB range reads")
+        print(f"{'segment':>8}  {'encrypt MB/s':>12}  {'decrypt MB/s':>12}  {'range read ms':>13}")
+        for segment_kb in args.segment_kb:
+            segment_size = segment_kb * 1024
+            enc_path = os.path.join(tmp, f"enc-{segment_kb}.bin")
+
+            start = time.perf_counter()
+            with open(plain_path, "rb") as src, open(enc_path, "wb") as out:
+                for piece in encrypt_chunks(key, iter(lambda: src.read(CHUNK), b""), segment_size):
+                    out.write(piece)
+                out.flush()
+                os.fsync(out.fileno())
+            encrypt_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            with DecryptingReader(open(enc_path, "rb"), key) as reader:
+                while reader.read(CHUNK):
+                    pass
+            decrypt_seconds = time.perf_counter() - start
+
+            rng = random.Random(0)
+            start = time.perf_counter()
+            with DecryptingReader(open(enc_path, "rb"), key) as reader:
+                for _ in range(args.range_reads):
+                    reader.seek(rng.randrange(0, size - CHUNK))
+                    reader.read(CHUNK)
+            range_ms = (time.perf_counter() - start) * 1000 / args.range_reads
+
+            mb = size / 1e6
+            print(f"{segment_kb:>6}KB  {mb / encrypt_seconds:>12.1f}  {mb / decrypt_seconds:>12.1f}  {range_ms:>13.2f}")
+            os.remove(enc_path)
+
+
+if __name__ == "__main__":
+    main()
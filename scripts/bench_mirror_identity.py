@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+"""
+Mirror lookup latency by MIRROR_ID with many known peers.
+
+Usage: python scripts/bench_mirror_identity.py [--peers 10000] [--repeat 200]
+
+Seeds --peers Mirror rows, then times resolve_mirror_by_identity for
+identity, hostname, primary key and unknown lookups. "legacy" is the
+lookup before the mirror_identity column: metadata__mirror_id (a
+json_extract over every row on SQLite), then hostname, then pk, one
+query each.
+"""
+import argparse
+import statistics
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+from benchlib import setup_django
+
+
+def legacy_resolve(identity):
+    from django.core.exceptions import ValidationError
+
+    from mirrors.models import Mirror
+
+    mirror = Mirror.objects.filter(metadata__mirror_id=identity).first()
+    if mirror:
+        return mirror
+    mirror = Mirror.objects.filter(hostname=identity).first()
+    if mirror:
+        return mirror
+    try:
+        return Mirror.objects.get(pk=identity)
+    except (Mirror.DoesNotExist, ValidationError):
+        return None
+
+
+def seed(count):
+    from mirrors.models import Mirror
+
+    Mirror.objects.bulk_create(
+        [
+            Mirror(
+                hostname=f"mirror-{i}.local",
+                mirror_identity=f"MIRROR-{i:05d}",
+                ip="10.0.0.1",
+                metadata={"mirror_id": f"MIRROR-{i:05d}"},
+            )
+            for i in range(count)
+        ],
+        batch_size=1000,
+    )
+
+
+def median_ms(resolve, identities, repeat):
+    samples = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        resolve(identities[i % len(identities)])
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--peers", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_django(Path(tmp))
+
+        from mirrors.models import Mirror
+        from mirrors.views import resolve_mirror_by_identity
+
+        seed(args.peers)
+        sample = list(Mirror.objects.order_by("?")[:50])
+        cases = {
+            "identity": [m.mirror_identity for m in sample],
+            "hostname": [m.hostname for m in sample],
+            "pk": [str(m.pk) for m in sample],
+            "unknown": [str(uuid.uuid4()) for _ in sample],
+        }
+
+        print(f"{args.peers} peers, median of {args.repeat} lookups")
+        print(f"{'lookup':>9}  {'legacy ms':>10}  {'current ms':>10}  {'speedup':>7}")
+        for name, identities in cases.items():
+            legacy = median_ms(legacy_resolve, identities, args.repeat)
+            current = median_ms(resolve_mirror_by_identity, identities, args.repeat)
+            print(f"{name:>9}  {legacy:>10.2f}  {current:>10.2f}  {legacy / current:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
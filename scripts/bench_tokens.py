@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""
+Transfer token sign/verify throughput (mirrors/tokens.py).
+
+Usage: python scripts/bench_tokens.py [--seconds 2]
+
+The first table compares "reparse", which re-reads the PEM files and lets
+PyJWT parse them on every call (what generate/validate_transfer_token did
+before the key manager), with "cached", which goes through the key
+manager. The second compares RS256 with EdDSA (Ed25519) through the key
+manager; run it on the mirror hardware before choosing TRANSFER_ALG.
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+
+from benchlib import setup_django
+
+
+def write_keypair(directory: Path, private_key, prefix=""):
+    (directory / f"{prefix}private.pem").write_bytes(private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption(),
+    ))
+    (directory / f"{prefix}public.pem").write_bytes(private_key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo,
+    ))
+
+
+def rate(fn, seconds):
+    count, start = 0, time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        fn()
+        count += 1
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=2.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        keys = Path(tmp) / "keys"
+        keys.mkdir()
+        write_keypair(keys, rsa.generate_private_key(public_exponent=65537, key_size=2048))
+        write_keypair(keys, ed25519.Ed25519PrivateKey.generate(), prefix="ed25519_")
+        setup_django(
+            tmp,
+            TRANSFER_PRIVATE_KEY_PATH=keys / "private.pem",
+            TRANSFER_PUBLIC_KEY_PATH=keys / "public.pem",
+            TRANSFER_KEYS_DIR=keys,
+            TRANSFER_ALG="RS256",
+        )
+
+        import jwt
+
+        from mirrors import tokens
+        from mirrors.tokens import TRANSFER_CONF, generate_transfer_token, validate_transfer_token
+
+        payload = {"sub": "s", "from": "a", "to": "b", "purpose": "session_transfer"}
+
+        def reparse_sign():
+            pem = Path(TRANSFER_CONF["PRIVATE_KEY_PATH"]).read_bytes()
+            return jwt.encode(payload, pem, algorithm="RS256")
+
+        token_plain = reparse_sign()
+
+        def reparse_verify():
+            pem = Path(TRANSFER_CONF["PUBLIC_KEY_PATH"]).read_bytes()
+            return jwt.decode(token_plain, pem, algorithms=["RS256"])
+
+        token = generate_transfer_token("s", "a", "b", exp_seconds=3600)
+
+        print(f"{'mode':>8}  {'sign/s':>9}  {'verify/s':>9}")
+        for mode, sign, verify in (
+            ("reparse", reparse_sign, reparse_verify),
+            ("cached", lambda: generate_transfer_token("s", "a", "b"), lambda: validate_transfer_token(token)),
+        ):
+            print(f"{mode:>8}  {rate(sign, args.seconds):>9.0f}  {rate(verify, args.seconds):>9.0f}")
+
+        print()
+        print(f"{'alg':>8}  {'sign us':>9}  {'verify us':>9}  {'token bytes':>11}")
+        for alg, prefix in (("RS256", ""), ("EdDSA", "ed25519_")):
+            TRANSFER_CONF["PRIVATE_KEY_PATH"] = str(keys / f"{prefix}private.pem")
+            TRANSFER_CONF["PUBLIC_KEY_PATH"] = str(keys / f"{prefix}public.pem")
+            TRANSFER_CONF["ALGORITHM"] = alg
+            tokens._key_manager = tokens.TransferKeyManager()
+            token = generate_transfer_token("s", "a", "b", exp_seconds=3600)
+            sign_rate = rate(lambda: generate_transfer_token("s", "a", "b"), args.seconds)
+            verify_rate = rate(lambda: validate_transfer_token(token), args.seconds)
+            print(f"{alg:>8}  {1e6 / sign_rate:>9.1f}  {1e6 / verify_rate:>9.1f}  {len(token):>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+"""
+Peak RSS and wall time of a videos/upload request.
+
+Usage: python scripts/bench_upload.py [--size-mb 50 500] [--mode hashing baseline]
+
+"hashing" is the current path: the upload handlers hash the bytes as they
+stream in. "baseline" uses Django's stock handlers and then checksums the
+stored file with a single read(), which is what VideoUploadView did
+before. Each run happens in a fresh process so ru_maxrss is per request.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import uuid
+from pathlib import Path
+
+from benchlib import peak_rss_mb, setup_django, timed
+
+CHUNK = 1024 * 1024
+BOUNDARY = "benchboundary"
+
+
+def write_body(path, size_mb, session_id):
+    with open(path, "wb") as f:
+        f.write(
+            f"--{BOUNDARY}\r\n"
+            f'Content-Disposition: form-data; name="session_id"\r\n\r\n{session_id}\r\n'
+            f"--{BOUNDARY}\r\n"
+            f'Content-Disposition: form-data; name="file"; filename="bench.mp4"\r\n'
+            f"Content-Type: video/mp4\r\n\r\n".encode()
+        )
+        for _ in range(size_mb):
+            f.write(os.urandom(CHUNK))
+        f.write(f"\r\n--{BOUNDARY}--\r\n".encode())
+
+
+def run_one(workdir, body_path, session_id, mode):
+    setup_django(workdir)
+
+    import hashlib
+
+    from django.conf import settings
+    from django.core.handlers.wsgi import WSGIHandler
+
+    from mirrors.models import Session, Video
+    from mirrors.views import get_local_mirror
+
+    Session.objects.create(id=session_id, mirror=get_local_mirror())
+    if mode == "baseline":
+        settings.FILE_UPLOAD_HANDLERS = [
+            "django.core.files.uploadhandler.MemoryFileUploadHandler",
+            "django.core.files.uploadhandler.TemporaryFileUploadHandler",
+        ]
+
+    rss_before = peak_rss_mb()
+    results = {}
+    with timed(results, "seconds"), open(body_path, "rb") as body:
+        environ = {
+            "REQUEST_METHOD": "POST",
+            "PATH_INFO": "/api/videos/upload",
+            "SERVER_NAME": "localhost",
+            "SERVER_PORT": "8000",
+            "wsgi.url_scheme": "http",
+            "wsgi.input": body,
+            "CONTENT_TYPE": f"multipart/form-data; boundary={BOUNDARY}",
+            "CONTENT_LENGTH": str(os.path.getsize(body_path)),
+        }
+        response = WSGIHandler()(environ, lambda status, headers: None)
+        b"".join(response)
+        if mode == "baseline":
+            video = Video.objects.get()
+            with video.file.open("rb") as f:
+                Video.objects.filter(pk=video.pk).update(sha256=hashlib.sha256(f.read()).hexdigest())
+
+    results["rss_delta_mb"] = peak_rss_mb() - rss_before
+    results["peak_rss_mb"] = peak_rss_mb()
+    print(json.dumps(results))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, nargs="+", default=[50, 500])
+    parser.add_argument("--mode", nargs="+", default=["hashing", "baseline"], choices=["hashing", "baseline"])
+    parser.add_argument("--child", nargs=4, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        workdir, body_path, session_id, mode = args.child
+        run_one(workdir, body_path, session_id, mode)
+        return
+
+    print(f"{'size':>7}  {'mode':>8}  {'wall s':>7}  {'peak RSS MB':>11}  {'RSS growth MB':>13}")
+    for size_mb in args.size_mb:
+        with tempfile.TemporaryDirectory() as tmp:
+            session_id = str(uuid.uuid4())
+            body_path = Path(tmp) / "body.bin"
+            write_body(body_path, size_mb, session_id)
+            for mode in args.mode:
+                workdir = Path(tmp) / mode
+                out = subprocess.run(
+                    [sys.executable, __file__, "--child", str(workdir), str(body_path), session_id, mode],
+                    check=True, capture_output=True, text=True,
+                ).stdout
+                result = json.loads(out.strip().splitlines()[-1])
+                print(
+                    f"{size_mb:>5}MB  {mode:>8}  {result['seconds']:>7.2f}  "
+                    f"{result['peak_rss_mb']:>11.1f}  {result['rss_delta_mb']:>13.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+"""
+videos/list latency against the number of videos missing a duration.
+
+Usage: python scripts/bench_video_list.py [--videos 5000] [--missing 0 0.1] [--repeat 20]
+
+Seeds a throwaway database with --videos rows, a --missing fraction of
+them without duration_seconds, then times the first page (limit=100), a
+full cursor walk at limit=500, and one metadata sweep. Every subprocess
+started during the list calls is counted: it must stay 0, and latency
+must not move with the missing fraction.
+"""
+import argparse
+import statistics
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+from benchlib import setup_django
+
+
+def seed(count, missing):
+    from mirrors.models import Session, Video
+    from mirrors.views import get_local_mirror
+
+    session = Session.objects.create(mirror=get_local_mirror())
+    every = round(1 / missing) if missing else 0
+    Video.objects.bulk_create(
+        [
+            Video(
+                session=session,
+                file=f"videos/2026/01/01/clip{i}.mp4",
+                size_bytes=1_000_000 + i,
+                sha256=f"{i:064x}",
+                duration_seconds=None if every and i % every == 0 else 30.0,
+                encrypted=False,
+            )
+            for i in range(count)
+        ],
+        batch_size=1000,
+    )
+
+
+def walk(client, limit):
+    url, pages = f"/api/videos/list?limit={limit}", 0
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200, response.status_code
+        pages += 1
+        cursor = response.get("X-Next-Cursor")
+        url = f"/api/videos/list?limit={limit}&cursor={cursor}" if cursor else None
+    return pages
+
+
+def run(workdir, videos, missing, repeat):
+    from django.test import Client
+
+    from mirrors.models import MediaJob, Video
+    from mirrors.reconciler import reconcile_missing_durations
+
+    Video.objects.all().delete()
+    MediaJob.objects.all().delete()
+    seed(videos, missing)
+    client = Client()
+
+    spawned = []
+    real_popen = subprocess.Popen
+
+    def counting_popen(*args, **kwargs):
+        spawned.append(args)
+        return real_popen(*args, **kwargs)
+
+    with mock.patch("subprocess.Popen", counting_popen):
+        first_page = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            assert client.get("/api/videos/list").status_code == 200
+            first_page.append(time.perf_counter() - start)
+
+        full_walk = []
+        for _ in range(max(repeat // 4, 1)):
+            start = time.perf_counter()
+            pages = walk(client, 500)
+            full_walk.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        queued = reconcile_missing_durations()
+        sweep = time.perf_counter() - start
+
+    missing_count = Video.objects.filter(duration_seconds__isnull=True).count()
+    print(
+        f"{missing_count:>8}  {statistics.median(first_page) * 1000:>11.1f}  "
+        f"{statistics.median(full_walk) * 1000:>11.1f} ({pages:>2} pages)  "
+        f"{len(spawned):>11}  {queued:>6} in {sweep * 1000:.0f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--videos", type=int, default=5000)
+    parser.add_argument("--missing", type=float, nargs="+", default=[0.0, 0.1])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_django(Path(tmp))
+        print(f"{args.videos} videos")
+        print(f"{'missing':>8}  {'page 1 ms':>11}  {'full walk ms':>21}  {'subprocesses':>11}  sweep")
+        for missing in args.missing:
+            run(Path(tmp), args.videos, missing, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
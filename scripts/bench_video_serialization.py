@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""
+Video list serialization: VideoSerializer(many=True) against the
+serialize_video_list fast path (mirrors/serializers.py).
+
+Usage: python scripts/bench_video_serialization.py [--videos 10000] [--repeat 3]
+
+Both paths serialize the same queryset for the same request; the script
+checks their output is identical before reporting timings.
+"""
+import argparse
+import statistics
+import tempfile
+import time
+
+from benchlib import setup_django
+
+
+def seed(count):
+    from mirrors.models import Session, Video
+    from mirrors.views import get_local_mirror
+
+    session = Session.objects.create(mirror=get_local_mirror())
+    Video.objects.bulk_create(
+        [
+            Video(
+                session=session,
+                file=f"blobs/{i % 256:02x}/00/{i:064x}.mp4",
+                thumbnail=f"thumbnails/{i:032x}.jpg" if i % 10 else "",
+                metadata={"thumbnails": {"detail": f"thumbnails/{i:032x}_detail.jpg"}} if i % 10 else {},
+                size_bytes=1_000_000 + i,
+                duration_seconds=30.0,
+                sha256=f"{i:064x}",
+            )
+            for i in range(count)
+        ],
+        batch_size=1000,
+    )
+
+
+def best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return min(times), statistics.median(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--videos", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_django(tmp, PUBLIC_BASE_URL="http://mirror.local:8000")
+
+        from django.test import RequestFactory
+        from rest_framework.request import Request
+
+        from mirrors.models import Video
+        from mirrors.serializers import VideoSerializer, serialize_video_list
+
+        seed(args.videos)
+        request = Request(RequestFactory().get("/api/videos/list", HTTP_HOST="mirror.local:8000"))
+        queryset = Video.objects.order_by("-created_at", "-id")
+
+        slow_best, slow_median, slow = best_of(
+            lambda: VideoSerializer(queryset, many=True, context={"request": request}).data, args.repeat
+        )
+        fast_best, fast_median, fast = best_of(lambda: serialize_video_list(queryset, request), args.repeat)
+        assert [dict(row) for row in slow] == fast, "fast path output differs from VideoSerializer"
+
+        print(f"{args.videos} videos, best/median of {args.repeat}")
+        print(f"{'path':>22}  {'best ms':>8}  {'median ms':>9}  {'rows/s':>9}")
+        for name, best, median in (
+            ("VideoSerializer", slow_best, slow_median),
+            ("serialize_video_list", fast_best, fast_median),
+        ):
+            print(f"{name:>22}  {best * 1000:>8.0f}  {median * 1000:>9.0f}  {args.videos / best:>9.0f}")
+        print(f"speedup {slow_best / fast_best:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Shared setup for the scripts/bench_*.py benchmarks.
+
+setup_django() points the project at a throwaway SQLite database and
+MEDIA_ROOT under `workdir`, keeps background services off, and applies
+the migrations, so a benchmark never touches db/ or media/. Keyword
+arguments are extra environment variables (settings) and win over these.
+"""
+import os
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+def setup_django(workdir, migrate=True, **env):
+    workdir = Path(workdir)
+    (workdir / "media").mkdir(parents=True, exist_ok=True)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir / 'bench.db'}"
+    os.environ["MEDIA_ROOT"] = str(workdir / "media")
+    os.environ["TRANSFER_PARTIAL_DIR"] = str(workdir / "partial")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("DEBUG", "0")
+    for name in ("MEDIA_WORKER_ENABLED", "METADATA_SWEEP_ENABLED", "DISCOVERY_ENABLED"):
+        os.environ[name] = "0"
+    os.environ.update({name: str(value) for name, value in env.items()})
+
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    if migrate:
+        call_command("migrate", verbosity=0)
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+@contextmanager
+def timed(results: dict, key: str):
+    start = time.perf_counter()
+    yield
+    results[key] = time.perf_counter() - start
@@ -1,8 +1,12 @@
 #!/usr/bin/env bash
 set -e
 
+# Usage: scripts/generate_keypair.sh [rsa|ed25519]
+# Use ed25519 together with TRANSFER_ALG=EdDSA.
+KEY_TYPE="${1:-rsa}"
+
 echo "---------------------------------------"
-echo " Smart Mirror - RSA Key Generator"
+echo " Smart Mirror - Transfer Key Generator ($KEY_TYPE)"
 echo "---------------------------------------"
 
 # Create keys directory if missing
@@ -15,16 +19,31 @@ if [ -f private.pem ]; then
   exit 1
 fi
 
-echo "🔑 Generating RSA private key..."
-openssl genrsa -out private.pem 2048
-chmod 600 private.pem
+case "$KEY_TYPE" in
+  rsa)
+    echo "🔑 Generating RSA private key..."
+    openssl genrsa -out private.pem 2048
+    chmod 600 private.pem
+
+    echo "🔐 Generating RSA public key..."
+    openssl rsa -in private.pem -pubout -out public.pem
+    ;;
+  ed25519)
+    echo "🔑 Generating Ed25519 private key..."
+    openssl genpkey -algorithm ed25519 -out private.pem
+    chmod 600 private.pem
 
-echo "🔐 Generating RSA public key..."
-openssl rsa -in private.pem -pubout -out public.pem
+    echo "🔐 Generating Ed25519 public key..."
+    openssl pkey -in private.pem -pubout -out public.pem
+    ;;
+  *)
+    echo "❌ Unknown key type: $KEY_TYPE (expected rsa or ed25519)"
+    exit 1
+    ;;
+esac
 
 echo "---------------------------------------"
 echo "✔ Keypair generated"
 echo "  - keys/private.pem"
 echo "  - keys/public.pem"
 echo "---------------------------------------"
-
@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+"""
+Concurrent-writer stress test for the SQLite setup (utils/db.py).
+
+Usage: python scripts/stress_sqlite.py [--processes 3] [--seconds 10] [--baseline]
+
+Starts --processes worker processes (like the gunicorn workers) against
+one throwaway database. Each runs, in parallel threads, the traffic the
+mirror sees: discovery flushing a table of peers, video uploads (file,
+Video row and media jobs), QR session creation and QR status polls.
+Discovery flushes every 0.2 s (25x the default rate); the other roles
+loop as fast as they can. Every failed operation is counted; the exit
+status is 1 if any failed, and "database is locked" errors are reported
+separately.
+
+--baseline runs the same load with the pre-tuning setup (no pragmas, so
+a rollback journal and sqlite3's 5 s timeout, and deferred transactions)
+for comparison.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from collections import Counter
+from pathlib import Path
+
+from benchlib import setup_django
+
+# Empty values skip the pragmas (see utils.db.configure_sqlite).
+BASELINE_ENV = {
+    name: ""
+    for name in (
+        "SQLITE_JOURNAL_MODE", "SQLITE_SYNCHRONOUS", "SQLITE_BUSY_TIMEOUT_MS",
+        "SQLITE_MMAP_SIZE", "SQLITE_CACHE_SIZE", "SQLITE_TEMP_STORE",
+    )
+}
+
+
+def database_url(workdir, baseline):
+    url = f"sqlite:///{Path(workdir) / 'bench.db'}"
+    return f"{url}?transaction_mode=DEFERRED" if baseline else url
+
+
+def discovery_writer(index, stop, counts):
+    from mirrors.discovery import PeerTable
+
+    table = PeerTable(last_seen_tolerance=0)
+    round_ = 0
+    while not stop.is_set():
+        for peer in range(20):
+            table.record(
+                {
+                    "mirror_id": f"peer-{index}-{peer}",
+                    "hostname": f"peer-{index}-{peer}",
+                    "ip": "10.0.0.1",
+                    "port": 8000,
+                    "metadata": {"round": round_},
+                },
+                "10.0.0.1",
+            )
+        table.flush()
+        counts["discovery flush"] += 1
+        round_ += 1
+        # 25x the default DISCOVERY_FLUSH_INTERVAL_SECONDS.
+        time.sleep(0.2)
+
+
+def uploader(session_id, stop, counts):
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from django.test import Client
+
+    client = Client()
+    n = 0
+    while not stop.is_set():
+        data = os.urandom(32 * 1024)
+        response = client.post(
+            "/api/videos/upload",
+            {"session_id": session_id, "file": SimpleUploadedFile(f"clip{n}.mp4", data, "video/mp4")},
+        )
+        if response.status_code != 201:
+            raise RuntimeError(f"upload returned {response.status_code}: {response.content[:200]!r}")
+        counts["upload"] += 1
+        n += 1
+
+
+def qr_creator(stop, counts):
+    from django.test import Client
+
+    client = Client()
+    while not stop.is_set():
+        response = client.post("/api/session/qr/create")
+        if response.status_code != 201:
+            raise RuntimeError(f"qr/create returned {response.status_code}")
+        counts["qr create"] += 1
+        time.sleep(0.05)
+
+
+def status_poller(stop, counts):
+    from django.test import Client
+
+    client = Client()
+    while not stop.is_set():
+        response = client.get("/api/session/qr/status")
+        if response.status_code != 200:
+            raise RuntimeError(f"qr/status returned {response.status_code}")
+        counts["status poll"] += 1
+
+
+def run_worker(workdir, index, seconds, session_id, baseline):
+    env = BASELINE_ENV if baseline else {}
+    setup_django(workdir, migrate=False, DATABASE_URL=database_url(workdir, baseline), **env)
+
+    from django.db import connection
+
+    counts = Counter()
+    errors = Counter()
+    stop = threading.Event()
+
+    def guarded(target, *args):
+        while not stop.is_set():
+            try:
+                target(*args, stop, counts)
+            except Exception as exc:
+                locked = "locked" in str(exc) or "busy" in str(exc)
+                errors["database is locked" if locked else type(exc).__name__] += 1
+                if not locked:
+                    traceback.print_exc(file=sys.stderr)
+            finally:
+                connection.close()
+
+    roles = [
+        (discovery_writer, index),
+        (uploader, session_id),
+        (uploader, session_id),
+        (qr_creator,),
+        (status_poller,),
+        (status_poller,),
+    ]
+    threads = [threading.Thread(target=guarded, args=role) for role in roles]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    print("RESULT " + json.dumps({"counts": counts, "errors": errors}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--processes", type=int, default=3)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--baseline", action="store_true")
+    parser.add_argument("--worker", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        workdir, index, session_id = args.worker
+        run_worker(workdir, int(index), args.seconds, session_id, args.baseline)
+        return 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = BASELINE_ENV if args.baseline else {}
+        setup_django(tmp, DATABASE_URL=database_url(tmp, args.baseline), **env)
+
+        from mirrors.models import Session
+        from mirrors.views import get_local_mirror
+
+        session_id = str(Session.objects.create(mirror=get_local_mirror()).pk)
+
+        command = [sys.executable, __file__, "--seconds", str(args.seconds)]
+        if args.baseline:
+            command.append("--baseline")
+        workers = [
+            subprocess.Popen(command + ["--worker", tmp, str(i), session_id], stdout=subprocess.PIPE, text=True)
+            for i in range(args.processes)
+        ]
+        counts, errors = Counter(), Counter()
+        for worker in workers:
+            out, _ = worker.communicate()
+            # Log records share stdout; the summary is the RESULT line.
+            line = next(line for line in out.splitlines() if line.startswith("RESULT "))
+            result = json.loads(line[len("RESULT "):])
+            counts.update(result["counts"])
+            errors.update(result["errors"])
+
+    mode = "baseline (no pragmas, deferred transactions)" if args.baseline else "WAL + tuned pragmas"
+    print(f"{mode}: {args.processes} processes x {args.seconds:g}s")
+    for name, count in sorted(counts.items()):
+        print(f"  {name:>16}: {count:>6} ok ({count / args.seconds:.0f}/s)")
+    for name, count in sorted(errors.items()):
+        print(f"  {name:>16}: {count:>6} FAILED")
+    if not errors:
+        print("  no errors")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+import atexit
+import copy
+import json
+import logging
+import queue
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Attributes every LogRecord has; anything else came in through `extra=`.
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message",
+    "asctime",
+}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line. Context passed via `extra=` (session_id,
+    mirror_id, video_id, ...) is emitted as top-level keys.
+    """
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        if record.stack_info:
+            entry["stack_info"] = self.formatStack(record.stack_info)
+
+        return json.dumps(entry, default=str)
+
+
+class AsyncStreamHandler(QueueHandler):
+    """
+    Non-blocking console handler: request threads only enqueue records, and a
+    QueueListener thread does the formatting and the stdout write.
+
+    The formatter set by dictConfig is forwarded to the listener's stream
+    handler, so JSON encoding also happens off the request path.
+    """
+
+    def __init__(self, stream=None):
+        log_queue = queue.SimpleQueue()
+        super().__init__(log_queue)
+        self._target = logging.StreamHandler(stream or sys.stdout)
+        self.listener = QueueListener(log_queue, self._target)
+        self.listener.start()
+        atexit.register(self.listener.stop)
+
+    def setFormatter(self, fmt):
+        self._target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Merge args now (records reaching a handler are enabled, so this is
+        # the only formatting cost paid on the calling thread) but keep the
+        # record structured for the listener-side formatter.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
@@ -0,0 +1,193 @@
+import base64
+import io
+import os
+import struct
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+# Segmented AES-GCM for media at rest.
+#
+#   header  = MAGIC | version | segment_size (u32) | nonce_prefix (7 bytes)
+#   segment = AES-GCM(plaintext[i*S:(i+1)*S]) including its 16-byte tag
+#
+# Segment i is sealed with nonce = nonce_prefix | i (u32) | final flag and
+# the header as associated data, so segments cannot be reordered, dropped
+# or cut off at a segment boundary without failing authentication. Each
+# segment decrypts on its own, which is what makes seeking cheap.
+
+MAGIC = b"SMAE"
+VERSION = 1
+TAG_SIZE = 16
+DEFAULT_SEGMENT_SIZE = 64 * 1024
+
+_HEADER = struct.Struct(">4sBI7s")
+HEADER_SIZE = _HEADER.size
+_NONCE_PREFIX_SIZE = 7
+_MAX_SEGMENTS = 2 ** 32
+_MAX_SEGMENT_SIZE = 16 * 1024 * 1024
+
+
+class MediaCryptoError(Exception):
+    pass
+
+
+def load_key(value) -> bytes | None:
+    """
+    Parses MEDIA_ENCRYPTION_KEY: base64 (standard or URL-safe) or hex of a
+    16, 24 or 32 byte AES key. Empty means encryption is off.
+    """
+    if not value:
+        return None
+    if isinstance(value, bytes):
+        key = value
+    else:
+        value = value.strip()
+        try:
+            if len(value) in (32, 48, 64):
+                key = bytes.fromhex(value)
+            else:
+                padded = value + "=" * (-len(value) % 4)
+                key = base64.b64decode(padded.replace("-", "+").replace("_", "/"), validate=True)
+        except ValueError as exc:
+            raise MediaCryptoError("MEDIA_ENCRYPTION_KEY is neither hex nor base64") from exc
+    if len(key) not in (16, 24, 32):
+        raise MediaCryptoError("MEDIA_ENCRYPTION_KEY must be 16, 24 or 32 bytes")
+    return key
+
+
+def generate_key() -> str:
+    return base64.urlsafe_b64encode(AESGCM.generate_key(bit_length=256)).decode("ascii")
+
+
+def has_header(prefix: bytes) -> bool:
+    return len(prefix) >= HEADER_SIZE and prefix[:4] == MAGIC and prefix[4] == VERSION
+
+
+def plaintext_size(ciphertext_size: int, segment_size: int) -> int:
+    body = ciphertext_size - HEADER_SIZE
+    if body < TAG_SIZE:
+        raise MediaCryptoError("encrypted file is truncated")
+    segments = -(-body // (segment_size + TAG_SIZE))
+    return body - segments * TAG_SIZE
+
+
+def encrypt_chunks(key: bytes, chunks, segment_size: int = DEFAULT_SEGMENT_SIZE):
+    """
+    Yields the encrypted file for an iterable of plaintext chunks. Holds at
+    most one segment plus one input chunk in memory.
+    """
+    aead = AESGCM(key)
+    header = _HEADER.pack(MAGIC, VERSION, segment_size, os.urandom(_NONCE_PREFIX_SIZE))
+    prefix = header[-_NONCE_PREFIX_SIZE:]
+    yield header
+
+    index = 0
+    pending = bytearray()
+    for chunk in chunks:
+        pending += chunk
+        # Keep back at least one byte: the last segment must be sealed as
+        # final, and we only know which one that is at the end.
+        start = 0
+        with memoryview(pending) as view:
+            while len(pending) - start > segment_size:
+                yield aead.encrypt(_nonce(prefix, index, False), view[start:start + segment_size], header)
+                start += segment_size
+                index += 1
+                if index >= _MAX_SEGMENTS:
+                    raise MediaCryptoError("file too large for this segment size")
+        del pending[:start]
+    yield aead.encrypt(_nonce(prefix, index, True), bytes(pending), header)
+
+
+class DecryptingReader(io.RawIOBase):
+    """
+    Seekable plaintext view of an encrypted file. Only the segments a read
+    touches are decrypted; the most recent one is kept for sequential
+    reads. Deliberately has no fileno(), so servers cannot sendfile() the
+    ciphertext.
+    """
+
+    def __init__(self, raw, key: bytes, name=None):
+        super().__init__()
+        self._raw = raw
+        self.name = name
+        header = raw.read(HEADER_SIZE)
+        if not has_header(header):
+            raise MediaCryptoError("not an encrypted media file")
+        _, _, self._segment_size, prefix = _HEADER.unpack(header)
+        if not 0 < self._segment_size <= _MAX_SEGMENT_SIZE:
+            raise MediaCryptoError("invalid segment size in header")
+        self._header = header
+        self._prefix = prefix
+        self._aead = AESGCM(key)
+
+        raw.seek(0, io.SEEK_END)
+        ciphertext_size = raw.tell()
+        self.size = plaintext_size(ciphertext_size, self._segment_size)
+        self._last_index = max(-(-(ciphertext_size - HEADER_SIZE) // (self._segment_size + TAG_SIZE)) - 1, 0)
+        self._pos = 0
+        self._cached_index = None
+        self._cached = b""
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.size + offset
+        else:
+            raise ValueError(f"invalid whence ({whence})")
+        if pos < 0:
+            raise ValueError("negative seek position")
+        self._pos = pos
+        return pos
+
+    def readinto(self, buffer):
+        view = memoryview(buffer).cast("B")
+        written = 0
+        while written < len(view) and self._pos < self.size:
+            index, offset = divmod(self._pos, self._segment_size)
+            segment = self._segment(index)
+            n = min(len(segment) - offset, len(view) - written)
+            view[written:written + n] = segment[offset:offset + n]
+            written += n
+            self._pos += n
+        return written
+
+    def readall(self):
+        return self.read(max(self.size - self._pos, 0))
+
+    def close(self):
+        if not self.closed:
+            self._raw.close()
+        super().close()
+
+    def _segment(self, index: int) -> bytes:
+        if index == self._cached_index:
+            return self._cached
+        stride = self._segment_size + TAG_SIZE
+        self._raw.seek(HEADER_SIZE + index * stride)
+        sealed = self._raw.read(stride)
+        final = index == self._last_index
+        try:
+            plaintext = self._aead.decrypt(_nonce(self._prefix, index, final), sealed, self._header)
+        except InvalidTag as exc:
+            raise MediaCryptoError(f"segment {index} failed authentication") from exc
+        self._cached_index = index
+        self._cached = plaintext
+        return plaintext
+
+
+def _nonce(prefix: bytes, index: int, final: bool) -> bytes:
+    return prefix + struct.pack(">IB", index, 1 if final else 0)
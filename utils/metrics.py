@@ -0,0 +1,149 @@
+import os
+import threading
+from bisect import bisect_left
+
+# Fixed bucket layouts; observing is a bisect plus two additions under a lock.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+METRICS = {
+    "mirror_http_requests_total": ("counter", "HTTP requests by view, method and status."),
+    "mirror_http_request_duration_seconds": ("histogram", "View latency in seconds."),
+    "mirror_http_request_queries": ("histogram", "SQL queries executed per request."),
+    "mirror_http_request_bytes_total": ("counter", "Request/response body bytes by direction."),
+    "mirror_http_request_subprocess_seconds_total": ("counter", "Time spent in ffmpeg/ffprobe inside requests."),
+    "mirror_subprocess_duration_seconds": ("histogram", "Media tool (ffmpeg/ffprobe) run time in seconds."),
+}
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    In-memory, per-process metrics store rendered in the Prometheus text
+    exposition format. Label sets are tuples of (name, value) pairs.
+
+    Every gunicorn worker keeps its own registry and a scrape reaches one
+    of them, so each sample carries a `pid` label: series from different
+    workers never mix, and dashboards aggregate with sum without (pid).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def inc(self, name, value=1, labels=()):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, labels=(), buckets=LATENCY_BUCKETS):
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def render(self) -> str:
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {
+                key: (h.buckets, list(h.counts), h.sum, h.count)
+                for key, h in self._histograms.items()
+            }
+
+        process = (("pid", str(os.getpid())),)
+        lines = []
+        for name, (kind, help_text) in METRICS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "counter":
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f"{name}{_format_labels(process + labels)} {_format_value(value)}")
+                continue
+
+            for (metric, labels), (buckets, counts, total, count) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                labels = process + labels
+                cumulative = 0
+                for bound, bucket_count in zip(buckets, counts):
+                    cumulative += bucket_count
+                    bucket_labels = labels + (("le", _format_value(bound)),)
+                    lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+                inf_labels = labels + (("le", "+Inf"),)
+                lines.append(f"{name}_bucket{_format_labels(inf_labels)} {count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+                lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+_request_state = threading.local()
+
+
+def begin_request() -> None:
+    _request_state.subprocess_seconds = 0.0
+
+
+def end_request() -> float:
+    seconds = getattr(_request_state, "subprocess_seconds", 0.0)
+    _request_state.subprocess_seconds = None
+    return seconds or 0.0
+
+
+def record_subprocess(command: str, seconds: float) -> None:
+    """
+    Records a media tool run. Inside a request the time is also charged to
+    that request's view by the metrics middleware.
+    """
+    registry.observe("mirror_subprocess_duration_seconds", seconds, (("command", command),))
+    if getattr(_request_state, "subprocess_seconds", None) is not None:
+        _request_state.subprocess_seconds += seconds
+
+
+def record_request(view, method, status, seconds, queries, bytes_in, bytes_out, subprocess_seconds):
+    labels = (("view", view), ("method", method))
+    registry.inc("mirror_http_requests_total", 1, labels + (("status", str(status)),))
+    registry.observe("mirror_http_request_duration_seconds", seconds, labels)
+    registry.observe("mirror_http_request_queries", queries, labels, buckets=QUERY_BUCKETS)
+    if bytes_in:
+        registry.inc("mirror_http_request_bytes_total", bytes_in, labels + (("direction", "in"),))
+    if bytes_out:
+        registry.inc("mirror_http_request_bytes_total", bytes_out, labels + (("direction", "out"),))
+    if subprocess_seconds:
+        registry.inc("mirror_http_request_subprocess_seconds_total", subprocess_seconds, labels)
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels:
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{key}="{escaped}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _format_value(value) -> str:
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
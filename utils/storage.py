@@ -1,16 +1,223 @@
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.files import File
 from django.core.files.storage import FileSystemStorage
 
+from . import media_crypto
+
+BLOB_PREFIX = "blobs"
+INCOMING_DIR = "incoming"
+_HASH_CHUNK_SIZE = 1024 * 1024
+_MEMORY_FILESYSTEMS = {"tmpfs", "ramfs"}
+_LOG = logging.getLogger(__name__)
+_checked_tmp_dirs = set()
+
+
 class EncryptedFileStorage(FileSystemStorage):
     """
-    Placeholder for encrypted file storage.
-    Currently behaves as normal storage.
-    Add AES/GPG/LUKS-based encryption here if needed.
+    Encrypts files at rest with segmented AES-GCM (see utils.media_crypto)
+    when MEDIA_ENCRYPTION_KEY is set. Saving, opening and range reads all
+    stream segment by segment, and open() returns a seekable plaintext
+    reader. Files without the encryption header (written before a key was
+    configured) are served as they are, so enabling encryption needs no
+    migration of existing media.
     """
 
+    @property
+    def encrypts(self) -> bool:
+        return self._key() is not None
+
     def _save(self, name, content):
-        # TODO: Apply encryption before saving
-        return super()._save(name, content)
+        key = self._key()
+        if key is None:
+            return super()._save(name, content)
+        return super()._save(name, _EncryptingContent(content, key, self._segment_size()))
 
     def open(self, name, mode='rb'):
-        # TODO: Apply decryption on open
-        return super().open(name, mode)
+        f = super().open(name, mode)
+        if mode not in ("rb", "br"):
+            return f
+
+        header = f.file.read(media_crypto.HEADER_SIZE)
+        f.file.seek(0)
+        if not media_crypto.has_header(header):
+            return f
+
+        key = self._key()
+        if key is None:
+            f.close()
+            raise media_crypto.MediaCryptoError(f"{name} is encrypted but MEDIA_ENCRYPTION_KEY is not set")
+        return File(media_crypto.DecryptingReader(f.file, key, name=f.name), name=f.name)
+
+    def size(self, name):
+        path = self.path(name)
+        with open(path, "rb") as f:
+            header = f.read(media_crypto.HEADER_SIZE)
+        if not media_crypto.has_header(header):
+            return super().size(name)
+        segment_size = int.from_bytes(header[5:9], "big")
+        return media_crypto.plaintext_size(os.path.getsize(path), segment_size)
+
+    def is_encrypted(self, name) -> bool:
+        with open(self.path(name), "rb") as f:
+            return media_crypto.has_header(f.read(media_crypto.HEADER_SIZE))
+
+    @contextmanager
+    def plaintext_path(self, name):
+        """
+        Yields a filesystem path holding the file's plaintext, for tools
+        like ffmpeg that need one. Encrypted files are decrypted into a
+        private temporary file (MEDIA_DECRYPT_TMP_DIR) removed on exit.
+        """
+        if not self.is_encrypted(name):
+            yield self.path(name)
+            return
+
+        tmp_dir = getattr(settings, "MEDIA_DECRYPT_TMP_DIR", None) or tempfile.gettempdir()
+        os.makedirs(tmp_dir, mode=0o700, exist_ok=True)
+        _warn_if_in_memory(tmp_dir)
+        suffix = os.path.splitext(name)[1]
+        with self.open(name, "rb") as src, tempfile.NamedTemporaryFile(dir=tmp_dir, suffix=suffix) as tmp:
+            shutil.copyfileobj(src, tmp, _HASH_CHUNK_SIZE)
+            tmp.flush()
+            yield tmp.name
+
+    def _key(self):
+        return media_crypto.load_key(getattr(settings, "MEDIA_ENCRYPTION_KEY", ""))
+
+    def _segment_size(self):
+        return getattr(settings, "MEDIA_ENCRYPTION_SEGMENT_SIZE", media_crypto.DEFAULT_SEGMENT_SIZE)
+
+
+class _EncryptingContent(File):
+    # FileSystemStorage._save writes whatever chunks() yields; feeding it
+    # ciphertext keeps its atomic-create and permission handling.
+    def __init__(self, content, key, segment_size):
+        super().__init__(None, content.name)
+        self._content = content
+        self._key = key
+        self._segment_size = segment_size
+
+    def chunks(self, chunk_size=None):
+        return media_crypto.encrypt_chunks(self._key, self._content.chunks(chunk_size), self._segment_size)
+
+
+class ContentAddressedStorage(EncryptedFileStorage):
+    """
+    Stores each distinct file once, at blobs/ab/cd/<sha256><ext>. Saving
+    bytes that are already present returns the existing name without
+    writing, so several rows can share one blob.
+
+    The storage never deletes on its own behalf: callers release a blob
+    only once nothing references it (see mirrors.media_store), and
+    leftovers are swept by the gc_media_blobs command.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+
+        digest = getattr(content, "sha256", None) or _hash_content(content)
+        ext = os.path.splitext(name)[1]
+        blob = blob_name(digest, ext)
+        if self.exists(blob):
+            # Refresh mtime so a concurrent release or GC sees it as in use.
+            os.utime(self.path(blob))
+            return blob
+
+        # Write under a private name and move it into place, so a failed
+        # write (disk full, interrupted source) never leaves a truncated
+        # file at the content address for later saves to reuse. Leftovers
+        # of a crashed process are unreferenced and swept by GC.
+        incoming = self._save(f"{BLOB_PREFIX}/{INCOMING_DIR}/{uuid.uuid4().hex}{ext.lower()}", content)
+        try:
+            os.makedirs(os.path.dirname(self.path(blob)), exist_ok=True)
+            # An identical concurrent save may have landed first; either
+            # copy holds the same plaintext.
+            os.replace(self.path(incoming), self.path(blob))
+        except BaseException:
+            super().delete(incoming)
+            raise
+        return blob
+
+    def _save(self, name, content):
+        try:
+            return super()._save(name, content)
+        except BaseException:
+            # FileSystemStorage leaves whatever it wrote behind.
+            if name.startswith(f"{BLOB_PREFIX}/{INCOMING_DIR}/"):
+                try:
+                    os.remove(self.path(name))
+                except FileNotFoundError:
+                    pass
+            raise
+
+
+def blob_name(digest: str, ext: str = "") -> str:
+    digest = digest.lower()
+    return f"{BLOB_PREFIX}/{digest[:2]}/{digest[2:4]}/{digest}{ext.lower()}"
+
+
+def is_blob_name(name: str) -> bool:
+    return bool(name) and name.startswith(f"{BLOB_PREFIX}/")
+
+
+def _warn_if_in_memory(path) -> None:
+    """Logs once per directory when it sits on a RAM-backed filesystem."""
+    path = os.path.realpath(path)
+    if path in _checked_tmp_dirs:
+        return
+    _checked_tmp_dirs.add(path)
+    fstype = _filesystem_type(path)
+    if fstype in _MEMORY_FILESYSTEMS:
+        _LOG.warning(
+            "MEDIA_DECRYPT_TMP_DIR %s is on %s: decrypted videos are held in RAM; "
+            "point it at an on-disk directory",
+            path,
+            fstype,
+        )
+
+
+def _filesystem_type(path):
+    # Longest mount point containing path wins; None where /proc is absent.
+    best, fstype = "", None
+    try:
+        with open("/proc/self/mounts") as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                mount = fields[1].replace("\\040", " ")
+                inside = path == mount or path.startswith(mount.rstrip("/") + "/")
+                if inside and len(mount) >= len(best):
+                    best, fstype = mount, fields[2]
+    except OSError:
+        return None
+    return fstype
+
+
+def video_storage():
+    return _video_storage
+
+
+def _hash_content(content) -> str:
+    sha = hashlib.sha256()
+    if hasattr(content, "seek"):
+        content.seek(0)
+    for chunk in content.chunks(_HASH_CHUNK_SIZE):
+        sha.update(chunk)
+    if hasattr(content, "seek"):
+        content.seek(0)
+    return sha.hexdigest()
+
+
+_video_storage = ContentAddressedStorage()